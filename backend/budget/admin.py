@@ -1,6 +1,11 @@
 from django.contrib import admin
+from django.utils import timezone
 from .models import TransactionType, TransactionPattern, BudgetGroup, Transaction, BudgetInitialization, BudgetAdjustment, AccountName
+from .search import search_transactions
+from .ledger import instance_cells, queryset_cells, queryset_months, refresh_budget_ledger
+from .versioning import bump_version, TRANSACTIONS
 from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
 
 def set_type_budget(modeladmin, request, queryset, transaction_type, budget_group, comments=''):
     budget_group = BudgetGroup.objects.get(name=budget_group)
@@ -8,6 +13,8 @@ def set_type_budget(modeladmin, request, queryset, transaction_type, budget_grou
     budget_group_assignment_type = 'manual'
     transaction_assignment_type = 'manual'
     review_status = 'modified'
+    # Refresh the balances the rows counted towards before and after the update
+    ledger_cells = queryset_cells(queryset) | {(budget_group.id, month) for month in queryset_months(queryset)}
     if comments:
         queryset.update(
             budget_group=budget_group,
@@ -15,7 +22,8 @@ def set_type_budget(modeladmin, request, queryset, transaction_type, budget_grou
             budget_group_assignment_type=budget_group_assignment_type,
             transaction_assignment_type=transaction_assignment_type,
             review_status=review_status,
-            comments=comments
+            comments=comments,
+            updated_at=timezone.now()
         )
     else:
         queryset.update(
@@ -23,8 +31,11 @@ def set_type_budget(modeladmin, request, queryset, transaction_type, budget_grou
             transaction_type=transaction_type,
             budget_group_assignment_type=budget_group_assignment_type,
             transaction_assignment_type=transaction_assignment_type,
-            review_status=review_status
+            review_status=review_status,
+            updated_at=timezone.now()
         )
+    refresh_budget_ledger(ledger_cells)
+    bump_version(TRANSACTIONS)
     modeladmin.message_user(request, f"{queryset.count()} transactions were updated successfully.")
 
 def set_to_income_savings(modeladmin, request, queryset):
@@ -54,8 +65,10 @@ def confirm_auto_assignment(modeladmin, request, queryset):
     queryset.update(
         budget_group_assignment_type='auto_checked',
         transaction_assignment_type='auto_checked',
-        review_status='confirmed'
+        review_status='confirmed',
+        updated_at=timezone.now()
     )
+    bump_version(TRANSACTIONS)
     modeladmin.message_user(request, f"{queryset.count()} transactions were confirmed successfully.")
 
 confirm_auto_assignment.short_description = "Confirm Auto Assignment"
@@ -111,6 +124,7 @@ def copy_last_fortnightly_adjustments(modeladmin, request, queryset):
         
         # Bulk create the new budget adjustments
         BudgetAdjustment.objects.bulk_create(new_adjustments)
+        refresh_budget_ledger(set().union(*(instance_cells(adjustment) for adjustment in new_adjustments)))
         
         modeladmin.message_user(request, f"{len(new_adjustments)} budget adjustments were copied successfully.")
     else:
@@ -126,10 +140,10 @@ class TransactionTypeAdmin(admin.ModelAdmin):
 
 @admin.register(TransactionPattern)
 class TransactionPatternAdmin(admin.ModelAdmin):
-    list_display = ('regex_pattern', 'transaction_type', 'account_name')
+    list_display = ('regex_pattern', 'transaction_type', 'account_name', 'priority')
     search_fields = ('regex_pattern',)
     list_filter = ('transaction_type', 'account_name')
-    ordering = ('account_name', 'transaction_type', 'regex_pattern')
+    ordering = ('account_name', '-priority', 'id')
 
 @admin.register(BudgetGroup)
 class BudgetGroupAdmin(admin.ModelAdmin):
@@ -157,6 +171,22 @@ class TransactionAdmin(admin.ModelAdmin):
     formatted_date.short_description = 'Date'
     formatted_date.admin_order_field = 'date'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Unlike the default search_fields search, every word must appear in the
+        # description or comments (the trigram indexed columns), and amounts match
+        # a search for the whole number, of either sign, rather than any substring.
+        # Matching amounts as text would rule out the indexes on PostgreSQL.
+        if not search_term.strip():
+            return queryset, False
+        results = search_transactions(queryset, search_term, include_comments=True)
+        try:
+            amount = Decimal(search_term.strip())
+        except InvalidOperation:
+            amount = None
+        if amount is not None and amount.is_finite():
+            results = results | queryset.filter(amount__in=[amount, -amount])
+        return results, False
+
     def get_date_hierarchy_drilldown(self, year_lookup, month_lookup):
         from datetime import datetime
         from django.utils.formats import get_format
@@ -0,0 +1,217 @@
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from django.apps import apps
+from django.conf import settings
+from django.core import serializers
+from django.core.management import call_command
+from django.db import connection, transaction as db_transaction
+from django.utils import timezone
+from .utils import chunked
+
+MANIFEST = 'manifest.json'
+
+# Bumped when the layout of an archive changes
+ARCHIVE_FORMAT = 1
+
+# Models with this field are backed up incrementally, the others in full every time
+CHANGE_FIELD = 'updated_at'
+
+class BackupError(Exception):
+    pass
+
+def backup_models():
+    """
+    Return every model with a table of its own, like dumpdata --all.
+    """
+    return [model for model in apps.get_models() if model._meta.managed and not model._meta.proxy]
+
+def is_incremental(model):
+    return any(field.name == CHANGE_FIELD for field in model._meta.concrete_fields)
+
+def read_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        raise BackupError(f"{directory} is not a complete backup archive: {MANIFEST} is missing")
+    with open(path) as f:
+        return json.load(f)
+
+def latest_archive(backup_dir):
+    """
+    Return the path of the newest complete archive in `backup_dir`, or None.
+    """
+    archives = []
+    for name in os.listdir(backup_dir) if os.path.isdir(backup_dir) else []:
+        path = os.path.join(backup_dir, name)
+        if os.path.isfile(os.path.join(path, MANIFEST)):
+            archives.append((read_manifest(path)['started_at'], path))
+    return max(archives)[1] if archives else None
+
+def counted(iterable, counter):
+    for item in iterable:
+        counter[0] += 1
+        yield item
+
+def write_rows(queryset, path, chunk_size):
+    """
+    Stream a queryset to a gzipped NDJSON fixture (loaddata's jsonl format) and return the row count.
+    """
+    count = [0]
+    with gzip.open(path, 'wt', encoding='utf-8') as stream:
+        serializers.serialize('jsonl', counted(queryset.iterator(chunk_size=chunk_size), count), stream=stream)
+    return count[0]
+
+def write_ids(queryset, path, chunk_size):
+    """
+    Write the primary keys of a queryset to a gzipped file, one per line, and return their count.
+    """
+    count = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as stream:
+        for pk in queryset.values_list('pk', flat=True).iterator(chunk_size=chunk_size):
+            stream.write(f"{pk}\n")
+            count += 1
+    return count
+
+def write_archive(directory, base=None, chunk_size=None, progress=None):
+    """
+    Back up every model into `directory` as one gzipped NDJSON fixture per model
+    plus a manifest, and return the manifest.
+
+    Rows are streamed from the database `chunk_size` at a time, so memory use
+    does not grow with the tables. Every model is read in one transaction, from
+    a single snapshot of the database. With `base` (the directory of an earlier
+    archive), models with an updated_at field only get the rows changed since
+    the base's watermark and the other models are copied in full; the primary
+    keys of every model's rows are listed too, so restores can drop the rows
+    deleted since the base. The manifest is written last, so an interrupted
+    backup is never used as a base. `progress` is called with each model's
+    manifest entry as it completes.
+
+    updated_at is set when a row is written, not when it is committed, so rows
+    of a transaction still open when the snapshot was taken can be committed
+    later with an older updated_at. The watermark is therefore the snapshot
+    start minus BACKUP_OVERLAP_SECONDS, the longest a writing transaction may
+    stay open.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    since = None
+    if base is not None:
+        base_manifest = read_manifest(base)
+        since = datetime.fromisoformat(base_manifest.get('watermark', base_manifest['started_at']))
+    os.makedirs(directory)
+
+    with db_transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # The snapshot is taken by the first query; SQLite transactions always read one
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+        started_at = timezone.now()
+        entries = write_models(directory, since, chunk_size, progress)
+
+    manifest = {
+        'format': ARCHIVE_FORMAT,
+        'started_at': started_at.isoformat(),
+        'finished_at': timezone.now().isoformat(),
+        # Incremental archives built on this one copy the rows changed since then
+        'watermark': (started_at - timedelta(seconds=settings.BACKUP_OVERLAP_SECONDS)).isoformat(),
+        # Relative to the archive's parent directory, so backups can be moved together
+        'base': os.path.relpath(base, os.path.dirname(os.path.abspath(directory))) if base else None,
+        'rows': sum(entry['rows'] for entry in entries.values()),
+        'bytes': sum(entry['bytes'] for entry in entries.values()),
+        'models': entries,
+    }
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def write_models(directory, since, chunk_size, progress):
+    """
+    Write the fixture of every model to `directory` and return their manifest entries.
+    """
+    entries = {}
+    for model in backup_models():
+        start = time.perf_counter()
+        label = model._meta.label_lower
+        queryset = model._base_manager.order_by('pk')
+        entry = {'file': f"{label}.jsonl.gz", 'mode': 'full'}
+        if since is not None:
+            entry['ids_file'] = f"{label}.ids.gz"
+            entry['ids'] = write_ids(queryset, os.path.join(directory, entry['ids_file']), chunk_size)
+            if is_incremental(model):
+                entry['mode'] = 'incremental'
+                queryset = queryset.filter(**{f"{CHANGE_FIELD}__gte": since})
+        entry['rows'] = write_rows(queryset, os.path.join(directory, entry['file']), chunk_size)
+        entry['bytes'] = os.path.getsize(os.path.join(directory, entry['file']))
+        entry['seconds'] = round(time.perf_counter() - start, 3)
+        entries[label] = entry
+        if progress:
+            progress(label, entry)
+    return entries
+
+def archive_chain(directory):
+    """
+    Return the archives to restore for `directory`, from its full backup to itself.
+    """
+    chain = []
+    seen = set()
+    while directory is not None:
+        directory = os.path.abspath(directory)
+        if directory in seen:
+            raise BackupError(f"Backup archives refer to each other in a loop at {directory}")
+        seen.add(directory)
+        manifest = read_manifest(directory)
+        if manifest.get('format') != ARCHIVE_FORMAT:
+            raise BackupError(f"{directory} has unsupported archive format {manifest.get('format')}")
+        chain.append((directory, manifest))
+        base = manifest['base']
+        directory = os.path.join(os.path.dirname(directory), base) if base else None
+    return chain[::-1]
+
+def read_ids(path, model):
+    pk_field = model._meta.pk
+    with gzip.open(path, 'rt', encoding='utf-8') as stream:
+        return {pk_field.to_python(line.rstrip('\n')) for line in stream}
+
+def load_archive(archive, manifest, exclude, chunk_size):
+    fixtures = [
+        os.path.join(archive, entry['file'])
+        for label, entry in manifest['models'].items()
+        if label not in exclude and entry['rows']
+    ]
+    if fixtures:
+        call_command('loaddata', *fixtures, verbosity=0)
+    # Models usually come after the ones they refer to, so delete dependent rows first
+    for label, entry in reversed(manifest['models'].items()):
+        if label in exclude or 'ids_file' not in entry:
+            continue
+        model = apps.get_model(label)
+        kept = read_ids(os.path.join(archive, entry['ids_file']), model)
+        current = model._base_manager.values_list('pk', flat=True).iterator(chunk_size=chunk_size)
+        deleted = [pk for pk in current if pk not in kept]
+        for pks in chunked(deleted, chunk_size):
+            model._base_manager.filter(pk__in=pks)._raw_delete(connection.alias)
+
+def load_archive_chain(directory, exclude=(), chunk_size=None, progress=None):
+    """
+    Load an archive and the earlier ones it builds on into the database with loaddata.
+
+    Each archive's fixtures are loaded in one loaddata call, so foreign keys
+    are only checked once all of them are in. After an incremental archive,
+    the rows missing from its primary key lists are deleted, in the same
+    transaction as the load. Models labelled in `exclude` are skipped.
+    `progress` is called with each archive's directory and manifest once it is
+    loaded.
+
+    The deletes send no model signals and the signals skip loaddata's raw
+    saves, so the budget ledger and the data versions are not maintained row by
+    row: callers rebuild the ledger and bump the versions once the chain is
+    loaded, as restore_database does.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    for archive, manifest in archive_chain(directory):
+        with db_transaction.atomic():
+            load_archive(archive, manifest, exclude, chunk_size)
+        if progress:
+            progress(archive, manifest)
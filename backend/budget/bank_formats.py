@@ -0,0 +1,195 @@
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+FIELDS = ('date', 'description', 'amount', 'balance', 'debit', 'credit')
+
+DEFAULT_DATE_FORMAT = '%d/%m/%Y'
+
+# Distinct dates remembered per format; a bank export only spans a few hundred
+DATE_CACHE_SIZE = 4096
+
+# Layouts of formats configured with only a display name, by their position among
+# the name-only entries of BANK_FORMATS (see docs/import_formats.md)
+BUILTIN_LAYOUTS = [
+    {'columns': ['date', 'amount', 'description', 'balance']},
+    {'columns': ['date', 'amount', 'description']},
+    {'columns': ['date', 'description', 'amount', 'balance'], 'skip_rows': 2},
+]
+
+_registry = None
+
+class BankFormat:
+    """
+    The layout of one bank's CSV export, compiled into a row converter.
+
+    `columns` lists the field of each column in order (None for columns to
+    ignore) or maps fields to column indexes. Every format needs a date and a
+    description, and either an amount or debit and credit columns. Amounts may
+    contain the currency symbols and thousands separators, which are stripped;
+    with `negate_amounts` the signs are flipped, for banks that export spending
+    as positive amounts.
+    """
+    def __init__(self, key, name, columns, skip_rows=0, date_format=DEFAULT_DATE_FORMAT, currency_symbols='$',
+                 thousands_separator=',', decimal_separator='.', negate_amounts=False):
+        if isinstance(columns, dict):
+            indexes = dict(columns)
+        else:
+            indexes = {field: index for index, field in enumerate(columns) if field}
+        unknown = set(indexes) - set(FIELDS)
+        if unknown:
+            raise ImproperlyConfigured(f"Bank format {key}: unknown columns {', '.join(sorted(unknown))}")
+        if 'date' not in indexes or 'description' not in indexes:
+            raise ImproperlyConfigured(f"Bank format {key}: date and description columns are required")
+        if 'amount' not in indexes and not {'debit', 'credit'} <= set(indexes):
+            raise ImproperlyConfigured(f"Bank format {key}: an amount column, or debit and credit columns, is required")
+
+        self.key = key
+        self.name = name
+        self.columns = indexes
+        self.skip_rows = skip_rows
+        self.date_format = date_format
+        self.currency_symbols = currency_symbols
+        self.thousands_separator = thousands_separator
+        self.decimal_separator = decimal_separator
+        self.negate_amounts = negate_amounts
+        self.convert = self.compile()
+
+    @classmethod
+    def from_definition(cls, key, definition, position=None):
+        """
+        Build a format from its BANK_FORMATS entry: a definition dict, or just a
+        display name for the built-in layout at that position.
+        """
+        if isinstance(definition, str):
+            if position is None or position >= len(BUILTIN_LAYOUTS):
+                raise ImproperlyConfigured(f"Bank format {key}: a definition with its columns is required")
+            definition = {'name': definition, **BUILTIN_LAYOUTS[position]}
+        definition = dict(definition)
+        name = definition.pop('name', key)
+        try:
+            return cls(key, name, **definition)
+        except TypeError as e:
+            raise ImproperlyConfigured(f"Bank format {key}: {e}")
+
+    def compile(self):
+        """
+        Return a function converting one CSV row into a transaction dict.
+
+        Dates are parsed once per distinct value and amounts cleaned with a
+        single translate before building the Decimal. Values that cannot be
+        parsed are passed through unchanged, so the importer reports them as
+        row errors.
+        """
+        columns = self.columns
+        width = max(columns.values()) + 1
+        date_index = columns['date']
+        description_index = columns['description']
+        amount_index = columns.get('amount')
+        balance_index = columns.get('balance')
+        debit_index = columns.get('debit')
+        credit_index = columns.get('credit')
+        date_format = self.date_format
+        negate = self.negate_amounts
+
+        removed = {symbol: None for symbol in self.currency_symbols + self.thousands_separator}
+        if self.decimal_separator != '.':
+            removed[self.decimal_separator] = '.'
+        table = str.maketrans(removed)
+
+        @lru_cache(maxsize=DATE_CACHE_SIZE)
+        def parse_date(value):
+            try:
+                return datetime.strptime(value.strip(), date_format).date().isoformat()
+            except ValueError:
+                return value
+
+        def to_decimal(value):
+            text = value.translate(table).strip()
+            if not text:
+                return None
+            try:
+                return Decimal(text)
+            except InvalidOperation:
+                return value
+
+        def to_amount(row):
+            if amount_index is not None:
+                amount = to_decimal(row[amount_index])
+            else:
+                debit = to_decimal(row[debit_index])
+                credit = to_decimal(row[credit_index])
+                for value in (debit, credit):
+                    if isinstance(value, str):
+                        return value
+                if debit is None and credit is None:
+                    return None
+                amount = (credit or Decimal(0)) - (debit or Decimal(0))
+            if negate and isinstance(amount, Decimal):
+                amount = -amount
+            return amount
+
+        def convert(row):
+            if len(row) < width:
+                row = list(row) + [''] * (width - len(row))
+            return {
+                'date': parse_date(row[date_index]),
+                'description': row[description_index],
+                'amount': to_amount(row),
+                'balance': to_decimal(row[balance_index]) if balance_index is not None else None,
+            }
+
+        return convert
+
+    def parse(self, reader):
+        """
+        Yield a transaction dict for each row of an export, reading the rows lazily.
+        """
+        for _ in range(self.skip_rows):
+            next(reader, None)
+        convert = self.convert
+        for row in reader:
+            yield convert(row)
+
+def load_bank_formats(definitions):
+    """
+    Build the format registry from a BANK_FORMATS style mapping of keys to definitions.
+
+    Formats given only a display name take the built-in layouts in order;
+    defined formats anywhere in the mapping don't shift them.
+    """
+    registry = {}
+    position = 0
+    for key, definition in definitions.items():
+        registry[key] = BankFormat.from_definition(key, definition, position)
+        if isinstance(definition, str):
+            position += 1
+    return registry
+
+def get_bank_formats():
+    global _registry
+    if _registry is None:
+        _registry = load_bank_formats(settings.BANK_FORMATS)
+    return _registry
+
+def get_bank_format(key):
+    try:
+        return get_bank_formats()[key]
+    except KeyError:
+        raise ValueError(f"Unsupported import format: {key}")
+
+def bank_format_names():
+    """
+    Return the display name of every configured format, by key.
+    """
+    return {key: bank_format.name for key, bank_format in get_bank_formats().items()}
+
+@receiver(setting_changed)
+def reset_bank_formats(setting, **kwargs):
+    global _registry
+    if setting == 'BANK_FORMATS':
+        _registry = None
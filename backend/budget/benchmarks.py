@@ -0,0 +1,448 @@
+import csv
+import io
+import itertools
+import random
+import re
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import CommandError
+from rest_framework.test import APIRequestFactory
+from .models import AccountName, BudgetGroup, Transaction, TransactionPattern, TransactionType
+from .serializers import TransactionSerializer, serialize_values
+from .exports import EXPORT_FORMATS
+from .categorization import CategorizationRule, Categorizer, clear_categorizer_cache, get_categorizer
+from .utils import categorize_transaction, detect_duplicates, parse_transaction_data
+from .versioning import bump_version, PATTERNS
+from .views.import_views import import_transactions
+
+MERCHANT_PREFIXES = ['WOOLWORTHS', 'COLES', 'ALDI', 'BP', 'SHELL', 'AMAZON', 'NETFLIX', 'SPOTIFY', 'UBER', 'KMART',
+                     'BUNNINGS', 'TELSTRA', 'OPTUS', 'ORIGIN', 'AGL', 'PAYPAL', 'MEDICARE', 'CHEMIST', 'DAN MURPHY', 'OFFICEWORKS']
+NOISE_WORDS = ['CARD', 'PURCHASE', 'EFTPOS', 'VISA', 'DEBIT', 'TRANSFER', 'FROM', 'TO', 'SYDNEY', 'MELBOURNE',
+               'BRISBANE', 'PERTH', 'AU', 'AUS', 'REF', 'VALUE', 'DATE', 'ONLINE', 'STORE', 'PTY', 'LTD']
+
+def check(condition, message):
+    """
+    Fail the benchmark run when a result check does not hold; unlike assert, it runs under python -O.
+    """
+    if not condition:
+        raise CommandError(message)
+
+def generate_patterns(count, seed=0):
+    """
+    Generate `count` distinct regex patterns shaped like real categorization rules.
+    """
+    rng = random.Random(seed)
+    patterns = []
+    for index in range(count):
+        merchant = f"{rng.choice(MERCHANT_PREFIXES)} {index:04d}"
+        shape = index % 4
+        if shape == 0:
+            patterns.append(merchant)
+        elif shape == 1:
+            patterns.append(f"{merchant}.*{rng.choice(NOISE_WORDS)}")
+        elif shape == 2:
+            patterns.append(f"{merchant} \\d+")
+        else:
+            patterns.append(f"^{rng.choice(NOISE_WORDS)} .*{merchant}")
+    return patterns
+
+def generate_descriptions(count, pattern_count, match_ratio=0.7, seed=0, distinct=None):
+    """
+    Generate bank-style descriptions; roughly `match_ratio` of them mention a merchant
+    used by one of the first `pattern_count` generated patterns.
+
+    With `distinct`, the descriptions are drawn from that many distinct ones,
+    as merchants repeat in real bank exports.
+    """
+    rng = random.Random(seed)
+    if distinct:
+        pool = generate_descriptions(distinct, pattern_count, match_ratio, seed)
+        return [rng.choice(pool) for _ in range(count)]
+    descriptions = []
+    for _ in range(count):
+        words = [rng.choice(NOISE_WORDS) for _ in range(rng.randint(1, 3))]
+        if pattern_count and rng.random() < match_ratio:
+            index = rng.randrange(pattern_count)
+            merchant = f"{MERCHANT_PREFIXES[index % len(MERCHANT_PREFIXES)]} {index:04d}"
+            words.insert(1, merchant)
+            words.append(str(rng.randint(100, 99999)))
+        else:
+            words.append(f"{rng.choice(MERCHANT_PREFIXES)} XX{rng.randint(0, 999)}")
+        descriptions.append(' '.join(words))
+    return descriptions
+
+def time_call(func, repeat=3):
+    """
+    Run `func` `repeat` times and return (best elapsed seconds, last result).
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def loop_match(patterns, descriptions):
+    """
+    The original categorize_transaction matching loop: re.search per pattern and row.
+    """
+    matches = []
+    for description in descriptions:
+        matched = None
+        for index, pattern in enumerate(patterns):
+            if re.search(pattern, description, re.IGNORECASE):
+                matched = index
+                break
+        matches.append(matched)
+    return matches
+
+def categorizer_match(categorizer, descriptions):
+    matches = []
+    for description in descriptions:
+        rule = categorizer.match(description)
+        matches.append(rule.pattern_id if rule else None)
+    return matches
+
+def benchmark_categorization(pattern_counts=(10, 100, 1000), description_count=10000, include_loop=True, repeat=3, seed=0,
+                             distinct_descriptions=None):
+    """
+    Compare the original matching loop with the sequential and indexed matchers,
+    and the indexed matcher with its match memo.
+
+    Raises AssertionError if a matcher disagrees with the sequential matcher on
+    any description.
+    """
+    results = []
+    for pattern_count in pattern_counts:
+        patterns = generate_patterns(pattern_count, seed=seed)
+        descriptions = generate_descriptions(description_count, pattern_count, seed=seed, distinct=distinct_descriptions)
+        rules = [CategorizationRule(index, pattern, None) for index, pattern in enumerate(patterns)]
+
+        modes = {}
+        if include_loop:
+            modes['loop'] = lambda: loop_match(patterns, descriptions)
+        for mode in ('sequential', 'indexed'):
+            categorizer = Categorizer(rules, mode=mode, memo_size=0)
+            modes[mode] = lambda categorizer=categorizer: categorizer_match(categorizer, descriptions)
+        # A new categorizer per repetition, so every run starts with an empty memo
+        modes['memoized'] = lambda: categorizer_match(Categorizer(rules, mode='indexed', memo_size=len(descriptions)), descriptions)
+
+        expected = None
+        for mode, func in modes.items():
+            # The original loop recompiles on every call, one repetition is plenty
+            seconds, matches = time_call(func, repeat=1 if mode == 'loop' else repeat)
+            if expected is None:
+                expected = matches
+            check(matches == expected, f"{mode} matcher disagrees with the reference results")
+            results.append({
+                'suite': 'categorization',
+                'mode': mode,
+                'patterns': pattern_count,
+                'rows': description_count,
+                'matched': sum(match is not None for match in matches),
+                'seconds': round(seconds, 6),
+                'rows_per_second': round(description_count / seconds) if seconds else None,
+            })
+    return results
+
+def generate_rows(bank_format, count, pattern_count=0, seed=0, duplicate_ratio=0):
+    """
+    Generate `count` CSV rows (as lists of strings) in a bank format's layout, after its skipped rows.
+
+    Descriptions mention the merchants of the first `pattern_count` generated
+    patterns, as in generate_descriptions. Roughly `duplicate_ratio` of the rows
+    repeat the previous row, as same-day identical purchases do in real exports.
+    """
+    rng = random.Random(seed)
+    width = max(bank_format.columns.values()) + 1
+    rows = [['Header'] * width for _ in range(bank_format.skip_rows)]
+    descriptions = generate_descriptions(count, pattern_count, seed=seed)
+    start = datetime(2024, 1, 1)
+    for index in range(count):
+        if index and rng.random() < duplicate_ratio:
+            rows.append(list(rows[-1]))
+            continue
+        amount = rng.randint(-500000, 200000) / 100
+        values = {
+            'date': (start + timedelta(days=index // 50)).strftime(bank_format.date_format),
+            'description': descriptions[index],
+            'amount': format_amount(bank_format, -amount if bank_format.negate_amounts else amount),
+            'debit': format_amount(bank_format, -amount) if amount < 0 else '',
+            'credit': format_amount(bank_format, amount) if amount >= 0 else '',
+            'balance': format_amount(bank_format, rng.randint(0, 10000000) / 100),
+        }
+        row = [''] * width
+        for field, column in bank_format.columns.items():
+            row[column] = values[field]
+        rows.append(row)
+    return rows
+
+def generate_csv(bank_format, count, pattern_count=0, seed=0, duplicate_ratio=0):
+    """
+    Return a synthetic export in a bank format as CSV text.
+    """
+    output = io.StringIO()
+    csv.writer(output).writerows(generate_rows(bank_format, count, pattern_count, seed, duplicate_ratio))
+    return output.getvalue()
+
+def format_amount(bank_format, amount):
+    text = f"{abs(amount):,.2f}".replace(',', '\x00').replace('.', bank_format.decimal_separator)
+    text = text.replace('\x00', bank_format.thousands_separator)
+    return f"{'-' if amount < 0 else ''}{bank_format.currency_symbols[:1]}{text}"
+
+def strptime_parse(bank_format, rows):
+    """
+    The original per-row conversion: strptime for every date and chained replaces for every amount.
+    """
+    columns = bank_format.columns
+    transactions = []
+    for row in rows[bank_format.skip_rows:]:
+        balance = row[columns['balance']].replace('$', '').replace(',', '') if 'balance' in columns else None
+        transactions.append({
+            'date': datetime.strptime(row[columns['date']], bank_format.date_format).strftime('%Y-%m-%d'),
+            'description': row[columns['description']],
+            'amount': Decimal(row[columns['amount']].replace('$', '').replace(',', '')),
+            'balance': Decimal(balance) if balance else None,
+        })
+    return transactions
+
+def benchmark_parsing(bank_formats, row_count=100000, repeat=3, seed=0):
+    """
+    Measure the parse throughput of each bank format's compiled converter.
+
+    For formats the original parser could read (an amount column, '$' and ','
+    amounts), the original per-row conversion is timed too.
+    """
+    results = []
+    for bank_format in bank_formats:
+        rows = generate_rows(bank_format, row_count, seed=seed)
+        modes = {}
+        if 'amount' in bank_format.columns and (bank_format.currency_symbols, bank_format.thousands_separator,
+                                                bank_format.decimal_separator, bank_format.negate_amounts) == ('$', ',', '.', False):
+            modes['strptime'] = lambda: strptime_parse(bank_format, rows)
+        # The converter caches dates, so a new one per repetition keeps every run cold
+        modes['compiled'] = lambda: list(map(bank_format.compile(), rows[bank_format.skip_rows:]))
+
+        expected = None
+        for mode, func in modes.items():
+            seconds, transactions = time_call(func, repeat=repeat)
+            if expected is None:
+                expected = transactions
+            check(transactions == expected, f"{mode} parser disagrees with the reference results")
+            results.append({
+                'suite': 'parsing',
+                'mode': mode,
+                'format': bank_format.key,
+                'rows': row_count,
+                'seconds': round(seconds, 6),
+                'rows_per_second': round(row_count / seconds) if seconds else None,
+            })
+    return results
+
+def create_patterns(account_name, pattern_count, seed=0):
+    """
+    Store `pattern_count` generated patterns for an account.
+    """
+    transaction_type, _ = TransactionType.objects.get_or_create(name='Benchmark')
+    TransactionPattern.objects.bulk_create([
+        TransactionPattern(regex_pattern=pattern, account_name=account_name, transaction_type=transaction_type)
+        for pattern in generate_patterns(pattern_count, seed=seed)
+    ])
+    # bulk_create skips the signals that invalidate the compiled categorizers
+    bump_version(PATTERNS)
+
+def post_import(bank_format, text, account_name):
+    request = APIRequestFactory().post('/api/import-transactions/', {
+        'file': SimpleUploadedFile('benchmark.csv', text.encode('utf-8')),
+        'import_format': bank_format.key,
+        'new_account_name': account_name,
+    }, format='multipart')
+    response = import_transactions(request)
+    check(response.status_code == 201, f"Import failed: {response.data}")
+    return response.data
+
+def benchmark_import(bank_formats, row_counts=(1000, 10000), pattern_counts=(10, 100), repeat=3, seed=0):
+    """
+    Time each stage of the transaction import and the import_transactions view end to end.
+
+    For every format and row count, a synthetic export is parsed from CSV text
+    (parse_transaction_data) and its repeated rows suffixed (detect_duplicates).
+    For every pattern count, the unique rows are categorized one call per row
+    (categorize_transaction, as views categorizing single transactions do) and
+    in one batch (categorize_many, as the importer does), starting from an
+    empty categorizer cache, and the file is posted to import_transactions
+    into a new account.
+
+    Writes to the database: run it against a throwaway one, as run_benchmarks does.
+    """
+    results = []
+
+    def record(stage, bank_format, row_count, pattern_count, seconds):
+        results.append({
+            'suite': 'import',
+            'mode': stage,
+            'format': bank_format.key,
+            'patterns': pattern_count,
+            'rows': row_count,
+            'seconds': round(seconds, 6),
+            'rows_per_second': round(row_count / seconds) if seconds else None,
+        })
+
+    run = itertools.count()
+    for bank_format in bank_formats:
+        for row_count in row_counts:
+            for pattern_count in pattern_counts:
+                text = generate_csv(bank_format, row_count, pattern_count, seed=seed, duplicate_ratio=0.01)
+                if pattern_count == pattern_counts[0]:
+                    # Parsing and deduplicating do not depend on the patterns
+                    seconds, parsed = time_call(
+                        lambda: list(parse_transaction_data(csv.reader(io.StringIO(text)), bank_format.key)), repeat)
+                    record('parse', bank_format, row_count, None, seconds)
+                    seconds, _ = time_call(lambda: list(detect_duplicates(parsed)), repeat)
+                    record('dedupe', bank_format, row_count, None, seconds)
+                unique = list(detect_duplicates(parse_transaction_data(csv.reader(io.StringIO(text)), bank_format.key)))
+
+                account_name = AccountName.objects.create(name=f"Benchmark {next(run)}")
+                create_patterns(account_name, pattern_count, seed=seed)
+
+                def categorize_each():
+                    clear_categorizer_cache()
+                    return [
+                        categorize_transaction(transaction['description'], account_name.id, transaction['amount'])
+                        for transaction in unique
+                    ]
+
+                def categorize_batch():
+                    clear_categorizer_cache()
+                    return list(get_categorizer(account_name.id).categorize_many(
+                        (transaction['description'], transaction['amount']) for transaction in unique
+                    ))
+
+                seconds, categories = time_call(categorize_each, repeat)
+                record('categorize_transaction', bank_format, row_count, pattern_count, seconds)
+                seconds, batch_categories = time_call(categorize_batch, repeat)
+                check(batch_categories == categories, "categorize_many disagrees with categorize_transaction")
+                record('categorize_many', bank_format, row_count, pattern_count, seconds)
+
+                # Every repetition imports into a new account, so no row is skipped as already stored
+                seconds, data = time_call(lambda: post_import(bank_format, text, f"Benchmark {next(run)}"), repeat)
+                check(data['imported'] == len(unique), "The import skipped rows")
+                record('import_transactions', bank_format, row_count, pattern_count, seconds)
+    return results
+
+def create_transactions(name, count, seed=0):
+    """
+    Bulk create `count` transactions in a new account, type and budget group
+    called `name`; a quarter are left uncategorized and a third have no balance.
+    """
+    rng = random.Random(seed)
+    account_name = AccountName.objects.create(name=name)
+    budget_group = BudgetGroup.objects.create(name=name)
+    transaction_type = TransactionType.objects.create(name=name, default_budget_group=budget_group)
+    descriptions = generate_descriptions(count, 0, seed=seed)
+    Transaction.objects.bulk_create((
+        Transaction(
+            date=datetime(2024, 1, 1).date() + timedelta(days=index // 20),
+            amount=Decimal(rng.randint(-500000, 200000)) / 100,
+            balance=Decimal(rng.randint(0, 10000000)) / 100 if index % 3 else None,
+            description=description,
+            source='benchmark',
+            account_name=account_name,
+            budget_group=budget_group if index % 4 else None,
+            transaction_type=transaction_type if index % 4 else None,
+            dedupe_key=f"{name}-{index}",
+        )
+        for index, description in enumerate(descriptions)
+    ), batch_size=1000)
+    return account_name
+
+def benchmark_serialization(row_counts=(10000,), repeat=3, seed=0):
+    """
+    Compare TransactionSerializer with its read-only values fast path on transaction listings.
+
+    Raises AssertionError if the fast path renders any row differently.
+    Writes to the database: run it against a throwaway one, as run_benchmarks does.
+    """
+    account_name = create_transactions('Benchmark serialization', max(row_counts), seed)
+
+    results = []
+    for row_count in row_counts:
+        queryset = Transaction.objects.filter(account_name=account_name).order_by('date', 'id')[:row_count]
+        modes = {
+            'serializer': lambda: [dict(row) for row in TransactionSerializer(queryset, many=True).data],
+            'values': lambda: serialize_values(queryset),
+        }
+        expected = None
+        for mode, func in modes.items():
+            seconds, rows = time_call(func, repeat)
+            if expected is None:
+                expected = rows
+            check(rows == expected, f"{mode} serialization disagrees with the reference results")
+            results.append({
+                'suite': 'serialization',
+                'mode': mode,
+                'rows': row_count,
+                'seconds': round(seconds, 6),
+                'rows_per_second': round(row_count / seconds) if seconds else None,
+            })
+    return results
+
+def consume(stream):
+    """
+    Read a streamed export to the end, keeping only its size.
+    """
+    return sum(len(part) for part in stream)
+
+def benchmark_export(row_counts=(10000, 100000), export_formats=('csv', 'ndjson'), repeat=3, seed=0):
+    """
+    Measure the throughput and peak Python memory of the streaming transaction exports.
+
+    The peak is traced in a separate run and should stay flat as the row count
+    grows, since rows are read from a server-side cursor a chunk at a time.
+    Writes to the database: run it against a throwaway one, as run_benchmarks does.
+    """
+    account_name = create_transactions('Benchmark export', max(row_counts), seed)
+
+    results = []
+    for row_count in row_counts:
+        queryset = Transaction.objects.filter(account_name=account_name).order_by('date', 'id')[:row_count]
+        for export_format in export_formats:
+            stream = EXPORT_FORMATS[export_format][1]
+            seconds, size = time_call(lambda: consume(stream(queryset)), repeat)
+            tracemalloc.start()
+            try:
+                consume(stream(queryset))
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            results.append({
+                'suite': 'export',
+                'mode': 'stream',
+                'format': export_format,
+                'rows': row_count,
+                'bytes': size,
+                'peak_kb': round(peak / 1024),
+                'seconds': round(seconds, 6),
+                'rows_per_second': round(row_count / seconds) if seconds else None,
+            })
+    return results
+
+def result_key(result):
+    return result['suite'], result['mode'], result.get('format'), result.get('patterns'), result['rows']
+
+def compare_results(results, baseline, tolerance=0.2):
+    """
+    Return the results more than `tolerance` (a fraction) slower than the matching baseline result.
+    """
+    baseline_seconds = {result_key(result): result['seconds'] for result in baseline}
+    regressions = []
+    for result in results:
+        previous = baseline_seconds.get(result_key(result))
+        if previous and result['seconds'] > previous * (1 + tolerance):
+            regressions.append({**result, 'baseline_seconds': previous, 'slowdown': round(result['seconds'] / previous, 2)})
+    return regressions
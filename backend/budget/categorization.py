@@ -0,0 +1,311 @@
+import logging
+import re
+from functools import lru_cache
+from django.conf import settings
+from django.db.models import Q
+from .models import TransactionPattern
+from .versioning import get_version, PATTERNS
+
+logger = logging.getLogger(__name__)
+
+MATCHER_MODES = ('sequential', 'indexed')
+
+PREFILTER_MIN_LENGTH = 3
+# Below this many rules, scanning the description's trigrams costs more than it saves
+INDEXED_MATCHER_MIN_RULES = 32
+VERBOSE_FLAG_PATTERN = re.compile(r'\(\?[aiLmsux-]*x')
+# Escapes spelling a character by its code or name, and backreferences
+NUMERIC_ESCAPES = frozenset('xuUN0123456789')
+
+def required_literal(regex_pattern):
+    """
+    Return the longest lowercase literal that every match of the pattern must contain.
+
+    Only plain characters and escaped punctuation outside groups and character
+    classes are considered, dropping any character made optional by a
+    quantifier. Returns None for patterns with an alternation, a verbose flag,
+    an escape spelling a character by its code or name, or a backreference, and
+    when no ASCII literal of at least PREFILTER_MIN_LENGTH characters is required.
+    """
+    if '|' in regex_pattern or VERBOSE_FLAG_PATTERN.search(regex_pattern):
+        return None
+    runs = []
+    current = []
+    depth = 0
+    index = 0
+    while index < len(regex_pattern):
+        char = regex_pattern[index]
+        if char == '\\':
+            escaped = regex_pattern[index + 1:index + 2]
+            if escaped in NUMERIC_ESCAPES:
+                # Character codes, named characters and backreferences would need decoding
+                return None
+            if escaped.isascii() and not escaped.isalnum():
+                # An escaped metacharacter or punctuation matches itself
+                if depth == 0:
+                    current.append(escaped)
+            else:
+                # Classes (\d, \s), anchors (\b) and control characters (\n) end the run
+                runs.append(''.join(current))
+                current = []
+            index += 2
+            continue
+        if char == '[':
+            runs.append(''.join(current))
+            current = []
+            index += 1
+            # A leading ']' (after an optional '^') is part of the class, not its end
+            if regex_pattern[index:index + 1] == '^':
+                index += 1
+            if regex_pattern[index:index + 1] == ']':
+                index += 1
+            while index < len(regex_pattern) and regex_pattern[index] != ']':
+                index += 2 if regex_pattern[index] == '\\' else 1
+        elif char in '*?{':
+            # The character before an optional quantifier may not be present at all
+            if current:
+                current.pop()
+            runs.append(''.join(current))
+            current = []
+            if char == '{':
+                while index < len(regex_pattern) and regex_pattern[index] != '}':
+                    index += 1
+        elif char in '().^$+':
+            runs.append(''.join(current))
+            current = []
+            depth += {'(': 1, ')': -1}.get(char, 0)
+        elif depth == 0:
+            current.append(char)
+        index += 1
+    runs.append(''.join(current))
+
+    literal = max(runs, key=len).lower()
+    if len(literal) < PREFILTER_MIN_LENGTH or not literal.isascii():
+        return None
+    return literal
+
+class CategorizationRule:
+    """
+    A transaction pattern with its regex compiled and its type/budget groups loaded.
+    """
+    __slots__ = ('pattern_id', 'regex_pattern', 'regex', 'transaction_type', 'comments', 'priority', 'account_name_id')
+
+    def __init__(self, pattern_id, regex_pattern, transaction_type, comments=None, priority=0, account_name_id=None):
+        self.pattern_id = pattern_id
+        self.regex_pattern = regex_pattern
+        self.regex = re.compile(regex_pattern, re.IGNORECASE)
+        self.transaction_type = transaction_type
+        self.comments = comments
+        self.priority = priority
+        self.account_name_id = account_name_id
+
+    @classmethod
+    def from_pattern(cls, pattern):
+        return cls(pattern.id, pattern.regex_pattern, pattern.transaction_type, pattern.comments,
+                   pattern.priority, pattern.account_name_id)
+
+    def sort_key(self):
+        """
+        Evaluation order: account patterns before global ones, then by descending
+        priority, then by id (patterns not saved yet last, as they get the next id).
+        """
+        return (
+            self.account_name_id is None,
+            -self.priority,
+            self.pattern_id is None,
+            self.pattern_id or 0,
+        )
+
+    def resolve(self, amount):
+        """
+        Return the (transaction_type, budget_group, comments) triple for a matched amount.
+        """
+        transaction_type = self.transaction_type
+        budget_group = transaction_type.default_budget_group
+        if transaction_type.amount_threshold and amount >= transaction_type.amount_threshold:
+            budget_group = transaction_type.threshold_budget_group
+        return transaction_type, budget_group, self.comments
+
+class SequentialMatcher:
+    """
+    Tries each rule's regex in turn and returns the first rule that matches.
+    """
+    def __init__(self, rules):
+        self.rules = rules
+
+    def match(self, description):
+        for rule in self.rules:
+            if rule.regex.search(description):
+                return rule
+        return None
+
+class IndexedMatcher:
+    """
+    Prefilters rules with a trigram index over their required literals.
+
+    Each rule with a required literal is filed under one trigram of that literal
+    (the least crowded one), so scanning the description's trigrams once yields
+    the few rules that could possibly match. Only those candidates, plus the rules
+    without a usable literal, are searched, still in rule order, so first-match
+    semantics are unchanged.
+    """
+    def __init__(self, rules):
+        self.rules = rules
+        self.literals = [required_literal(rule.regex_pattern) for rule in rules]
+        self.unindexed = [index for index, literal in enumerate(self.literals) if literal is None]
+        self.buckets = {}
+        for index, literal in enumerate(self.literals):
+            if literal is None:
+                continue
+            trigrams = {literal[start:start + 3] for start in range(len(literal) - 2)}
+            trigram = min(trigrams, key=lambda trigram: (len(self.buckets.get(trigram, ())), trigram))
+            self.buckets.setdefault(trigram, []).append(index)
+        self.sequential = SequentialMatcher(rules)
+
+    def match(self, description):
+        # Lowercase comparison only mirrors re.IGNORECASE reliably for ASCII text
+        if not description.isascii():
+            return self.sequential.match(description)
+        lowered = description.lower()
+        candidates = set(self.unindexed)
+        for start in range(len(lowered) - 2):
+            bucket = self.buckets.get(lowered[start:start + 3])
+            if bucket:
+                candidates.update(bucket)
+        for index in sorted(candidates):
+            literal = self.literals[index]
+            if literal is not None and literal not in lowered:
+                continue
+            rule = self.rules[index]
+            if rule.regex.search(description):
+                return rule
+        return None
+
+class Categorizer:
+    """
+    Categorizes transaction descriptions against an ordered list of compiled rules.
+
+    The first rule whose regex matches the description wins, in the same order
+    the rules were given. The matcher mode defaults to the
+    CATEGORIZATION_MATCHER setting.
+
+    Bank exports repeat the same descriptions many times, so the matched rule
+    of the most recent `memo_size` distinct descriptions is memoized (default:
+    the CATEGORIZATION_MEMO_SIZE setting, 0 disables it). A categorizer holds
+    one account's rules at one patterns version, so the memo is effectively
+    keyed on (account, description, version). Amount thresholds are applied
+    after the lookup.
+    """
+    def __init__(self, rules, version=None, mode=None, memo_size=None):
+        self.rules = list(rules)
+        self.version = version
+        self.mode = mode or settings.CATEGORIZATION_MATCHER
+        if self.mode not in MATCHER_MODES:
+            raise ValueError(f"Unsupported categorization matcher: {self.mode}")
+        if self.mode == 'indexed' and len(self.rules) >= INDEXED_MATCHER_MIN_RULES:
+            self.matcher = IndexedMatcher(self.rules)
+        else:
+            self.matcher = SequentialMatcher(self.rules)
+        memo_size = settings.CATEGORIZATION_MEMO_SIZE if memo_size is None else memo_size
+        self.memo = lru_cache(maxsize=memo_size)(self.matcher.match) if memo_size else None
+
+    @classmethod
+    def for_account(cls, account_name, version=None):
+        """
+        Load and compile the patterns of an account and the global patterns with a single query.
+
+        The account's own patterns are tried first, then the patterns without an
+        account, each by descending priority and then by id.
+        """
+        patterns = (
+            TransactionPattern.objects
+            .filter(Q(account_name=account_name) | Q(account_name__isnull=True))
+            .select_related('transaction_type__default_budget_group', 'transaction_type__threshold_budget_group')
+        )
+        rules = []
+        for pattern in patterns:
+            try:
+                rules.append(CategorizationRule.from_pattern(pattern))
+            except re.error as e:
+                logger.warning("Skipping transaction pattern %s with invalid regex %r: %s", pattern.id, pattern.regex_pattern, e)
+        rules.sort(key=CategorizationRule.sort_key)
+        return cls(rules, version=version)
+
+    def match(self, description):
+        """
+        Return the first rule matching the description, or None.
+        """
+        if self.memo is not None:
+            return self.memo(description)
+        return self.matcher.match(description)
+
+    def memo_stats(self):
+        if self.memo is None:
+            return {'hits': 0, 'misses': 0, 'size': 0, 'max_size': 0}
+        info = self.memo.cache_info()
+        return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'max_size': info.maxsize}
+
+    def categorize(self, description, amount):
+        rule = self.match(description)
+        if rule is None:
+            return None, None, None
+        return rule.resolve(amount)
+
+    def categorize_many(self, rows):
+        """
+        Categorize an iterable of (description, amount) pairs.
+
+        Returns a list of (transaction_type, budget_group, comments) triples in the
+        same order as the input rows.
+        """
+        return [self.categorize(description, amount) for description, amount in rows]
+
+_categorizers = {}
+# Memo hits and misses of categorizers replaced after a patterns change
+_retired_memo_stats = {'hits': 0, 'misses': 0}
+
+def get_categorizer(account_name):
+    """
+    Return the compiled categorizer for an account (instance or id).
+
+    Categorizers are cached per process and rebuilt whenever the patterns
+    version changes, so a lookup costs a single version query.
+    """
+    account_id = getattr(account_name, 'pk', account_name)
+    version = get_version(PATTERNS)
+    categorizer = _categorizers.get(account_id)
+    if categorizer is None or categorizer.version != version:
+        if categorizer is not None:
+            stats = categorizer.memo_stats()
+            _retired_memo_stats['hits'] += stats['hits']
+            _retired_memo_stats['misses'] += stats['misses']
+        categorizer = Categorizer.for_account(account_id, version=version)
+        _categorizers[account_id] = categorizer
+    return categorizer
+
+def categorizer_stats():
+    """
+    Return the memo hit and miss counts of this process's cached categorizers.
+
+    Totals include categorizers since replaced by a patterns change; the
+    per-account figures cover the current categorizers only.
+    """
+    accounts = []
+    hits = _retired_memo_stats['hits']
+    misses = _retired_memo_stats['misses']
+    for account_id, categorizer in list(_categorizers.items()):
+        stats = categorizer.memo_stats()
+        hits += stats['hits']
+        misses += stats['misses']
+        accounts.append({'account_id': account_id, 'version': categorizer.version, 'rules': len(categorizer.rules), **stats})
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / lookups, 4) if lookups else None,
+        'accounts': accounts,
+    }
+
+def clear_categorizer_cache():
+    _categorizers.clear()
+    _retired_memo_stats.update(hits=0, misses=0)
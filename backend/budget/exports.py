@@ -0,0 +1,78 @@
+import csv
+import io
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from .serializers import TransactionSerializer, values_serializer
+from .utils import chunked
+
+# Exported columns and their lookups; related names are read through joins in the same query
+EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('date', 'date'),
+    ('amount', 'amount'),
+    ('balance', 'balance'),
+    ('description', 'description'),
+    ('source', 'source'),
+    ('account_name', 'account_name__name'),
+    ('budget_group', 'budget_group__name'),
+    ('transaction_type', 'transaction_type__name'),
+    ('budget_group_assignment_type', 'budget_group_assignment_type'),
+    ('transaction_assignment_type', 'transaction_assignment_type'),
+    ('review_status', 'review_status'),
+    ('comments', 'comments'),
+]
+
+def export_rows(queryset, chunk_size=None):
+    """
+    Yield lists of export rows (tuples in EXPORT_COLUMNS order), read from a
+    server-side cursor `chunk_size` rows at a time.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    rows = queryset.values_list(*(lookup for _, lookup in EXPORT_COLUMNS)).iterator(chunk_size=chunk_size)
+    return chunked(rows, chunk_size)
+
+def stream_csv(queryset, chunk_size=None):
+    """
+    Yield the transactions of a queryset as CSV, a header line then a chunk of rows at a time.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _ in EXPORT_COLUMNS])
+    yield buffer.getvalue()
+    for chunk in export_rows(queryset, chunk_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+
+def stream_ndjson(queryset, chunk_size=None):
+    """
+    Yield the transactions of a queryset as newline delimited JSON, a chunk of rows at a time.
+    """
+    headers = [header for header, _ in EXPORT_COLUMNS]
+    encoder = DjangoJSONEncoder()
+    for chunk in export_rows(queryset, chunk_size):
+        yield ''.join(encoder.encode(dict(zip(headers, row))) + '\n' for row in chunk)
+
+def stream_json(queryset, serializer_class=TransactionSerializer, chunk_size=None):
+    """
+    Yield a queryset serialized as a JSON array, a chunk of rows at a time.
+
+    Rows are read from a server-side cursor through the serializer's values
+    fast path, so memory use does not grow with the number of rows.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    values = values_serializer(serializer_class)
+    encoder = DjangoJSONEncoder()
+    rows = queryset.values_list(*values.columns).iterator(chunk_size=chunk_size)
+    separator = '['
+    for chunk in chunked(rows, chunk_size):
+        yield separator + ','.join(encoder.encode(values.convert(row)) for row in chunk)
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+# Export formats: content type and stream
+EXPORT_FORMATS = {
+    'csv': ('text/csv', stream_csv),
+    'ndjson': ('application/x-ndjson', stream_ndjson),
+}
@@ -0,0 +1,43 @@
+from datetime import datetime
+from .search import search_transactions
+
+def filter_transactions(transactions, params):
+    """
+    Apply the transaction list filters in `params` (a QueryDict or dict) to a queryset.
+
+    Supported filters:
+    - dateFrom / dateTo: inclusive date range (format: YYYY-MM-DD)
+    - description: every word matched case-insensitively in the description
+    - search_comments: 'true' to match description words in the comments as well
+    - type: transaction type ID
+    - budget: budget group ID
+    - account: account ID
+    - review_status: review status
+    """
+    date_from = params.get('dateFrom')
+    date_to = params.get('dateTo')
+    description = params.get('description')
+    transaction_type = params.get('type')
+    budget_group = params.get('budget')
+    account = params.get('account')
+    review_status = params.get('review_status')
+
+    if date_from:
+        date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
+        transactions = transactions.filter(date__gte=date_from)
+    if date_to:
+        date_to = datetime.strptime(date_to, '%Y-%m-%d').date()
+        transactions = transactions.filter(date__lte=date_to)
+    if description:
+        include_comments = params.get('search_comments', '').lower() == 'true'
+        transactions = search_transactions(transactions, description, include_comments)
+    if transaction_type:
+        transactions = transactions.filter(transaction_type=transaction_type)
+    if budget_group:
+        transactions = transactions.filter(budget_group=budget_group)
+    if account:
+        transactions = transactions.filter(account_name=account)
+    if review_status:
+        transactions = transactions.filter(review_status=review_status)
+
+    return transactions
@@ -1,9 +1,9 @@
 from django import forms
 from .models import AccountName, BudgetGroup, TransactionType
-from django.conf import settings
+from .bank_formats import bank_format_names
 
 class TransactionImportForm(forms.Form):
-    IMPORT_FORMATS = [(k, v) for k, v in settings.BANK_FORMATS.items()]
+    IMPORT_FORMATS = [(k, v) for k, v in bank_format_names().items()]
 
     file = forms.FileField(label='Select a file')
     import_format = forms.ChoiceField(label='Import Format', choices=IMPORT_FORMATS)
@@ -0,0 +1,251 @@
+import re
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from .models import Transaction, TransactionPattern, TransactionType
+from .categorization import get_categorizer
+from .ledger import instance_cells, refresh_budget_ledger
+from .utils import chunked
+from .versioning import bump_version, PATTERNS, TRANSACTIONS, TRANSACTION_TYPES
+
+# Only the first errors are reported in full; a wrong import format fails every row
+MAX_REPORTED_ERRORS = 100
+
+# Foreign keys and assignment types are resolved by the importer itself, so
+# they are skipped when validating rows (validating a foreign key costs a query).
+UNVALIDATED_FIELDS = ['account_name', 'budget_group', 'transaction_type',
+                      'budget_group_assignment_type', 'transaction_assignment_type']
+
+def fill_missing_dedupe_keys(batch_size=1000):
+    """
+    Compute the dedupe key of transactions stored before the key existed.
+
+    Returns the number of transactions updated.
+    """
+    updated = 0
+    while True:
+        transactions = list(
+            Transaction.objects.filter(dedupe_key='')
+            .only('id', 'account_name', 'date', 'amount', 'description', 'balance')[:batch_size]
+        )
+        if not transactions:
+            return updated
+        updated_at = timezone.now()
+        for transaction in transactions:
+            transaction.dedupe_key = transaction.compute_dedupe_key()
+            transaction.updated_at = updated_at
+        Transaction.objects.bulk_update(transactions, ['dedupe_key', 'updated_at'])
+        bump_version(TRANSACTIONS)
+        updated += len(transactions)
+
+class TransactionImporter:
+    """
+    Imports parsed transaction rows for one account in fixed-size batches.
+
+    The rows are consumed lazily, so memory use is bounded by the batch size
+    rather than the file size. Each batch is validated in memory, checked
+    against the account's existing transactions with a single query over the
+    batch's dedupe keys, categorized in one pass and written with bulk_create.
+    All batches share one database transaction: if any row is invalid, the
+    remaining rows are still validated, nothing is saved and the row errors are
+    reported.
+
+    If given, `progress` is called with the importer after every batch.
+    """
+    def __init__(self, account_name, import_format, batch_size=None, progress=None):
+        self.account_name = account_name
+        self.import_format = import_format
+        self.batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+        self.progress = progress
+        self.parsed = 0
+        self.created = 0
+        self.duplicates = 0
+        self.uncategorized = 0
+        self.error_count = 0
+        self.errors = []
+        self.ledger_cells = set()
+
+    def build_transaction(self, row_number, row):
+        """
+        Return an unsaved Transaction for a parsed row, or None if the row is invalid.
+        """
+        transaction = Transaction(
+            date=row['date'],
+            amount=row['amount'],
+            balance=row['balance'],
+            description=row['description'],
+            source=self.import_format,
+            account_name=self.account_name,
+        )
+        try:
+            transaction.clean_fields(exclude=UNVALIDATED_FIELDS)
+        except ValidationError as e:
+            self.error_count += 1
+            if len(self.errors) < MAX_REPORTED_ERRORS:
+                self.errors.append({'row': row_number, 'errors': e.message_dict})
+            return None
+        transaction.dedupe_key = transaction.compute_dedupe_key()
+        return transaction
+
+    def existing_keys(self, transactions):
+        keys = [transaction.dedupe_key for transaction in transactions]
+        return set(Transaction.objects.filter(dedupe_key__in=keys).values_list('dedupe_key', flat=True))
+
+    def categorize(self, transactions):
+        categorizer = get_categorizer(self.account_name)
+        categories = categorizer.categorize_many(
+            (transaction.description, transaction.amount) for transaction in transactions
+        )
+        for transaction, (transaction_type, budget_group, pattern_comments) in zip(transactions, categories):
+            transaction.transaction_type = transaction_type
+            transaction.budget_group = budget_group
+            transaction.transaction_assignment_type = 'auto_unchecked' if transaction_type else 'unassigned'
+            transaction.budget_group_assignment_type = 'auto_unchecked' if budget_group else 'unassigned'
+            transaction.comments = pattern_comments
+
+    def import_batch(self, rows):
+        transactions = []
+        for row_number, row in rows:
+            transaction = self.build_transaction(row_number, row)
+            if transaction is not None:
+                transactions.append(transaction)
+        self.parsed += len(rows)
+
+        # Once a row has failed the import will be rolled back, so only keep validating
+        if self.error_count or not transactions:
+            return
+
+        existing_keys = self.existing_keys(transactions)
+        new_transactions = [transaction for transaction in transactions if transaction.dedupe_key not in existing_keys]
+        self.duplicates += len(transactions) - len(new_transactions)
+
+        self.categorize(new_transactions)
+        Transaction.objects.bulk_create(new_transactions)
+        for transaction in new_transactions:
+            self.ledger_cells |= instance_cells(transaction)
+        self.created += len(new_transactions)
+        self.uncategorized += sum(transaction.transaction_type is None for transaction in new_transactions)
+
+    def run(self, transaction_data):
+        """
+        Import the rows and return True if they were saved, False if any row was invalid.
+        """
+        # Rows stored before dedupe keys existed must have one to be recognised
+        if Transaction.objects.filter(dedupe_key='').exists():
+            fill_missing_dedupe_keys()
+
+        with db_transaction.atomic():
+            for rows in chunked(enumerate(transaction_data, start=1), self.batch_size):
+                self.import_batch(rows)
+                if self.progress:
+                    self.progress(self)
+            if self.error_count:
+                db_transaction.set_rollback(True)
+                self.created = 0
+                self.uncategorized = 0
+                return False
+            # bulk_create skips the model signals that keep budget balances and versions current
+            refresh_budget_ledger(self.ledger_cells)
+            if self.created:
+                bump_version(TRANSACTIONS)
+        return True
+
+PATTERN_COLUMNS = ('Pattern', 'Category')
+
+def validate_pattern_row(row):
+    """
+    Return (regex_pattern, type name, comments, priority, errors) for a pattern CSV row.
+    """
+    errors = {}
+    regex_pattern = (row.get('Pattern') or '').strip()
+    type_name = (row.get('Category') or '').strip()
+    comments = row.get('Comments') or ''
+    priority = None
+
+    if not regex_pattern:
+        errors['Pattern'] = ['This field is required.']
+    elif len(regex_pattern) > TransactionPattern._meta.get_field('regex_pattern').max_length:
+        errors['Pattern'] = ['Pattern is too long.']
+    else:
+        try:
+            re.compile(regex_pattern, re.IGNORECASE)
+        except re.error as e:
+            errors['Pattern'] = [f'Invalid regex: {e}']
+    if not type_name:
+        errors['Category'] = ['This field is required.']
+    elif len(type_name) > TransactionType._meta.get_field('name').max_length:
+        errors['Category'] = ['Category is too long.']
+    if (row.get('Priority') or '').strip():
+        try:
+            priority = int(row['Priority'])
+        except ValueError:
+            errors['Priority'] = ['Priority must be an integer.']
+    return regex_pattern, type_name, comments, priority, errors
+
+def import_patterns(reader, account_name):
+    """
+    Create or update an account's transaction patterns from pattern CSV rows.
+
+    Every row is validated, and every regex compiled, before anything is
+    written; if any row is invalid nothing is saved. Otherwise missing
+    transaction types are created and all patterns are upserted on
+    (regex_pattern, account_name) with one bulk statement each, in a single
+    transaction. A later row for the same pattern replaces an earlier one.
+    The optional Priority column sets pattern priorities.
+
+    Returns (result counts, row errors).
+    """
+    rows = {}
+    errors = []
+    for row_number, row in enumerate(reader, start=1):
+        regex_pattern, type_name, comments, priority, row_errors = validate_pattern_row(row)
+        if row_errors:
+            errors.append({'row': row_number, 'errors': row_errors})
+        else:
+            rows[regex_pattern] = (type_name, comments, priority)
+    if errors:
+        return None, errors
+
+    with db_transaction.atomic():
+        type_names = {type_name for type_name, _, _ in rows.values()}
+        types = dict(TransactionType.objects.filter(name__in=type_names).values_list('name', 'id'))
+        missing_types = type_names - types.keys()
+        if missing_types:
+            TransactionType.objects.bulk_create([TransactionType(name=name) for name in missing_types], ignore_conflicts=True)
+            types = dict(TransactionType.objects.filter(name__in=type_names).values_list('name', 'id'))
+            bump_version(TRANSACTION_TYPES)
+
+        existing = set(
+            TransactionPattern.objects.filter(account_name=account_name, regex_pattern__in=rows.keys())
+            .values_list('regex_pattern', flat=True)
+        )
+        patterns = []
+        for regex_pattern, (type_name, comments, priority) in rows.items():
+            pattern = TransactionPattern(
+                regex_pattern=regex_pattern,
+                account_name=account_name,
+                transaction_type_id=types[type_name],
+                comments=comments,
+            )
+            if priority is not None:
+                pattern.priority = priority
+            patterns.append(pattern)
+
+        update_fields = ['transaction_type', 'comments']
+        if any(priority is not None for _, _, priority in rows.values()):
+            update_fields.append('priority')
+        TransactionPattern.objects.bulk_create(
+            patterns,
+            update_conflicts=True,
+            unique_fields=['regex_pattern', 'account_name'],
+            update_fields=update_fields
+        )
+        # bulk_create skips the signals that invalidate the compiled categorizers
+        bump_version(PATTERNS)
+
+    return {
+        'created': len(rows) - len(existing),
+        'updated': len(existing),
+        'types_created': len(missing_types),
+    }, []
@@ -0,0 +1,151 @@
+import logging
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Repeated statements listed when logging a slow request
+TOP_STATEMENTS = 5
+
+_lock = threading.Lock()
+_view_stats = defaultdict(lambda: {
+    'requests': 0,
+    'slow_requests': 0,
+    'queries': 0,
+    'max_queries': 0,
+    'db_seconds': 0.0,
+    'total_seconds': 0.0,
+    'max_seconds': 0.0,
+})
+
+class QueryRecorder:
+    """
+    Counts and times the SQL statements run on every database connection while active.
+
+    Statements are grouped by their SQL with the parameters left out, so a
+    query repeated per row (an N+1) shows up as one statement with a high count.
+    """
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = Counter()
+        self.statement_seconds = defaultdict(float)
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.db_seconds += elapsed
+            self.statements[sql] += 1
+            self.statement_seconds[sql] += elapsed
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for alias in connections:
+            self._stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def repeated_statements(self, limit=TOP_STATEMENTS):
+        """
+        Return the statements run more than once, most repeated first.
+        """
+        return [
+            {'sql': sql, 'count': count, 'seconds': round(self.statement_seconds[sql], 6)}
+            for sql, count in self.statements.most_common(limit)
+            if count > 1
+        ]
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return f"{request.method} (unresolved)"
+    return f"{request.method} /{match.route}"
+
+def record_request(view, recorder, seconds, slow):
+    with _lock:
+        stats = _view_stats[view]
+        stats['requests'] += 1
+        stats['slow_requests'] += slow
+        stats['queries'] += recorder.queries
+        stats['max_queries'] = max(stats['max_queries'], recorder.queries)
+        stats['db_seconds'] += recorder.db_seconds
+        stats['total_seconds'] += seconds
+        stats['max_seconds'] = max(stats['max_seconds'], seconds)
+
+def query_stats():
+    """
+    Return the aggregated per-view statistics of the requests measured by this process.
+    """
+    with _lock:
+        views = [(view, dict(stats)) for view, stats in _view_stats.items()]
+    return {
+        'sample_rate': settings.QUERY_INSTRUMENTATION_SAMPLE_RATE,
+        'slow_request_ms': settings.SLOW_REQUEST_MS,
+        'views': sorted((
+            {
+                'view': view,
+                **stats,
+                'db_seconds': round(stats['db_seconds'], 6),
+                'total_seconds': round(stats['total_seconds'], 6),
+                'max_seconds': round(stats['max_seconds'], 6),
+                'avg_queries': round(stats['queries'] / stats['requests'], 2),
+                'avg_db_ms': round(stats['db_seconds'] * 1000 / stats['requests'], 3),
+                'avg_total_ms': round(stats['total_seconds'] * 1000 / stats['requests'], 3),
+            }
+            for view, stats in views
+        ), key=lambda stats: -stats['total_seconds']),
+    }
+
+def clear_query_stats():
+    with _lock:
+        _view_stats.clear()
+
+class QueryInstrumentationMiddleware:
+    """
+    Records the query count, database time and total time of a sample of requests, per view.
+
+    Enabled by setting QUERY_INSTRUMENTATION_SAMPLE_RATE above 0; requests
+    outside the sample are passed straight through. Measured requests slower
+    than SLOW_REQUEST_MS are logged with their most repeated statements. The
+    aggregated statistics are kept per process and served by the query-stats
+    debug endpoint.
+    """
+    def __init__(self, get_response):
+        self.sample_rate = settings.QUERY_INSTRUMENTATION_SAMPLE_RATE
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+        self.slow_seconds = settings.SLOW_REQUEST_MS / 1000
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        seconds = time.perf_counter() - start
+
+        view = view_name(request)
+        slow = seconds >= self.slow_seconds
+        record_request(view, recorder, seconds, slow)
+        if slow:
+            logger.warning(
+                "Slow request %s %s (%s): %.1f ms, %d queries, %.1f ms in the database; repeated statements: %s",
+                request.method, request.get_full_path(), view, seconds * 1000, recorder.queries,
+                recorder.db_seconds * 1000, recorder.repeated_statements() or 'none'
+            )
+        return response
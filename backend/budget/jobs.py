@@ -0,0 +1,160 @@
+import csv
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection, transaction as db_transaction
+from django.utils import timezone
+from .models import ImportJob
+from .importer import TransactionImporter
+from .utils import parse_transaction_data, detect_duplicates
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_CACHE_TIMEOUT = 60 * 60 * 24
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """
+    Return the process-wide thread pool that runs import jobs, creating it on first use.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.IMPORT_JOB_WORKERS, thread_name_prefix='import-job')
+    return _executor
+
+def progress_cache_key(job_id):
+    return f'budget:import-job-progress:{job_id}'
+
+def get_live_progress(job_id):
+    return cache.get(progress_cache_key(job_id))
+
+def report_progress(job_id, importer):
+    cache.set(progress_cache_key(job_id), {
+        'rows_parsed': importer.parsed,
+        'rows_inserted': importer.created,
+        'rows_duplicate': importer.duplicates,
+        'rows_uncategorized': importer.uncategorized,
+        'error_count': importer.error_count,
+        'updated_at': timezone.now(),
+    }, PROGRESS_CACHE_TIMEOUT)
+
+def job_file_path(job_id):
+    return os.path.join(settings.IMPORT_JOB_DIR, f'import-job-{job_id}.csv')
+
+def remove_job_file(job_id):
+    path = job_file_path(job_id)
+    if os.path.exists(path):
+        os.remove(path)
+
+def queue_import_job(uploaded_file, account_name, import_format):
+    """
+    Store an uploaded CSV file and queue a background job to import it.
+
+    The job is saved together with its file: if the upload cannot be written,
+    the partial file is removed, the job is rolled back and the error raised.
+    """
+    os.makedirs(settings.IMPORT_JOB_DIR, exist_ok=True)
+    with db_transaction.atomic():
+        job = ImportJob.objects.create(
+            account_name=account_name,
+            import_format=import_format,
+            file_name=uploaded_file.name or '',
+        )
+        try:
+            with open(job_file_path(job.id), 'wb') as f:
+                for chunk in uploaded_file.chunks():
+                    f.write(chunk)
+        except BaseException:
+            remove_job_file(job.id)
+            raise
+        db_transaction.on_commit(lambda: get_executor().submit(run_import_job, job.id))
+    return job
+
+def fail_stale_jobs():
+    """
+    Mark queued or running jobs that have not progressed for IMPORT_JOB_TIMEOUT seconds as failed.
+
+    Jobs only run in the thread pool of the process that queued them, so a
+    restart leaves its jobs queued or running for good. Those jobs are failed
+    and their stored uploads removed. Returns the number of jobs failed.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=settings.IMPORT_JOB_TIMEOUT)
+    stale = []
+    for job_id in ImportJob.objects.filter(status__in=ACTIVE_STATUSES, updated_at__lt=cutoff).values_list('id', flat=True):
+        # A running job only saves itself when it finishes, its progress shows it is alive
+        progress = get_live_progress(job_id)
+        if progress is None or progress['updated_at'] < cutoff:
+            stale.append(job_id)
+    if not stale:
+        return 0
+
+    failed = ImportJob.objects.filter(id__in=stale, status__in=ACTIVE_STATUSES).update(
+        status='failed',
+        errors=[{'error': 'The import job stopped without finishing, the server may have been restarted'}],
+        finished_at=now,
+        updated_at=now,
+    )
+    for job_id in stale:
+        remove_job_file(job_id)
+        cache.delete(progress_cache_key(job_id))
+    logger.warning("Failed %s stale import jobs", failed)
+    return failed
+
+def run_import_job(job_id):
+    """
+    Import the stored CSV file of an ImportJob and record the outcome on the job.
+
+    The import itself runs in a single database transaction, so progress is
+    published to the cache while the job is running and saved on the job once
+    it finishes. Jobs no longer queued, e.g. failed as stale, are skipped.
+    """
+    close_old_connections()
+    path = job_file_path(job_id)
+    try:
+        job = ImportJob.objects.select_related('account_name').get(id=job_id)
+        if job.status != 'queued':
+            return
+        job.status = 'running'
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at', 'updated_at'])
+
+        importer = TransactionImporter(
+            job.account_name,
+            job.import_format,
+            progress=lambda importer: report_progress(job_id, importer)
+        )
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as f:
+                reader = csv.reader(f)
+                succeeded = importer.run(detect_duplicates(parse_transaction_data(reader, job.import_format)))
+            job.status = 'completed' if succeeded else 'failed'
+            job.errors = importer.errors
+        except Exception as e:
+            logger.exception("Import job %s failed", job_id)
+            job.status = 'failed'
+            job.errors = [{'error': str(e)}]
+
+        job.rows_parsed = importer.parsed
+        job.rows_inserted = importer.created
+        job.rows_duplicate = importer.duplicates
+        job.rows_uncategorized = importer.uncategorized
+        job.error_count = importer.error_count
+        job.finished_at = timezone.now()
+        job.save()
+        cache.delete(progress_cache_key(job_id))
+    except Exception:
+        logger.exception("Import job %s could not be run", job_id)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+        connection.close()
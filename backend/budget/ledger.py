@@ -0,0 +1,205 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db import connection, transaction as db_transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from .models import BudgetGroup, BudgetMonthSummary, BudgetInitialization, BudgetAdjustment, Transaction
+
+ZERO = Decimal('0.00')
+
+SUMMARY_FIELDS = ['initialized', 'adjusted_in', 'adjusted_out', 'transactions_total']
+
+# Every source of a budget group's balance: (model, budget group field, summary field)
+LEDGER_SOURCES = (
+    (BudgetInitialization, 'budget_group', 'initialized'),
+    (BudgetAdjustment, 'to_budget_group', 'adjusted_in'),
+    (BudgetAdjustment, 'from_budget_group', 'adjusted_out'),
+    (Transaction, 'budget_group', 'transactions_total'),
+)
+
+LEDGER_MODELS = (BudgetInitialization, BudgetAdjustment, Transaction)
+
+def month_start(day):
+    return day.replace(day=1)
+
+def next_month(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def group_fields(model):
+    return [group_field for source_model, group_field, _ in LEDGER_SOURCES if source_model is model]
+
+def instance_cells(instance):
+    """
+    Return the (budget group id, month) summary cells a ledger row counts towards.
+    """
+    day = instance._meta.get_field('date').to_python(instance.date)
+    if day is None:
+        return set()
+    month = month_start(day)
+    cells = set()
+    for group_field in group_fields(type(instance)):
+        budget_group_id = getattr(instance, f'{group_field}_id')
+        if budget_group_id is not None:
+            cells.add((budget_group_id, month))
+    return cells
+
+def queryset_cells(queryset):
+    """
+    Return the summary cells the rows of a ledger model queryset count towards.
+
+    Call it before a bulk update to find the cells its rows counted towards.
+    """
+    cells = set()
+    for group_field in group_fields(queryset.model):
+        cells.update(
+            queryset.filter(**{f'{group_field}__isnull': False})
+            .annotate(ledger_month=TruncMonth('date'))
+            .values_list(group_field, 'ledger_month')
+            .order_by()
+            .distinct()
+        )
+    return cells
+
+def queryset_months(queryset):
+    """
+    Return the months of the dates in a ledger model queryset.
+    """
+    return set(queryset.annotate(ledger_month=TruncMonth('date')).values_list('ledger_month', flat=True).order_by().distinct())
+
+def aggregate_ledger(budget_groups=None, start=None, end=None):
+    """
+    Sum the ledger sources by (budget group id, month) for dates in [start, end).
+
+    Returns a dict of summary field totals per cell; cells without rows read as zero.
+    """
+    totals = defaultdict(lambda: dict.fromkeys(SUMMARY_FIELDS, ZERO))
+    for model, group_field, summary_field in LEDGER_SOURCES:
+        rows = model.objects.filter(**{f'{group_field}__isnull': False})
+        if budget_groups is not None:
+            rows = rows.filter(**{f'{group_field}__in': budget_groups})
+        if start is not None:
+            rows = rows.filter(date__gte=start)
+        if end is not None:
+            rows = rows.filter(date__lt=end)
+        rows = (
+            rows.annotate(ledger_month=TruncMonth('date'))
+            .values(group_field, 'ledger_month')
+            .annotate(total=Sum('amount'))
+            .order_by()
+        )
+        for row in rows:
+            totals[(row[group_field], row['ledger_month'])][summary_field] = row['total']
+    return totals
+
+def lock_ledger_cells(cells):
+    """
+    Take a transaction level advisory lock on each summary cell, in a fixed order.
+
+    Two transactions refreshing the same cell would otherwise each write the
+    totals they saw, and the one committing last could drop the other's rows.
+    Holding the lock until commit makes the second refresh wait and then sum
+    the first one's committed rows. Only PostgreSQL needs it: SQLite already
+    serializes writing transactions.
+
+    The two-key lock takes integers, so budget group ids (bigint) are folded
+    into that range. Ids past it can share a key, which only makes unrelated
+    refreshes wait on each other. Locks are taken in key order.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    budget_groups, months = zip(*((budget_group_id, month.year * 12 + month.month - 1) for budget_group_id, month in cells))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_advisory_xact_lock(cell.lock_key, cell.month) '
+            'FROM (SELECT DISTINCT (cell.budget_group_id %% 2147483648)::integer AS lock_key, cell.month '
+            'FROM unnest(%s::bigint[], %s::integer[]) AS cell (budget_group_id, month) '
+            'ORDER BY lock_key, cell.month) AS cell',
+            [list(budget_groups), list(months)]
+        )
+
+def refresh_budget_ledger(cells):
+    """
+    Recompute the given (budget group id, month) summary cells from their source rows.
+
+    Model signals refresh the cells of rows saved or deleted one at a time. Bulk
+    writes (queryset.update, bulk_create, bulk_update) must call this with the
+    cells they touched, inside the transaction making the writes, so the cells
+    stay locked until those writes are committed.
+    """
+    if not cells:
+        return
+    budget_groups = {budget_group_id for budget_group_id, _ in cells}
+    months = {month for _, month in cells}
+    with db_transaction.atomic(savepoint=False):
+        lock_ledger_cells(cells)
+        totals = aggregate_ledger(budget_groups, min(months), next_month(max(months)))
+        summaries = [
+            BudgetMonthSummary(budget_group_id=budget_group_id, month=month, **totals[(budget_group_id, month)])
+            for budget_group_id, month in cells
+        ]
+        BudgetMonthSummary.objects.bulk_create(
+            summaries,
+            update_conflicts=True,
+            unique_fields=['budget_group', 'month'],
+            update_fields=SUMMARY_FIELDS
+        )
+
+def rebuild_budget_ledger():
+    """
+    Recompute the whole summary table. Returns the number of summary rows.
+    """
+    with db_transaction.atomic():
+        BudgetMonthSummary.objects.all().delete()
+        summaries = [
+            BudgetMonthSummary(budget_group_id=budget_group_id, month=month, **month_totals)
+            for (budget_group_id, month), month_totals in aggregate_ledger().items()
+        ]
+        BudgetMonthSummary.objects.bulk_create(summaries, batch_size=1000)
+    return len(summaries)
+
+def ensure_budget_ledger():
+    """
+    Build the summary table if it is empty while there are ledger rows, e.g. right after it was added.
+    """
+    if BudgetMonthSummary.objects.exists():
+        return
+    if any(model.objects.exists() for model in LEDGER_MODELS):
+        rebuild_budget_ledger()
+
+def budget_balances(as_of=None):
+    """
+    Return the balance of every budget group at the end of `as_of` (default: today).
+
+    Whole months come from the summary table; only the days of the last,
+    incomplete month are summed from the source rows. A group's balance is its
+    initializations plus adjustments in, minus adjustments out, plus its
+    transaction amounts (expenses being negative).
+    """
+    ensure_budget_ledger()
+    as_of = as_of or date.today()
+    month = month_start(as_of)
+    month_complete = next_month(month) - timedelta(days=1) == as_of
+
+    totals = defaultdict(lambda: dict.fromkeys(SUMMARY_FIELDS, ZERO))
+    summaries = BudgetMonthSummary.objects.filter(month__lte=month) if month_complete else BudgetMonthSummary.objects.filter(month__lt=month)
+    for row in summaries.values('budget_group').annotate(**{field: Sum(field) for field in SUMMARY_FIELDS}).order_by():
+        totals[row['budget_group']] = {field: row[field] for field in SUMMARY_FIELDS}
+    if not month_complete:
+        for (budget_group_id, _), month_totals in aggregate_ledger(None, month, as_of + timedelta(days=1)).items():
+            for field in SUMMARY_FIELDS:
+                totals[budget_group_id][field] += month_totals[field]
+
+    balances = []
+    for budget_group in BudgetGroup.objects.order_by('name'):
+        group_totals = totals[budget_group.id]
+        balances.append({
+            'budget_group': budget_group.id,
+            'budget_group_name': budget_group.name,
+            **group_totals,
+            'balance': (
+                group_totals['initialized'] + group_totals['adjusted_in']
+                - group_totals['adjusted_out'] + group_totals['transactions_total']
+            ),
+        })
+    return balances
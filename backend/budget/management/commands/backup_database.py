@@ -1,10 +1,35 @@
 from django.core.management.base import BaseCommand
 from django.core.management import call_command
+from budget.backups import BackupError, latest_archive, write_archive
 import os
 from datetime import datetime
 
 class Command(BaseCommand):
-    help = 'Backup the database using Django dumpdata'
+    help = (
+        'Backup the database using Django dumpdata, or with --archive into a directory '
+        'of compressed NDJSON files per model with a manifest, optionally incremental'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--archive',
+            action='store_true',
+            help='Stream each model in chunks to a gzipped NDJSON file in a new backup directory, with a manifest.',
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='With --archive, only back up the rows changed since the latest archive (or --base).',
+        )
+        parser.add_argument(
+            '--base',
+            help='Archive directory an incremental backup builds on (default: the latest one).',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Rows read per database round trip (default: EXPORT_CHUNK_SIZE).',
+        )
 
     def handle(self, *args, **options):
         backup_dir = 'database_backups'
@@ -13,6 +38,11 @@ class Command(BaseCommand):
             os.makedirs(backup_dir)
 
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+        if options['archive']:
+            self.backup_archive(backup_dir, timestamp, options)
+            return
+
         backup_file = f'{backup_dir}/backup_{timestamp}.json'
 
         try:
@@ -20,4 +50,32 @@ class Command(BaseCommand):
                 call_command('dumpdata', '--all', '--indent', '4', stdout=f)
             self.stdout.write(self.style.SUCCESS(f'Successfully backed up database to {backup_file}'))
         except Exception as e:
-            self.stderr.write(self.style.ERROR(f'An error occurred while backing up the database: {str(e)}'))
\ No newline at end of file
+            self.stderr.write(self.style.ERROR(f'An error occurred while backing up the database: {str(e)}'))
+
+    def backup_archive(self, backup_dir, timestamp, options):
+        base = None
+        if options['incremental'] or options['base']:
+            base = options['base'] or latest_archive(backup_dir)
+            if base is None:
+                self.stdout.write(self.style.WARNING('No earlier archive found, making a full backup'))
+        kind = 'incremental' if base else 'full'
+        directory = f'{backup_dir}/backup_{timestamp}_{kind}'
+
+        def progress(label, entry):
+            self.stdout.write(
+                f"{label:<40} {entry['mode']:<12} {entry['rows']:>10} rows {entry['bytes']:>12} bytes {entry['seconds']:>9.3f}s"
+            )
+
+        if base:
+            self.stdout.write(f'Backing up the rows changed since {base}...')
+        try:
+            manifest = write_archive(directory, base=base, chunk_size=options['chunk_size'], progress=progress)
+        except BackupError as e:
+            self.stderr.write(self.style.ERROR(str(e)))
+            return
+        except Exception as e:
+            self.stderr.write(self.style.ERROR(f'An error occurred while backing up the database: {str(e)}'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Successfully backed up {manifest['rows']} rows ({manifest['bytes']} bytes, {kind}) to {directory}"
+        ))
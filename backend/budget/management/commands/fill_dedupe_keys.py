@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from budget.importer import fill_missing_dedupe_keys
+
+class Command(BaseCommand):
+    help = 'Computes the dedupe key of transactions stored before the key existed'
+
+    def handle(self, *args, **options):
+        updated = fill_missing_dedupe_keys()
+        self.stdout.write(self.style.SUCCESS(f'Filled the dedupe key of {updated} transactions.'))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from budget.ledger import rebuild_budget_ledger
+
+class Command(BaseCommand):
+    help = 'Recomputes the monthly budget group summaries behind the budget balances'
+
+    def handle(self, *args, **options):
+        summaries = rebuild_budget_ledger()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {summaries} monthly budget summaries.'))
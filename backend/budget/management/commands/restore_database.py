@@ -3,14 +3,19 @@ from django.core.management import call_command
 from django.db import connection
 from django.apps import apps
 from django.contrib.contenttypes.models import ContentType
+from budget.backups import BackupError, archive_chain, load_archive_chain
+from budget.ledger import rebuild_budget_ledger
+from budget.versioning import bump_version, ALL_VERSIONS
 import os
 import json
 
+EXCLUDED_MODELS = {'contenttypes.contenttype', 'budget.dataversion'}
+
 class Command(BaseCommand):
     help = 'Restore the database from a backup file using Django loaddata'
 
     def add_arguments(self, parser):
-        parser.add_argument('backup_file', type=str, help='Path to the backup file')
+        parser.add_argument('backup_file', type=str, help='Path to the backup file, or to a backup archive directory')
 
     def handle(self, *args, **options):
         backup_file = options['backup_file']
@@ -19,6 +24,14 @@ class Command(BaseCommand):
             self.stderr.write(self.style.ERROR(f'Backup file {backup_file} does not exist'))
             return
 
+        # Check the whole chain of an archive before anything is flushed
+        if os.path.isdir(backup_file):
+            try:
+                archive_chain(backup_file)
+            except BackupError as e:
+                self.stderr.write(self.style.ERROR(str(e)))
+                return
+
         try:
             # Preserve content types
             self.stdout.write("Preserving content types...")
@@ -45,15 +58,28 @@ class Command(BaseCommand):
                     except Exception as e:
                         self.stdout.write(self.style.WARNING(f"Couldn't reset sequence for {table}: {str(e)}"))
 
-            # Load the data from the backup, excluding content types
+            # Load the data from the backup, excluding content types and the data
+            # versions, which the signals recreate while loading and are bumped below
             self.stdout.write("Loading data from backup...")
-            with open(backup_file, 'r') as f:
-                data = json.load(f)
-            filtered_data = [item for item in data if item['model'] != 'contenttypes.contenttype']
-            with open('filtered_backup.json', 'w') as f:
-                json.dump(filtered_data, f)
-            call_command('loaddata', 'filtered_backup.json')
-            os.remove('filtered_backup.json')
+            if os.path.isdir(backup_file):
+                load_archive_chain(
+                    backup_file,
+                    exclude=EXCLUDED_MODELS,
+                    progress=lambda archive, manifest: self.stdout.write(f"Loaded {manifest['rows']} rows from {archive}")
+                )
+            else:
+                with open(backup_file, 'r') as f:
+                    data = json.load(f)
+                filtered_data = [item for item in data if item['model'] not in EXCLUDED_MODELS]
+                with open('filtered_backup.json', 'w') as f:
+                    json.dump(filtered_data, f)
+                call_command('loaddata', 'filtered_backup.json')
+                os.remove('filtered_backup.json')
+
+            # loaddata skips the signals that maintain the budget balance summaries
+            self.stdout.write("Rebuilding budget balances...")
+            rebuild_budget_ledger()
+            bump_version(*ALL_VERSIONS)
             
             self.stdout.write(self.style.SUCCESS(f'Successfully restored database from {backup_file}'))
         except Exception as e:
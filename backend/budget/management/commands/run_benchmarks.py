@@ -0,0 +1,230 @@
+from contextlib import contextmanager, nullcontext
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+import django
+import json
+import platform
+from budget.bank_formats import get_bank_formats
+from budget.benchmarks import benchmark_categorization, benchmark_parsing, benchmark_import, benchmark_serialization, benchmark_export, compare_results
+
+SUITES = ('categorization', 'parsing', 'import', 'serialization', 'export')
+
+# Suites writing to the database, run in a throwaway test database
+DATABASE_SUITES = ('import', 'serialization', 'export')
+
+SQLITE_DATABASE = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+
+def close_default_connection():
+    connections.close_all()
+    try:
+        del connections['default']
+    except AttributeError:
+        pass
+
+@contextmanager
+def sqlite_database():
+    """
+    Point the default connection at an in-memory SQLite database while the block runs.
+    """
+    original = connections.settings['default']
+    close_default_connection()
+    connections.settings['default'] = connections.configure_settings({'default': dict(SQLITE_DATABASE)})['default']
+    try:
+        yield
+    finally:
+        close_default_connection()
+        connections.settings['default'] = original
+
+def subject(result):
+    return ' '.join(f"{field}={result[field]}" for field in ('format', 'patterns', 'peak_kb') if result.get(field) is not None)
+
+class Command(BaseCommand):
+    help = (
+        'Runs the performance benchmarks and prints the results as JSON. '
+        'The import, serialization and export suites run in a throwaway test database, created like the test runner does, '
+        'in memory with SQLite unless --database configured is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--suites',
+            default=','.join(SUITES),
+            help=f"Comma-separated suites to run (default: {','.join(SUITES)}).",
+        )
+        parser.add_argument(
+            '--patterns',
+            default='10,100,1000',
+            help='Comma-separated pattern counts to benchmark (default: 10,100,1000).',
+        )
+        parser.add_argument(
+            '--descriptions',
+            type=int,
+            default=10000,
+            help='Number of synthetic descriptions to categorize (default: 10000).',
+        )
+        parser.add_argument(
+            '--distinct',
+            type=int,
+            help='Draw the descriptions from this many distinct ones (default: all distinct).',
+        )
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=100000,
+            help='Number of synthetic rows parsed per bank format (default: 100000).',
+        )
+        parser.add_argument(
+            '--formats',
+            help='Comma-separated bank formats to parse and import (default: all configured formats).',
+        )
+        parser.add_argument(
+            '--import-rows',
+            default='1000,10000',
+            help='Comma-separated file sizes, in rows, for the import suite (default: 1000,10000).',
+        )
+        parser.add_argument(
+            '--import-patterns',
+            default='10,100',
+            help='Comma-separated pattern counts for the import suite (default: 10,100).',
+        )
+        parser.add_argument(
+            '--serialize-rows',
+            default='10000',
+            help='Comma-separated listing sizes, in rows, for the serialization suite (default: 10000).',
+        )
+        parser.add_argument(
+            '--export-rows',
+            default='10000,100000',
+            help='Comma-separated export sizes, in rows, for the export suite; its peak memory should not grow with them (default: 10000,100000).',
+        )
+        parser.add_argument(
+            '--database',
+            choices=('sqlite', 'configured'),
+            default='sqlite',
+            help="Database of the import, serialization and export suites: an in-memory SQLite one, "
+                 "or a test database on the configured server (default: sqlite).",
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Repetitions per measurement; the best time is kept (default: 3).',
+        )
+        parser.add_argument(
+            '--skip-loop',
+            action='store_true',
+            help='Skip the original re.search loop, which is very slow at large pattern counts.',
+        )
+        parser.add_argument(
+            '--output',
+            help='Also write the JSON results to this file.',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Compare with the results in this JSON file and fail on regressions.',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.2,
+            help='Slowdown over the baseline reported as a regression, as a fraction (default: 0.2).',
+        )
+
+    def handle(self, *args, **options):
+        suites = options['suites'].split(',')
+        unknown = set(suites) - set(SUITES)
+        if unknown:
+            raise CommandError(f"Unknown suites: {', '.join(sorted(unknown))}")
+
+        bank_formats = get_bank_formats()
+        keys = options['formats'].split(',') if options['formats'] else list(bank_formats)
+        missing = [key for key in keys if key not in bank_formats]
+        if missing:
+            raise CommandError(f"Unknown bank formats: {', '.join(missing)}")
+        bank_formats = [bank_formats[key] for key in keys]
+
+        database = None
+        results = []
+        if 'categorization' in suites:
+            results += benchmark_categorization(
+                pattern_counts=[int(count) for count in options['patterns'].split(',')],
+                description_count=options['descriptions'],
+                include_loop=not options['skip_loop'],
+                repeat=options['repeat'],
+                distinct_descriptions=options['distinct'],
+            )
+        if 'parsing' in suites:
+            results += benchmark_parsing(bank_formats, row_count=options['rows'], repeat=options['repeat'])
+        if set(suites) & set(DATABASE_SUITES):
+            with sqlite_database() if options['database'] == 'sqlite' else nullcontext():
+                database, database_results = self.run_database_suites(suites, bank_formats, options)
+            results += database_results
+
+        for result in results:
+            self.stderr.write(
+                f"{result['suite']:<16} {result['mode']:<24} {subject(result):<36} "
+                f"rows={result['rows']:<8} {result['seconds']:>10.4f}s {result['rows_per_second'] or 0:>10} rows/s"
+            )
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': database,
+            'results': results,
+        }
+        regressions = []
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            # Reports written before results had metadata are a plain list
+            if isinstance(baseline, dict):
+                baseline = baseline['results']
+            regressions = compare_results(results, baseline, options['tolerance'])
+            report['regressions'] = regressions
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        self.stdout.write(output)
+
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(
+                    f"Regression: {regression['suite']} {regression['mode']} {subject(regression)} rows={regression['rows']} "
+                    f"{regression['baseline_seconds']:.4f}s -> {regression['seconds']:.4f}s ({regression['slowdown']}x)"
+                )
+            raise CommandError(f"{len(regressions)} benchmarks regressed by more than {options['tolerance']:.0%}")
+
+    def run_database_suites(self, suites, bank_formats, options):
+        """
+        Run the suites that write to the database in a throwaway test database.
+
+        Returns the database vendor and the results.
+        """
+        results = []
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            if 'import' in suites:
+                results += benchmark_import(
+                    bank_formats,
+                    row_counts=[int(count) for count in options['import_rows'].split(',')],
+                    pattern_counts=[int(count) for count in options['import_patterns'].split(',')],
+                    repeat=options['repeat'],
+                )
+            if 'serialization' in suites:
+                results += benchmark_serialization(
+                    row_counts=[int(count) for count in options['serialize_rows'].split(',')],
+                    repeat=options['repeat'],
+                )
+            if 'export' in suites:
+                results += benchmark_export(
+                    row_counts=[int(count) for count in options['export_rows'].split(',')],
+                    repeat=options['repeat'],
+                )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+        return connection.vendor, results
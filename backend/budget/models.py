@@ -1,4 +1,14 @@
+import hashlib
+from decimal import Decimal
 from django.db import models
+from django.db.models import Q
+
+# Transactions whose categorization has not been confirmed by a person, i.e. the
+# ones redo_categorization may still change
+UNCONFIRMED_ASSIGNMENT = (
+    Q(transaction_assignment_type__in=['auto_unchecked', 'unassigned']) |
+    Q(budget_group_assignment_type__in=['auto_unchecked', 'unassigned'])
+)
 
 class AccountName(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -21,12 +31,19 @@ class TransactionPattern(models.Model):
     transaction_type = models.ForeignKey(TransactionType, on_delete=models.CASCADE)
     account_name = models.ForeignKey(AccountName, on_delete=models.CASCADE, null=True, blank=True)
     comments = models.TextField(blank=True, null=True)
+    # Higher priority patterns are tried first; patterns without an account apply
+    # to every account, after the account's own patterns
+    priority = models.IntegerField(default=0)
 
     def __str__(self):
         return self.regex_pattern
     
     class Meta:
         unique_together = ('regex_pattern', 'account_name')
+        constraints = [
+            # unique_together can't catch duplicates among patterns without an account (NULLs differ)
+            models.UniqueConstraint(fields=['regex_pattern'], condition=Q(account_name__isnull=True), name='unique_global_transaction_pattern'),
+        ]
 
 class BudgetGroup(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -59,10 +76,46 @@ class Transaction(models.Model):
         ('modified', 'Modified'),
     ], default='pending')
     comments = models.TextField(blank=True, null=True)
+    # SHA-256 of (account, date, amount, description, balance), used to detect re-imported rows
+    dedupe_key = models.CharField(max_length=64, blank=True, editable=False)
+    # Last change, the high-water mark of incremental backups. Writes that bypass
+    # save() (queryset.update, bulk_update) must set it themselves.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'id'], name='transaction_date_idx'),
+            models.Index(fields=['account_name', 'date'], name='transaction_account_date_idx'),
+            models.Index(fields=['review_status', 'date'], name='transaction_status_date_idx'),
+            models.Index(fields=['date'], condition=Q(review_status='pending'), name='transaction_pending_date_idx'),
+            models.Index(fields=['account_name', 'id'], condition=UNCONFIRMED_ASSIGNMENT, name='transaction_unconfirmed_idx'),
+            models.Index(fields=['dedupe_key'], name='transaction_dedupe_key_idx'),
+            models.Index(fields=['updated_at'], name='transaction_updated_at_idx'),
+        ]
 
     def __str__(self):
         return f"{self.date} - {self.description} - {self.amount}"
 
+    def compute_dedupe_key(self):
+        date = self._meta.get_field('date').to_python(self.date)
+        amount = self._meta.get_field('amount').to_python(self.amount)
+        balance = self._meta.get_field('balance').to_python(self.balance)
+        parts = [
+            str(self.account_name_id),
+            date.isoformat(),
+            f"{amount.quantize(Decimal('0.01'))}",
+            self.description,
+            f"{balance.quantize(Decimal('0.01'))}" if balance is not None else '',
+        ]
+        return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+    def save(self, *args, **kwargs):
+        self.dedupe_key = self.compute_dedupe_key()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = [*update_fields, *(field for field in ('dedupe_key', 'updated_at') if field not in update_fields)]
+        super().save(*args, **kwargs)
+
 class BudgetInitialization(models.Model):
     budget_group = models.ForeignKey(BudgetGroup, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -81,4 +134,58 @@ class BudgetAdjustment(models.Model):
 
     def __str__(self):
         return f"{self.from_budget_group.name} to {self.to_budget_group.name} - {self.amount} - {self.date}"
-    
+
+class BudgetMonthSummary(models.Model):
+    """
+    Totals of one budget group's initializations, adjustments and transactions
+    in one calendar month, maintained by budget.ledger.
+    """
+    budget_group = models.ForeignKey(BudgetGroup, on_delete=models.CASCADE, related_name='month_summaries')
+    month = models.DateField()
+    initialized = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    adjusted_in = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    adjusted_out = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transactions_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['budget_group', 'month'], name='budget_month_summary_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.budget_group.name} - {self.month:%Y-%m}"
+
+class ImportJob(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    account_name = models.ForeignKey(AccountName, on_delete=models.CASCADE)
+    import_format = models.CharField(max_length=100)
+    file_name = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    rows_parsed = models.PositiveIntegerField(default=0)
+    rows_inserted = models.PositiveIntegerField(default=0)
+    rows_duplicate = models.PositiveIntegerField(default=0)
+    rows_uncategorized = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Last status change; queued or running jobs not updated for IMPORT_JOB_TIMEOUT are failed as stale
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.account_name.name} - {self.file_name} - {self.status}"
+
+class DataVersion(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} - v{self.version}"
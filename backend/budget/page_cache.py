@@ -0,0 +1,86 @@
+import hashlib
+import json
+from functools import wraps
+from django.core.cache import caches
+from rest_framework.response import Response
+from .versioning import get_versions, TRANSACTIONS
+
+CACHE_ALIAS = 'transaction_pages'
+
+# Parameters of paginated-transactions and their defaults; anything else is ignored
+PAGE_PARAMETERS = {
+    'page': '1',
+    'per_page': '10',
+    'sort_by': 'date',
+    'sort_direction': 'desc',
+    'dateFrom': '',
+    'dateTo': '',
+    'description': '',
+    'search_comments': 'false',
+    'type': '',
+    'budget': '',
+    'account': '',
+    'review_status': '',
+    'pagination': 'page',
+    'cursor': '',
+    'include_total': 'false',
+}
+
+# Flags compared case-insensitively, like the view does
+FLAG_PARAMETERS = ('search_comments', 'include_total')
+
+def normalize_parameters(params):
+    """
+    Return the paginated-transactions parameters of `params` in a canonical form.
+
+    Missing parameters take their defaults, values are stripped and description
+    words are lowercased and single spaced (the search ignores case), so requests
+    for the same page share one cache entry.
+    """
+    normalized = {}
+    for name, default in PAGE_PARAMETERS.items():
+        value = (params.get(name) or default).strip()
+        if name == 'description':
+            value = ' '.join(value.lower().split())
+        elif name in FLAG_PARAMETERS:
+            value = value.lower()
+        normalized[name] = value
+    return normalized
+
+def page_cache_key(params, version, updated_at):
+    """
+    Key a page on its normalized parameters and the transaction data version.
+
+    The version's timestamp is part of the key too, so versions counted again
+    from zero after the data is flushed never match pages cached before.
+    """
+    digest = hashlib.sha1(json.dumps(normalize_parameters(params), sort_keys=True).encode(), usedforsecurity=False).hexdigest()
+    stamp = updated_at.timestamp() if updated_at else 0
+    return f"transaction-page:{version}:{stamp}:{digest}"
+
+def cache_transaction_pages(view):
+    """
+    Cache the successful responses of a transaction listing view by their
+    normalized parameters and the transaction data version.
+
+    Every write to transactions bumps the version (through the model signals,
+    or explicitly after bulk writes), so cached pages are never served stale; a
+    repeated page costs only the version lookup. The version is read before the
+    view runs, so a page rendered during a write is stored under the older
+    version.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        cache = caches[CACHE_ALIAS]
+        key = page_cache_key(request.GET, *get_versions(TRANSACTIONS)[TRANSACTIONS])
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data)
+        return response
+    return wrapper
+
+def clear_page_cache():
+    caches[CACHE_ALIAS].clear()
@@ -0,0 +1,112 @@
+import base64
+import json
+from django.conf import settings
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(ordering, value, pk, direction):
+    payload = json.dumps({'o': ordering, 'v': value, 'id': pk, 'd': direction}, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, ordering, field):
+    """
+    Return (value, pk, direction) from an opaque cursor, with the value converted for `field`.
+
+    Raises InvalidCursor if the cursor is malformed or was issued for another ordering.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if payload['o'] != ordering:
+            raise InvalidCursor('Cursor does not match the requested sort order')
+        value = field.to_python(payload['v'])
+        pk = int(payload['id'])
+        direction = payload['d']
+    except InvalidCursor:
+        raise
+    except Exception as e:
+        raise InvalidCursor('Invalid cursor') from e
+    # Values a database could not compare with, or ids out of the bigint range
+    if value is None or not -2 ** 63 <= pk < 2 ** 63 or direction not in ('next', 'prev'):
+        raise InvalidCursor('Invalid cursor')
+    return value, pk, direction
+
+def keyset_paginate(queryset, sort_by, descending, cursor=None, per_page=10, serializer=None):
+    """
+    Return one page of a queryset ordered by (sort_by, id) using keyset pagination.
+
+    Instead of an OFFSET, each page continues from the (sort value, id) of the
+    row where the previous page stopped, so every page costs the same whatever
+    its depth and no COUNT(*) is needed. `sort_by` must be a non-nullable
+    concrete field of the queryset's model.
+
+    Returns (rows, next_cursor, prev_cursor); a cursor is None when there is no
+    page in that direction. The rows are model instances, or with a
+    ValuesSerializer as `serializer`, its serialized rows.
+    """
+    field = queryset.model._meta.get_field(sort_by)
+    if field.null or not field.concrete:
+        raise InvalidCursor(f"Cannot paginate by cursor on '{sort_by}'")
+    attname = field.attname
+    ordering = f"{'-' if descending else ''}{attname}"
+
+    direction = 'next'
+    if cursor:
+        value, pk, direction = decode_cursor(cursor, ordering, field)
+        # Walking backwards flips both the comparison and the ordering
+        forward = (direction == 'next') != descending
+        lookup = 'gt' if forward else 'lt'
+        queryset = queryset.filter(
+            Q(**{f'{attname}__{lookup}': value}) | Q(**{attname: value, f'pk__{lookup}': pk})
+        )
+
+    ascending = (direction == 'next') != descending
+    prefix = '' if ascending else '-'
+    ordered = queryset.order_by(f'{prefix}{attname}', f'{prefix}pk')[:per_page + 1]
+    if serializer is None:
+        rows = [((getattr(row, attname), row.pk), row) for row in ordered]
+    else:
+        rows = serializer.serialize_keyed(ordered, attname, 'pk')
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == 'prev':
+        rows.reverse()
+
+    next_cursor = prev_cursor = None
+    if rows:
+        first, last = rows[0][0], rows[-1][0]
+        if direction == 'next':
+            next_cursor = encode_cursor(ordering, *last, 'next') if has_more else None
+            prev_cursor = encode_cursor(ordering, *first, 'prev') if cursor else None
+        else:
+            next_cursor = encode_cursor(ordering, *last, 'next')
+            prev_cursor = encode_cursor(ordering, *first, 'prev') if has_more else None
+    return [row for _, row in rows], next_cursor, prev_cursor
+
+class TransactionPagination(PageNumberPagination):
+    """
+    Page number pagination of the transaction listings, sized by per_page.
+
+    The page is returned as an unevaluated queryset slice, so it can be
+    serialized through the values fast path instead of as model instances.
+    """
+    page_size_query_param = 'per_page'
+
+    def __init__(self):
+        self.page_size = settings.TRANSACTION_PAGE_SIZE
+        self.max_page_size = settings.TRANSACTION_MAX_PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        paginator = self.django_paginator_class(queryset, self.get_page_size(request))
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        return self.page.object_list
@@ -0,0 +1,219 @@
+import re
+from collections import defaultdict
+from django.db.models import Count
+from .models import Transaction, TransactionType, UNCONFIRMED_ASSIGNMENT
+from .categorization import Categorizer, CategorizationRule, get_categorizer
+from .versioning import get_version, TRANSACTIONS
+
+DEFAULT_SAMPLE_SIZE = 10
+
+CHANGE_FIELDS = ('id', 'regex_pattern', 'transaction_type', 'comments', 'priority', 'global', 'delete')
+
+_description_sets = {}
+
+class PreviewError(ValueError):
+    def __init__(self, errors):
+        super().__init__('Invalid pattern changes')
+        self.errors = errors
+
+def description_counts(account_id):
+    """
+    Return (description, transactions, unconfirmed transactions) for every distinct description of an account.
+
+    The set is cached per process and rebuilt when the transactions version
+    changes, so repeated previews only evaluate patterns against it.
+    """
+    version = get_version(TRANSACTIONS)
+    cached = _description_sets.get(account_id)
+    if cached is None or cached[0] != version:
+        rows = list(
+            Transaction.objects.filter(account_name=account_id)
+            .values_list('description')
+            .annotate(count=Count('id'), unconfirmed=Count('id', filter=UNCONFIRMED_ASSIGNMENT))
+            .order_by('description')
+        )
+        cached = (version, rows)
+        _description_sets[account_id] = cached
+    return cached[1]
+
+def clear_description_cache():
+    _description_sets.clear()
+
+def proposed_rules(account_id, current_rules, changes):
+    """
+    Apply pattern changes to an account's rules (its own and the global ones).
+
+    Each change edits (`id` with new fields), deletes (`id` and `delete`) or,
+    without an id, adds a pattern. `global` moves a pattern to or from the
+    global patterns and `priority` sets its priority. The proposed rules are
+    sorted into evaluation order, added patterns coming after saved ones of the
+    same priority. Returns the proposed rules and the rules of the edited and
+    added patterns. Raises PreviewError listing every invalid change.
+    """
+    rules_by_id = {rule.pattern_id: rule for rule in current_rules}
+    edits = {}
+    deleted = set()
+    added = []
+    errors = []
+
+    type_ids = {change.get('transaction_type') for change in changes if change.get('transaction_type') is not None}
+    transaction_types = TransactionType.objects.select_related('default_budget_group', 'threshold_budget_group').in_bulk(type_ids)
+
+    for index, change in enumerate(changes):
+        pattern_id = change.get('id')
+        if pattern_id is not None and pattern_id not in rules_by_id:
+            errors.append({'change': index, 'error': f"Pattern {pattern_id} does not apply to this account"})
+            continue
+        if change.get('delete'):
+            if pattern_id is None:
+                errors.append({'change': index, 'error': 'Only existing patterns can be deleted'})
+            else:
+                deleted.add(pattern_id)
+            continue
+
+        current = rules_by_id.get(pattern_id)
+        regex_pattern = change.get('regex_pattern', current.regex_pattern if current else None)
+        if not regex_pattern:
+            errors.append({'change': index, 'error': 'regex_pattern is required'})
+            continue
+        transaction_type = current.transaction_type if current else None
+        if change.get('transaction_type') is not None:
+            transaction_type = transaction_types.get(change['transaction_type'])
+            if transaction_type is None:
+                errors.append({'change': index, 'error': f"Transaction type {change['transaction_type']} does not exist"})
+                continue
+        if transaction_type is None:
+            errors.append({'change': index, 'error': 'transaction_type is required'})
+            continue
+        try:
+            priority = int(change.get('priority', current.priority if current else 0))
+        except (TypeError, ValueError):
+            errors.append({'change': index, 'error': 'priority must be an integer'})
+            continue
+        is_global = change.get('global', current.account_name_id is None if current else False)
+        try:
+            rule = CategorizationRule(
+                pattern_id,
+                regex_pattern,
+                transaction_type,
+                change.get('comments', current.comments if current else None),
+                priority,
+                None if is_global else account_id
+            )
+        except re.error as e:
+            errors.append({'change': index, 'error': f"Invalid regex: {e}"})
+            continue
+        if pattern_id is None:
+            added.append(rule)
+        else:
+            edits[pattern_id] = rule
+
+    if errors:
+        raise PreviewError(errors)
+
+    rules = [edits.get(rule.pattern_id, rule) for rule in current_rules if rule.pattern_id not in deleted]
+    rules.extend(added)
+    rules.sort(key=CategorizationRule.sort_key)
+    return rules, [*edits.values(), *added]
+
+def rule_key(rule):
+    # Added patterns have no id yet
+    if rule is None:
+        return None
+    return rule.pattern_id if rule.pattern_id is not None else id(rule)
+
+def outcome(rule):
+    # What a rule assigns; the budget group follows from the type and the amount
+    if rule is None:
+        return None
+    return rule.transaction_type.id, rule.comments
+
+def rule_label(rule):
+    if rule is None:
+        return None
+    return {
+        'pattern_id': rule.pattern_id,
+        'regex_pattern': rule.regex_pattern,
+        'transaction_type': rule.transaction_type.name,
+        'priority': rule.priority,
+        'global': rule.account_name_id is None,
+    }
+
+def preview_pattern_changes(account_id, changes, sample_size=DEFAULT_SAMPLE_SIZE):
+    """
+    Show what applying pattern changes to an account would do, without changing any data.
+
+    Every distinct description of the account is matched against the current
+    and the proposed rules. For each edited or added pattern the result lists
+    how many transactions it matches, how many it would categorize (it is the
+    first match), the earlier rules that shadow it and the rules it takes
+    transactions from. Overall, it counts the transactions that would get a
+    different type or pattern comments, and how many of those
+    redo_categorization would update (assignment not confirmed).
+    """
+    categorizer = get_categorizer(account_id)
+    rules, candidates = proposed_rules(account_id, categorizer.rules, changes)
+    # Every description is looked up once, so neither side uses the match memo
+    proposed = Categorizer(rules, mode=categorizer.mode, memo_size=0)
+
+    results = {id(rule): {
+        'pattern': rule_label(rule),
+        'new': rule.pattern_id is None,
+        'matched_transactions': 0,
+        'matched_descriptions': 0,
+        'categorized_transactions': 0,
+        'shadowed_by': defaultdict(int),
+        'takes_from': defaultdict(int),
+        'samples': [],
+    } for rule in candidates}
+
+    transitions = defaultdict(lambda: {'transactions': 0, 'unconfirmed_transactions': 0, 'descriptions': 0})
+    descriptions = description_counts(account_id)
+    for description, count, unconfirmed in descriptions:
+        before = categorizer.matcher.match(description)
+        after = proposed.match(description)
+        for rule in candidates:
+            if not rule.regex.search(description):
+                continue
+            result = results[id(rule)]
+            result['matched_transactions'] += count
+            result['matched_descriptions'] += 1
+            if len(result['samples']) < sample_size:
+                result['samples'].append({'description': description, 'transactions': count})
+            if after is rule:
+                result['categorized_transactions'] += count
+                if before is not None and before.pattern_id != rule.pattern_id:
+                    result['takes_from'][before.pattern_id] += count
+            elif after is not None:
+                # Added patterns have no id yet, so proposed rules are keyed by identity
+                result['shadowed_by'][id(after)] += count
+        if outcome(before) != outcome(after):
+            transition = transitions[(rule_key(before), rule_key(after))]
+            transition['from'] = rule_label(before)
+            transition['to'] = rule_label(after)
+            transition['transactions'] += count
+            transition['unconfirmed_transactions'] += unconfirmed
+            transition['descriptions'] += 1
+
+    current_rules = {rule.pattern_id: rule for rule in categorizer.rules}
+    proposed_rules_by_key = {id(rule): rule for rule in rules}
+    for result in results.values():
+        result['shadowed_by'] = [
+            {**rule_label(proposed_rules_by_key[rule_id]), 'transactions': count}
+            for rule_id, count in sorted(result['shadowed_by'].items(), key=lambda item: -item[1])
+        ]
+        result['takes_from'] = [
+            {**rule_label(current_rules[pattern_id]), 'transactions': count}
+            for pattern_id, count in sorted(result['takes_from'].items(), key=lambda item: -item[1])
+        ]
+
+    reclassified = sorted(transitions.values(), key=lambda transition: -transition['transactions'])
+    return {
+        'account_name': account_id,
+        'distinct_descriptions': len(descriptions),
+        'transactions': sum(count for _, count, _ in descriptions),
+        'reclassified_transactions': sum(transition['transactions'] for transition in reclassified),
+        'reclassified_unconfirmed_transactions': sum(transition['unconfirmed_transactions'] for transition in reclassified),
+        'reclassified': reclassified,
+        'patterns': list(results.values()),
+    }
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from .models import Transaction, UNCONFIRMED_ASSIGNMENT
+from .categorization import get_categorizer
+from .ledger import instance_cells, refresh_budget_ledger
+from .utils import chunked
+from .versioning import bump_version, TRANSACTIONS
+
+CATEGORY_FIELDS = ['transaction_type', 'budget_group', 'transaction_assignment_type',
+                   'budget_group_assignment_type', 'comments']
+
+def category_values(transaction):
+    return (
+        transaction.transaction_type_id,
+        transaction.budget_group_id,
+        transaction.transaction_assignment_type,
+        transaction.budget_group_assignment_type,
+        transaction.comments,
+    )
+
+def recategorize_transactions(queryset=None, chunk_size=None):
+    """
+    Re-run the categorization patterns over transactions whose assignment is not confirmed.
+
+    Rows are streamed in chunks ordered by account, so each account's patterns
+    are compiled once, and only rows whose category actually changed are
+    written, with one bulk_update per chunk. Existing comments are kept.
+
+    Returns (summary, changed_ids): per-account changed and unchanged counts, and
+    the ids of the changed transactions.
+    """
+    if queryset is None:
+        queryset = Transaction.objects.filter(UNCONFIRMED_ASSIGNMENT)
+    chunk_size = chunk_size or settings.IMPORT_BATCH_SIZE
+    transactions = (
+        queryset
+        .select_related('account_name')
+        .only('id', 'date', 'amount', 'description', 'account_name__name', *CATEGORY_FIELDS)
+        .order_by('account_name', 'id')
+        .iterator(chunk_size=chunk_size)
+    )
+
+    accounts = {}
+    changed_ids = []
+    with db_transaction.atomic():
+        for chunk in chunked(transactions, chunk_size):
+            changed = []
+            ledger_cells = set()
+            for account_name_id in dict.fromkeys(transaction.account_name_id for transaction in chunk):
+                account_transactions = [transaction for transaction in chunk if transaction.account_name_id == account_name_id]
+                counts = accounts.setdefault(account_name_id, {
+                    'account_id': account_name_id,
+                    'account_name': account_transactions[0].account_name.name,
+                    'changed': 0,
+                    'unchanged': 0,
+                })
+                categories = get_categorizer(account_name_id).categorize_many(
+                    (transaction.description, transaction.amount) for transaction in account_transactions
+                )
+                for transaction, (transaction_type, budget_group, pattern_comments) in zip(account_transactions, categories):
+                    previous = category_values(transaction)
+                    previous_cells = instance_cells(transaction)
+                    transaction.transaction_type = transaction_type
+                    transaction.budget_group = budget_group
+                    transaction.transaction_assignment_type = 'auto_unchecked' if transaction_type else 'unassigned'
+                    transaction.budget_group_assignment_type = 'auto_unchecked' if budget_group else 'unassigned'
+                    if not transaction.comments and pattern_comments:
+                        transaction.comments = pattern_comments
+                    if category_values(transaction) == previous:
+                        counts['unchanged'] += 1
+                        continue
+                    counts['changed'] += 1
+                    changed.append(transaction)
+                    ledger_cells |= previous_cells | instance_cells(transaction)
+
+            if changed:
+                updated_at = timezone.now()
+                for transaction in changed:
+                    transaction.updated_at = updated_at
+                Transaction.objects.bulk_update(changed, [*CATEGORY_FIELDS, 'updated_at'])
+                # bulk_update skips the model signals that keep budget balances current
+                refresh_budget_ledger(ledger_cells)
+                changed_ids.extend(transaction.id for transaction in changed)
+        if changed_ids:
+            bump_version(TRANSACTIONS)
+
+    summary = {
+        'processed': sum(counts['changed'] + counts['unchanged'] for counts in accounts.values()),
+        'changed': len(changed_ids),
+        'unchanged': sum(counts['unchanged'] for counts in accounts.values()),
+        'accounts': list(accounts.values()),
+    }
+    return summary, changed_ids
@@ -0,0 +1,126 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek, TruncYear
+
+ZERO = Decimal('0.00')
+
+PERIODS = ('week', 'fortnight', 'month', 'year')
+
+# Series a report can be grouped by: query parameter -> Transaction field
+REPORT_GROUPS = {
+    'transaction_type': 'transaction_type',
+    'budget_group': 'budget_group',
+    'account': 'account_name',
+}
+
+# Fortnights are grouped from weeks in SQL; weeks are truncated per database
+# (Monday based), so fortnights are counted in two-week steps from this Monday.
+PERIOD_TRUNCATIONS = {
+    'week': TruncWeek,
+    'fortnight': TruncWeek,
+    'month': TruncMonth,
+    'year': TruncYear,
+}
+
+def fortnight_start(week):
+    anchor = settings.REPORT_FORTNIGHT_START
+    anchor -= timedelta(days=anchor.weekday())
+    return week - timedelta(weeks=((week - anchor).days // 7) % 2)
+
+def period_start(day, period):
+    """
+    Return the first day of the period containing `day`.
+    """
+    if period == 'year':
+        return day.replace(month=1, day=1)
+    if period == 'month':
+        return day.replace(day=1)
+    week = day - timedelta(days=day.weekday())
+    return fortnight_start(week) if period == 'fortnight' else week
+
+def next_period(start, period):
+    if period == 'year':
+        return start.replace(year=start.year + 1)
+    if period == 'month':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(weeks=2 if period == 'fortnight' else 1)
+
+def period_range(first, last, period):
+    periods = []
+    current = first
+    while current <= last:
+        periods.append(current)
+        current = next_period(current, period)
+    return periods
+
+def period_totals(transactions, group_by, period, date_from=None, date_to=None):
+    """
+    Total inflow and outflow of the transactions per period and per series.
+
+    All series are aggregated in one grouped query, with inflow and outflow as
+    conditional sums, and the rows are placed into a dense periods x series
+    matrix: every series has a value for every period in the range, zero where
+    there were no transactions. The range runs from date_from to date_to, or
+    from the first to the last transaction.
+    """
+    group_field = REPORT_GROUPS[group_by]
+    rows = (
+        transactions
+        .annotate(period=PERIOD_TRUNCATIONS[period]('date'))
+        .values('period', group_field, f'{group_field}__name')
+        .annotate(
+            inflow=Sum('amount', filter=Q(amount__gt=0)),
+            outflow=Sum('amount', filter=Q(amount__lt=0)),
+            count=Count('id'),
+        )
+        .order_by()
+    )
+    rows = list(rows)
+    for row in rows:
+        row['period'] = period_start(row['period'], period)
+
+    first = period_start(date_from, period) if date_from else min((row['period'] for row in rows), default=None)
+    last = period_start(date_to, period) if date_to else max((row['period'] for row in rows), default=None)
+    periods = period_range(first, last, period) if first and last else []
+    period_index = {start: index for index, start in enumerate(periods)}
+
+    series_index = {}
+    series = []
+    for row in sorted(rows, key=lambda row: (row[f'{group_field}__name'] is None, row[f'{group_field}__name'] or '')):
+        series_id = row[group_field]
+        if series_id not in series_index:
+            series_index[series_id] = len(series)
+            series.append({
+                'id': series_id,
+                'name': row[f'{group_field}__name'] or 'Unassigned',
+                'inflow': [ZERO] * len(periods),
+                'outflow': [ZERO] * len(periods),
+                'count': [0] * len(periods),
+            })
+
+    totals = {'inflow': [ZERO] * len(periods), 'outflow': [ZERO] * len(periods), 'count': [0] * len(periods)}
+    for row in rows:
+        index = period_index.get(row['period'])
+        if index is None:
+            continue
+        cells = series[series_index[row[group_field]]]
+        for key in ('inflow', 'outflow', 'count'):
+            value = row[key] or 0
+            cells[key][index] += value
+            totals[key][index] += value
+
+    for cells in [*series, totals]:
+        cells['net'] = [inflow + outflow for inflow, outflow in zip(cells['inflow'], cells['outflow'])]
+        cells['total_inflow'] = sum(cells['inflow'], ZERO)
+        cells['total_outflow'] = sum(cells['outflow'], ZERO)
+        cells['total_net'] = cells['total_inflow'] + cells['total_outflow']
+
+    return {
+        'period': period,
+        'group_by': group_by,
+        'periods': periods,
+        'series': series,
+        'totals': totals,
+    }
@@ -0,0 +1,99 @@
+import logging
+from django.db import connections, DatabaseError
+from django.db.models import Case, FloatField, Func, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest, Upper
+
+logger = logging.getLogger(__name__)
+
+# Trigram GIN indexes answering the UPPER(...) LIKE '%term%' queries that
+# icontains generates on PostgreSQL. They are created after migrations (see
+# create_search_indexes) rather than declared on the model, as SQLite can't
+# build them.
+SEARCH_INDEXES = {
+    'transaction_description_trgm_idx': 'description',
+    'transaction_comments_trgm_idx': 'comments',
+}
+
+_trigram_available = {}
+
+class WordSimilarity(Func):
+    """
+    pg_trgm word_similarity(query, text): how well the query matches part of the text, from 0 to 1.
+    """
+    function = 'WORD_SIMILARITY'
+    output_field = FloatField()
+
+def trigram_available(using='default'):
+    """
+    Return True if the database is PostgreSQL with the pg_trgm extension installed.
+    """
+    if using not in _trigram_available:
+        connection = connections[using]
+        available = False
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                available = cursor.fetchone() is not None
+        _trigram_available[using] = available
+    return _trigram_available[using]
+
+def create_search_indexes(using='default', **kwargs):
+    """
+    post_migrate handler: install pg_trgm and the trigram search indexes on PostgreSQL.
+
+    Without the extension (it may need a superuser to install) searches still
+    work, only without the indexes and with simpler relevance ordering.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    _trigram_available.pop(using, None)
+    table = connection.ops.quote_name('budget_transaction')
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for index_name, column in SEARCH_INDEXES.items():
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {connection.ops.quote_name(index_name)} '
+                    f'ON {table} USING gin (UPPER({connection.ops.quote_name(column)}::text) gin_trgm_ops)'
+                )
+    except DatabaseError as e:
+        logger.warning("Could not create the transaction search indexes: %s", e)
+
+def search_transactions(queryset, query, include_comments=False):
+    """
+    Filter transactions to those whose description contains every word of `query`.
+
+    Words are matched case-insensitively anywhere in the description, or in the
+    comments as well if include_comments is set. On PostgreSQL these lookups use
+    the trigram indexes; elsewhere they are plain scans.
+    """
+    for term in query.split():
+        condition = Q(description__icontains=term)
+        if include_comments:
+            condition |= Q(comments__icontains=term)
+        queryset = queryset.filter(condition)
+    return queryset
+
+def annotate_relevance(queryset, query, include_comments=False):
+    """
+    Annotate transactions with a `relevance` score for `query`, higher being a better match.
+
+    With pg_trgm this is the trigram word similarity of the query to the
+    description (or the comments, whichever is higher). Otherwise an exact
+    description scores 3, a description starting with the query 2 and anything
+    else 1.
+    """
+    query = ' '.join(query.split())
+    if trigram_available(queryset.db):
+        relevance = WordSimilarity(Upper(Value(query)), Upper('description'))
+        if include_comments:
+            relevance = Greatest(relevance, WordSimilarity(Upper(Value(query)), Upper('comments')))
+    else:
+        relevance = Case(
+            When(description__iexact=query, then=Value(3)),
+            When(description__istartswith=query, then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField()
+        )
+    return queryset.annotate(relevance=relevance)
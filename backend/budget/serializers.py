@@ -1,5 +1,9 @@
-from rest_framework import serializers
-from .models import AccountName, TransactionType, TransactionPattern, BudgetGroup, Transaction, BudgetInitialization, BudgetAdjustment
+import decimal
+from functools import lru_cache
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from .models import AccountName, TransactionType, TransactionPattern, BudgetGroup, Transaction, BudgetInitialization, BudgetAdjustment, ImportJob
 
 class AccountNameSerializer(serializers.ModelSerializer):
     class Meta:
@@ -20,7 +24,7 @@ class TransactionPatternSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = TransactionPattern
-        fields = ['id', 'regex_pattern', 'transaction_type', 'account_name', 'comments']
+        fields = ['id', 'regex_pattern', 'transaction_type', 'account_name', 'comments', 'priority']
 
 class BudgetGroupSerializer(serializers.ModelSerializer):
     class Meta:
@@ -51,4 +55,117 @@ class BudgetAdjustmentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = BudgetAdjustment
-        fields = ['id', 'from_budget_group', 'to_budget_group', 'amount', 'date', 'description']
\ No newline at end of file
+        fields = ['id', 'from_budget_group', 'to_budget_group', 'amount', 'date', 'description']
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportJob
+        fields = ['id', 'account_name', 'import_format', 'file_name', 'status', 'rows_parsed', 'rows_inserted',
+                  'rows_duplicate', 'rows_uncategorized', 'error_count', 'errors', 'created_at', 'started_at',
+                  'finished_at', 'updated_at']
+        read_only_fields = fields
+
+    def to_representation(self, instance):
+        from .jobs import get_live_progress
+        data = super().to_representation(instance)
+        # Counters of a running job live in the cache until its transaction commits
+        if instance.status == 'running':
+            data.update(get_live_progress(instance.id) or {})
+        return data
+
+class ValuesSerializer:
+    """
+    A read-only fast path rendering a ModelSerializer's fields from `.values_list()` rows.
+
+    Building model instances and running every row through the serializer
+    fields dominates the cost of long listings. This selects exactly the
+    serialized columns and converts each row with a converter compiled once
+    from the serializer's fields: decimals and dates are rendered as the
+    serializer renders them and related fields as their primary keys. Only
+    fields backed directly by a concrete model field are supported.
+    """
+    def __init__(self, serializer_class):
+        serializer = serializer_class()
+        model = serializer_class.Meta.model
+        self.names = []
+        self.columns = []
+        converters = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                model_field = None
+            if model_field is None or not model_field.concrete or model_field.many_to_many:
+                raise ImproperlyConfigured(f"{serializer_class.__name__}.{name} is not a model column")
+            if model_field.is_relation and not isinstance(field, serializers.PrimaryKeyRelatedField):
+                raise ImproperlyConfigured(f"{serializer_class.__name__}.{name} is not rendered as a primary key")
+            self.names.append(name)
+            self.columns.append(model_field.attname)
+            converter = self.compile_field(field, model_field)
+            if converter is not None:
+                converters.append((name, converter))
+        self.converters = converters
+
+    @staticmethod
+    def compile_field(field, model_field):
+        """
+        Return a function rendering a field's non-null database value, or None if it is used as is.
+        """
+        if isinstance(field, serializers.DecimalField):
+            coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+            if not coerce_to_string or field.localize or field.decimal_places is None:
+                return field.to_representation
+            if field.decimal_places == getattr(model_field, 'decimal_places', None):
+                # The database returns the column's own scale, which quantizing would not change
+                return lambda value: format(value, 'f')
+            exponent = decimal.Decimal('.1') ** field.decimal_places
+            context = decimal.getcontext().copy()
+            if field.max_digits is not None:
+                context.prec = field.max_digits
+            rounding = field.rounding
+            return lambda value: '{:f}'.format(value.quantize(exponent, rounding=rounding, context=context))
+        if isinstance(field, serializers.DateTimeField):
+            return field.to_representation
+        if isinstance(field, serializers.DateField):
+            if (getattr(field, 'format', api_settings.DATE_FORMAT) or '').lower() == ISO_8601:
+                return lambda value: value.isoformat()
+            return field.to_representation
+        if isinstance(field, (serializers.CharField, serializers.ChoiceField, serializers.IntegerField,
+                              serializers.BooleanField, serializers.PrimaryKeyRelatedField)):
+            return None
+        return field.to_representation
+
+    def convert(self, row):
+        data = dict(zip(self.names, row))
+        for name, converter in self.converters:
+            value = data[name]
+            if value is not None:
+                data[name] = converter(value)
+        return data
+
+    def serialize(self, queryset):
+        """
+        Return the serialized rows of a queryset (which may be sliced), in its order.
+        """
+        convert = self.convert
+        return [convert(row) for row in queryset.values_list(*self.columns)]
+
+    def serialize_keyed(self, queryset, *keys):
+        """
+        Return (key values, serialized row) pairs, reading the `keys` columns in the same query.
+        """
+        convert = self.convert
+        width = len(keys)
+        return [(row[:width], convert(row[width:])) for row in queryset.values_list(*keys, *self.columns)]
+
+@lru_cache(maxsize=None)
+def values_serializer(serializer_class):
+    return ValuesSerializer(serializer_class)
+
+def serialize_values(queryset, serializer_class=TransactionSerializer):
+    """
+    Serialize a listing through the serializer's read-only fast path.
+    """
+    return values_serializer(serializer_class).serialize(queryset)
@@ -0,0 +1,101 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import AccountName, TransactionPattern, TransactionType, BudgetGroup, BudgetMonthSummary, BudgetInitialization, BudgetAdjustment, Transaction
+from .ledger import group_fields, instance_cells, refresh_budget_ledger
+from .versioning import bump_version, PATTERNS, TRANSACTIONS, ACCOUNT_NAMES, TRANSACTION_TYPES, BUDGET_GROUPS
+
+# Deleting a budget group nulls the foreign keys on transaction types with a
+# plain UPDATE, so budget group changes also invalidate compiled patterns.
+@receiver(post_save, sender=TransactionPattern)
+@receiver(post_delete, sender=TransactionPattern)
+@receiver(post_save, sender=TransactionType)
+@receiver(post_delete, sender=TransactionType)
+@receiver(post_save, sender=BudgetGroup)
+@receiver(post_delete, sender=BudgetGroup)
+def patterns_changed(sender, **kwargs):
+    bump_version(PATTERNS)
+
+@receiver(post_save, sender=AccountName)
+@receiver(post_delete, sender=AccountName)
+def account_names_changed(sender, **kwargs):
+    bump_version(ACCOUNT_NAMES)
+
+@receiver(post_save, sender=TransactionType)
+@receiver(post_delete, sender=TransactionType)
+def transaction_types_changed(sender, **kwargs):
+    bump_version(TRANSACTION_TYPES)
+
+# Transaction types refer to budget groups, and deleting one nulls those references
+@receiver(post_save, sender=BudgetGroup)
+@receiver(post_delete, sender=BudgetGroup)
+def budget_groups_changed(sender, **kwargs):
+    bump_version(BUDGET_GROUPS, TRANSACTION_TYPES)
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def transactions_changed(sender, raw=False, **kwargs):
+    if not raw:
+        bump_version(TRANSACTIONS)
+
+# Deleting a budget group or transaction type nulls the references to it on
+# transactions with a plain UPDATE, which sends no Transaction signals
+@receiver(pre_delete, sender=BudgetGroup)
+@receiver(pre_delete, sender=TransactionType)
+def touch_referencing_transactions(sender, instance, **kwargs):
+    field = 'budget_group' if sender is BudgetGroup else 'transaction_type'
+    Transaction.objects.filter(**{field: instance}).update(updated_at=timezone.now())
+
+@receiver(post_delete, sender=BudgetGroup)
+@receiver(post_delete, sender=TransactionType)
+def transaction_references_deleted(sender, **kwargs):
+    bump_version(TRANSACTIONS)
+
+def ledger_fields(sender):
+    return ['date', 'amount', *(f'{group_field}_id' for group_field in group_fields(sender))]
+
+def ledger_fields_saved(sender, update_fields):
+    return update_fields is None or not {'date', 'amount', *group_fields(sender)}.isdisjoint(update_fields)
+
+# Refreshing a row's cells takes about six queries (lock, aggregates, upsert) and
+# holds the cells' locks until commit, on top of the TRANSACTIONS version bump.
+# Saves that leave the date, amount and budget groups as they were, like most
+# edits in the review UI, skip the refresh.
+@receiver(pre_save, sender=BudgetInitialization)
+@receiver(pre_save, sender=BudgetAdjustment)
+@receiver(pre_save, sender=Transaction)
+def remember_ledger_cells(sender, instance, raw=False, update_fields=None, **kwargs):
+    # The cells the row counted towards before this save also need refreshing
+    instance._previous_ledger_cells = set()
+    instance._ledger_unchanged = False
+    if raw or instance.pk is None or not ledger_fields_saved(sender, update_fields):
+        return
+    fields = ledger_fields(sender)
+    previous = sender.objects.filter(pk=instance.pk).only(*fields).first()
+    if previous is None:
+        return
+    instance._ledger_unchanged = all(
+        getattr(previous, field.attname) == field.to_python(getattr(instance, field.attname))
+        for field in map(sender._meta.get_field, fields)
+    )
+    instance._previous_ledger_cells = instance_cells(previous)
+
+@receiver(post_save, sender=BudgetInitialization)
+@receiver(post_save, sender=BudgetAdjustment)
+@receiver(post_save, sender=Transaction)
+def ledger_row_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or not ledger_fields_saved(sender, update_fields) or getattr(instance, '_ledger_unchanged', False):
+        return
+    refresh_budget_ledger(instance_cells(instance) | getattr(instance, '_previous_ledger_cells', set()))
+
+@receiver(post_delete, sender=BudgetInitialization)
+@receiver(post_delete, sender=BudgetAdjustment)
+@receiver(post_delete, sender=Transaction)
+def ledger_row_deleted(sender, instance, **kwargs):
+    refresh_budget_ledger(instance_cells(instance))
+
+# Rows deleted along with a budget group refresh its cells before the group row
+# itself is deleted, so clear them again once it is gone.
+@receiver(post_delete, sender=BudgetGroup)
+def budget_group_deleted(sender, instance, **kwargs):
+    BudgetMonthSummary.objects.filter(budget_group_id=instance.pk).delete()
@@ -1,3 +1,1620 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from .models import (AccountName, BudgetGroup, TransactionType, Transaction, TransactionPattern, BudgetInitialization,
+                     BudgetAdjustment, BudgetMonthSummary, DataVersion, ImportJob, UNCONFIRMED_ASSIGNMENT)
+from .bank_formats import BankFormat, bank_format_names, get_bank_format, load_bank_formats
+from .backups import BackupError, archive_chain, latest_archive, load_archive_chain, write_archive
+from .categorization import (CategorizationRule, IndexedMatcher, SequentialMatcher, clear_categorizer_cache,
+                             get_categorizer, required_literal)
+from .importer import TransactionImporter
+from .instrumentation import QueryInstrumentationMiddleware, clear_query_stats, query_stats
+from .jobs import job_file_path, run_import_job
+from .ledger import SUMMARY_FIELDS, rebuild_budget_ledger
+from .page_cache import clear_page_cache
+from .pagination import encode_cursor
+from .preview import clear_description_cache, preview_pattern_changes
+from .recategorization import recategorize_transactions
+from .search import search_transactions, trigram_available
+from .serializers import TransactionSerializer, serialize_values
+from .utils import categorize_transaction, detect_duplicates, parse_transaction_data
+from .versioning import bump_version, ALL_VERSIONS, ACCOUNT_NAMES, TRANSACTIONS
 
-# Create your tests here.
+def create_transactions(count, account_names, transaction_type=None, budget_group=None, start=date(2015, 1, 1)):
+    """
+    Bulk create `count` transactions spread over the given accounts, about one in
+    ten pending review and one in five still auto-assigned.
+    """
+    transactions = []
+    for index in range(count):
+        pending = index % 10 == 0
+        auto = index % 5 == 0
+        transaction = Transaction(
+            date=start + timedelta(days=index // 5),
+            amount=Decimal(-(index % 500)) - Decimal('0.95'),
+            balance=Decimal(10000 - index),
+            description=f"CARD PURCHASE MERCHANT {index % 300} SYDNEY",
+            source='benchmark',
+            account_name=account_names[index % len(account_names)],
+            transaction_type=transaction_type,
+            budget_group=budget_group,
+            budget_group_assignment_type='auto_unchecked' if auto else 'auto_checked',
+            transaction_assignment_type='auto_unchecked' if auto else 'auto_checked',
+            review_status='pending' if pending else 'confirmed',
+        )
+        transaction.dedupe_key = transaction.compute_dedupe_key()
+        transactions.append(transaction)
+    return Transaction.objects.bulk_create(transactions)
+
+class TransactionQueryPlanTests(TestCase):
+    """
+    Checks that the hot transaction queries are answered from their indexes.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.accounts = [AccountName.objects.create(name=f'Account {index}') for index in range(3)]
+        budget_group = BudgetGroup.objects.create(name='Groceries')
+        transaction_type = TransactionType.objects.create(name='Food', default_budget_group=budget_group)
+        cls.transactions = create_transactions(5000, cls.accounts, transaction_type, budget_group)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, queryset, *index_names):
+        """
+        Assert that the query plan uses at least one of the given indexes.
+        """
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Small test tables are cheaper to scan; force the planner to show index use
+                cursor.execute('SET enable_seqscan = off')
+        plan = queryset.explain()
+        self.assertTrue(any(index_name in plan for index_name in index_names), f"None of {index_names} used in:\n{plan}")
+
+    def test_date_range_listing_uses_date_index(self):
+        queryset = Transaction.objects.filter(date__gte=date(2016, 1, 1), date__lte=date(2016, 3, 31)).order_by('-date')
+        self.assertUsesIndex(queryset, 'transaction_date_idx')
+
+    def test_pending_review_uses_status_index(self):
+        queryset = Transaction.objects.filter(review_status='pending').order_by('date')
+        self.assertUsesIndex(queryset, 'transaction_pending_date_idx', 'transaction_status_date_idx')
+
+    # SQLite can't prove a partial index applies when the filter values are bound
+    # parameters, so partial index use is only checked on PostgreSQL
+    @skipUnless(connection.vendor == 'postgresql', 'Partial index use is only planned on PostgreSQL')
+    def test_pending_review_uses_partial_index(self):
+        queryset = Transaction.objects.filter(review_status='pending').order_by('date')
+        self.assertUsesIndex(queryset, 'transaction_pending_date_idx')
+
+    @skipUnless(connection.vendor == 'postgresql', 'Partial index use is only planned on PostgreSQL')
+    def test_redo_categorization_uses_partial_index(self):
+        queryset = Transaction.objects.filter(UNCONFIRMED_ASSIGNMENT).order_by('account_name', 'id')
+        self.assertUsesIndex(queryset, 'transaction_unconfirmed_idx')
+
+    @skipUnless(connection.vendor == 'postgresql', 'Trigram indexes are only created on PostgreSQL')
+    def test_description_search_uses_trigram_index(self):
+        queryset = search_transactions(Transaction.objects.all(), 'merchant 42', include_comments=True)
+        self.assertUsesIndex(queryset, 'transaction_description_trgm_idx')
+
+    def test_duplicate_check_uses_dedupe_key_index(self):
+        keys = [transaction.dedupe_key for transaction in self.transactions[:100]]
+        queryset = Transaction.objects.filter(dedupe_key__in=keys)
+        self.assertUsesIndex(queryset, 'transaction_dedupe_key_idx')
+
+    def test_dedupe_key_matches_saved_values(self):
+        transaction = Transaction.objects.get(id=self.transactions[0].id)
+        transaction.save()
+        self.assertEqual(transaction.dedupe_key, self.transactions[0].dedupe_key)
+
+class EndpointQueryCountTests(TestCase):
+    """
+    Checks that every API endpoint runs a bounded number of queries, the same
+    number whether the tables hold a few rows or ten times as many.
+    """
+    SIZES = (3, 30)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = AccountName.objects.create(name='Checking')
+        cls.budget_group = BudgetGroup.objects.create(name='Groceries')
+        cls.transaction_type = TransactionType.objects.create(name='Food', default_budget_group=cls.budget_group)
+        cls.pattern = TransactionPattern.objects.create(regex_pattern='GROCER', account_name=cls.account,
+                                                        transaction_type=cls.transaction_type)
+        cls.initialization = BudgetInitialization.objects.create(budget_group=cls.budget_group, amount=Decimal('500.00'),
+                                                                 date=date(2015, 1, 1))
+        cls.adjustment = BudgetAdjustment.objects.create(from_budget_group=cls.budget_group, to_budget_group=cls.budget_group,
+                                                         amount=Decimal('5.00'), date=date(2015, 1, 1))
+        cls.import_job = ImportJob.objects.create(account_name=cls.account, import_format='alpha_bank_debit')
+        # create-adjustment-transaction books on this account, creating it on first use
+        AccountName.objects.create(name='Adjustment Date')
+        cls.transaction = create_transactions(1, [cls.account], cls.transaction_type, cls.budget_group, start=date(2014, 1, 1))[0]
+
+    def setUp(self):
+        self.seeded = 0
+        self.pending_ids = []
+
+    def seed(self, size):
+        """
+        Grow every table to about `size` rows, and the transactions to ten times that.
+        """
+        for index in range(self.seeded, size):
+            account = AccountName.objects.create(name=f'Account {index}')
+            budget_group = BudgetGroup.objects.create(name=f'Group {index}')
+            TransactionType.objects.create(name=f'Type {index}', default_budget_group=budget_group,
+                                           amount_threshold=Decimal('-100.00'), threshold_budget_group=self.budget_group)
+            TransactionPattern.objects.create(regex_pattern=f'MERCHANT {index} ', account_name=self.account,
+                                              transaction_type=self.transaction_type, comments=f'Pattern {index}')
+            BudgetInitialization.objects.create(budget_group=budget_group, amount=Decimal('100.00'), date=date(2015, 1, 1))
+            BudgetAdjustment.objects.create(from_budget_group=self.budget_group, to_budget_group=budget_group,
+                                            amount=Decimal('10.00'), date=date(2015, 1, 1))
+            ImportJob.objects.create(account_name=account, import_format='alpha_bank_debit', status='completed')
+        create_transactions((size - self.seeded) * 10, [self.account], self.transaction_type, self.budget_group,
+                            start=date(2015, 1, 1) + timedelta(days=self.seeded * 2))
+        self.seeded = size
+        self.pending_ids = list(Transaction.objects.filter(review_status='pending').order_by('id').values_list('id', flat=True))
+        # Bulk created transactions skip the signals keeping balances and versions current
+        rebuild_budget_ledger()
+        bump_version(*ALL_VERSIONS)
+
+    def assertConstantQueries(self, requests):
+        """
+        Seed each size, run every request in `requests` (label: (max_queries, request))
+        as request(size) and assert each succeeds with the same number of queries
+        at every size, at most its max_queries. Streamed responses are consumed
+        within the measurement.
+        """
+        counts = {label: [] for label in requests}
+        for size in self.SIZES:
+            self.seed(size)
+            for label, (max_queries, request) in requests.items():
+                # Start every measurement with cold per-version caches and warm per-process ones
+                clear_categorizer_cache()
+                clear_description_cache()
+                clear_page_cache()
+                trigram_available()
+                with CaptureQueriesContext(connection) as queries:
+                    response = request(size)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                self.assertLess(response.status_code, 300, f"{label}: {getattr(response, 'data', response)}")
+                counts[label].append([query['sql'] for query in queries.captured_queries])
+        for label, (max_queries, request) in requests.items():
+            with self.subTest(label):
+                small, large = counts[label][0], counts[label][-1]
+                self.assertEqual(len(small), len(large),
+                                 "Query count grows with the data:\n" + '\n'.join(small) + '\n---\n' + '\n'.join(large))
+                self.assertLessEqual(len(large), max_queries, '\n'.join(large))
+
+    def test_viewset_lists(self):
+        routes = ['transaction-patterns', 'budget-initializations', 'budget-adjustments']
+        requests = {route: (1, lambda size, route=route: self.client.get(f'/api/{route}/')) for route in routes}
+        # Import jobs: the stale job check, then the list
+        requests['import-jobs'] = (2, lambda size: self.client.get('/api/import-jobs/'))
+        # Reference data: the versions, then the list
+        for route in ['account-names', 'transaction-types', 'budget-groups']:
+            requests[route] = (2, lambda size, route=route: self.client.get(f'/api/{route}/'))
+        # Paginated: the count and the page
+        requests['transactions'] = (2, lambda size: self.client.get('/api/transactions/', {'per_page': 2}))
+        requests['transactions filtered'] = (2, lambda size: self.client.get(
+            '/api/transactions/', {'dateFrom': '2015-01-01', 'account': self.account.id}))
+        requests['transactions export'] = (1, lambda size: self.client.get('/api/transactions/', {'export': 'true'}))
+        self.assertConstantQueries(requests)
+
+    def test_viewset_details(self):
+        objects = {
+            'account-names': self.account, 'transaction-types': self.transaction_type,
+            'transaction-patterns': self.pattern, 'budget-groups': self.budget_group,
+            'budget-initializations': self.initialization, 'budget-adjustments': self.adjustment,
+            'transactions': self.transaction, 'import-jobs': self.import_job,
+        }
+        # Import jobs check for stale jobs first
+        self.assertConstantQueries({
+            route: (2 if route == 'import-jobs' else 1,
+                    lambda size, route=route, instance=instance: self.client.get(f'/api/{route}/{instance.id}/'))
+            for route, instance in objects.items()
+        })
+
+    def test_transaction_create_update_delete(self):
+        payload = {
+            'date': '2016-01-01', 'amount': '-12.50', 'description': 'CARD PURCHASE', 'source': 'manual_entry',
+            'account_name': self.account.id, 'budget_group': self.budget_group.id,
+            'transaction_type': self.transaction_type.id, 'budget_group_assignment_type': 'manual',
+            'transaction_assignment_type': 'manual', 'review_status': 'confirmed',
+        }
+        self.assertConstantQueries({
+            'create': (10, lambda size: self.client.post('/api/transactions/', payload, content_type='application/json')),
+            'update': (9, lambda size: self.client.patch(
+                f'/api/transactions/{self.pending_ids[0]}/', {'amount': f'-{size}.50'}, content_type='application/json')),
+            'delete': (8, lambda size: self.client.delete(f'/api/transactions/{self.pending_ids[-1]}/')),
+        })
+
+    def test_transaction_actions(self):
+        self.assertConstantQueries({
+            'pending_review': (2, lambda size: self.client.get('/api/transactions/pending_review/')),
+            'bulk_confirm': (5, lambda size: self.client.post('/api/transactions/bulk_confirm/', {
+                'transaction_ids': self.pending_ids,
+                'comments_map': {str(transaction_id): 'Checked' for transaction_id in self.pending_ids[::2]},
+            }, content_type='application/json')),
+            'redo_categorization': (13, lambda size: self.client.post('/api/transactions/redo_categorization/?detail=true')),
+            'modify': (4, lambda size: self.client.post(f'/api/transactions/{self.transaction.id}/modify/', {
+                'transaction_type': self.transaction_type.id, 'budget_group': self.budget_group.id, 'review_status': 'confirmed',
+            }, content_type='application/json')),
+            'create_adjustment_transaction': (17, lambda size: self.client.post('/api/create-adjustment-transaction/', {
+                'date_from': '2016-01-01', 'date_to': '2016-02-01', 'amount': '25.00', 'budget_group_id': self.budget_group.id,
+                'transaction_type_id': self.transaction_type.id, 'description': 'Date Adjustment',
+            }, content_type='application/json')),
+        })
+
+    def test_pattern_preview(self):
+        self.assertConstantQueries({
+            'preview': (6, lambda size: self.client.post('/api/transaction-patterns/preview/', {
+                'account_name': self.account.id, 'regex_pattern': 'MERCHANT 1', 'transaction_type': self.transaction_type.id,
+            }, content_type='application/json')),
+        })
+
+    def test_imports(self):
+        def import_transactions(size):
+            # Ten times more rows for the larger size, all new. SQLite caps the
+            # parameters of a statement, so bulk_create splits batches of more than
+            # about 70 rows there; both files stay under that.
+            rows = ''.join(f'{index % 28 + 1:02d}/03/2020,-{size}.{index:02d},IMPORTED MERCHANT {index},$1,000.00\n'
+                           for index in range(size * 2))
+            return self.client.post('/api/import-transactions/', {
+                'file': SimpleUploadedFile('export.csv', rows.encode()),
+                'import_format': 'alpha_bank_debit',
+                'account_name': self.account.id,
+            })
+
+        def import_patterns(size):
+            rows = ''.join(f'IMPORTED {size} {index},Imported {size} {index % 5},\n' for index in range(size * 3))
+            return self.client.post('/api/import-transaction-patterns/', {
+                'file': SimpleUploadedFile('patterns.csv', f'Pattern,Category,Comments\n{rows}'.encode()),
+                'account_name': self.account.id,
+            })
+
+        self.assertConstantQueries({
+            'import_transactions': (9, import_transactions),
+            'import_transaction_patterns': (10, import_patterns),
+        })
+
+    def test_paginated_transactions(self):
+        queries = [
+            'per_page=25&page=2&sort_by=amount&sort_direction=asc',
+            'per_page=25&sort_by=relevance&description=merchant%201&search_comments=true',
+            'per_page=25&dateFrom=2015-01-01&dateTo=2015-06-30&review_status=pending',
+            'per_page=25&pagination=cursor&sort_by=date&include_total=true',
+        ]
+        self.assertConstantQueries({
+            query: (3, lambda size, query=query: self.client.get(f'/api/paginated-transactions/?{query}')) for query in queries
+        })
+
+    def test_export_transactions(self):
+        self.assertConstantQueries({
+            export_format: (1, lambda size, export_format=export_format: self.client.get(
+                '/api/export-transactions/', {'export_format': export_format, 'dateFrom': '2015-01-01'}))
+            for export_format in ('csv', 'ndjson')
+        })
+
+    def test_reports(self):
+        self.assertConstantQueries({
+            'budget-balances': (7, lambda size: self.client.get('/api/budget-balances/?as_of=2016-01-01')),
+            'period-report': (1, lambda size: self.client.get(
+                '/api/period-report/?group_by=budget_group&period=month&dateFrom=2015-01-01&dateTo=2015-12-31')),
+        })
+
+    @override_settings(DEBUG=True)
+    def test_utility_endpoints(self):
+        urls = ['/api/categorization-stats/', '/api/debug/query-stats/']
+        requests = {url: (0, lambda size, url=url: self.client.get(url)) for url in urls}
+        requests['/api/bank-formats/'] = (0, lambda size: self.client.get('/api/bank-formats/'))
+        requests['/api/bootstrap/'] = (4, lambda size: self.client.get('/api/bootstrap/'))
+        self.assertConstantQueries(requests)
+
+class ValuesSerializerTests(TestCase):
+    def test_matches_transaction_serializer(self):
+        account = AccountName.objects.create(name='Checking')
+        budget_group = BudgetGroup.objects.create(name='Groceries')
+        transaction_type = TransactionType.objects.create(name='Food')
+        create_transactions(20, [account], transaction_type, budget_group)
+        create_transactions(5, [account], start=date(2016, 1, 1))
+        Transaction.objects.filter(id__in=Transaction.objects.order_by('id').values('id')[:3]).update(
+            balance=None, amount=Decimal('1.5'), comments='Checked')
+
+        queryset = Transaction.objects.order_by('-date', 'id')
+        expected = [dict(row) for row in TransactionSerializer(queryset, many=True).data]
+        self.assertEqual(serialize_values(queryset), expected)
+        self.assertEqual(serialize_values(queryset.all()[5:10]), expected[5:10])
+
+@override_settings(TRANSACTION_PAGE_SIZE=4, TRANSACTION_MAX_PAGE_SIZE=10)
+class TransactionListingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = AccountName.objects.create(name='Checking')
+        cls.other_account = AccountName.objects.create(name='Savings')
+        create_transactions(30, [cls.account, cls.other_account])
+
+    def test_paginates_by_default(self):
+        response = self.client.get('/api/transactions/')
+        self.assertEqual(response.data['count'], 30)
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(len(self.client.get('/api/transactions/', {'per_page': 100}).data['results']), 10)
+        self.assertEqual(self.client.get('/api/transactions/', {'page': 99}).status_code, 404)
+
+    def test_filters(self):
+        response = self.client.get('/api/transactions/pending_review/', {'account': self.account.id, 'per_page': 10})
+        expected = Transaction.objects.filter(review_status='pending', account_name=self.account)
+        self.assertEqual(response.data['count'], expected.count())
+        self.assertEqual({row['id'] for row in response.data['results']}, set(expected.values_list('id', flat=True)))
+        self.assertEqual(self.client.get('/api/transactions/', {'dateFrom': '2015-13-01'}).status_code, 400)
+
+    def test_export_streams_every_transaction(self):
+        response = self.client.get('/api/transactions/', {'export': 'true', 'dateTo': '2015-01-03'})
+        rows = json.loads(b''.join(response.streaming_content))
+        expected = Transaction.objects.filter(date__lte=date(2015, 1, 3)).order_by('date', 'id')
+        self.assertEqual(rows, serialize_values(expected))
+        empty = self.client.get('/api/transactions/', {'export': 'true', 'dateFrom': '2030-01-01'})
+        self.assertEqual(json.loads(b''.join(empty.streaming_content)), [])
+
+class ExportTransactionsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = AccountName.objects.create(name='Checking')
+        cls.other_account = AccountName.objects.create(name='Savings')
+        cls.budget_group = BudgetGroup.objects.create(name='Groceries')
+        cls.transaction_type = TransactionType.objects.create(name='Food')
+        create_transactions(12, [cls.account], cls.transaction_type, cls.budget_group)
+        create_transactions(5, [cls.other_account], start=date(2016, 1, 1))
+
+    def export(self, **params):
+        response = self.client.get('/api/export-transactions/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    @override_settings(EXPORT_CHUNK_SIZE=5)
+    def test_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.export(account=self.account.id))))
+        expected = Transaction.objects.filter(account_name=self.account).order_by('date', 'id')
+        self.assertEqual([int(row['id']) for row in rows], list(expected.values_list('id', flat=True)))
+        self.assertEqual(rows[0]['account_name'], 'Checking')
+        self.assertEqual(rows[0]['budget_group'], 'Groceries')
+        self.assertEqual(rows[0]['transaction_type'], 'Food')
+        self.assertEqual(Decimal(rows[0]['amount']), expected[0].amount)
+
+    @override_settings(EXPORT_CHUNK_SIZE=5)
+    def test_ndjson(self):
+        rows = [json.loads(line) for line in self.export(export_format='ndjson', dateFrom='2016-01-01').splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual({row['account_name'] for row in rows}, {'Savings'})
+        self.assertIsNone(rows[0]['budget_group'])
+        self.assertEqual(self.export(export_format='ndjson', dateFrom='2030-01-01'), '')
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/export-transactions/', {'export_format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/export-transactions/', {'dateTo': 'yesterday'}).status_code, 400)
+
+class ReferenceDataValidatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = AccountName.objects.create(name='Checking')
+        cls.budget_group = BudgetGroup.objects.create(name='Groceries')
+        cls.transaction_type = TransactionType.objects.create(name='Food', default_budget_group=cls.budget_group)
+
+    def assertNotModified(self, url, response, queries=1):
+        with self.assertNumQueries(queries):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        if response.has_header('Last-Modified'):
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+    def test_lists_revalidate_until_changed(self):
+        for url, change in [
+            ('/api/account-names/', lambda: AccountName.objects.create(name='Savings')),
+            ('/api/transaction-types/', lambda: self.transaction_type.delete()),
+            ('/api/budget-groups/', lambda: BudgetGroup.objects.create(name='Fuel')),
+        ]:
+            with self.subTest(url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('no-cache', response['Cache-Control'])
+                self.assertNotModified(url, response)
+                change()
+                changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(changed.status_code, 200)
+                self.assertNotEqual(changed['ETag'], response['ETag'])
+
+    def test_deleting_a_budget_group_changes_transaction_types(self):
+        response = self.client.get('/api/transaction-types/')
+        self.budget_group.delete()
+        changed = self.client.get('/api/transaction-types/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertIsNone(changed.data[0]['default_budget_group'])
+
+    def test_pattern_import_changes_transaction_types(self):
+        response = self.client.get('/api/transaction-types/')
+        upload = SimpleUploadedFile('patterns.csv', b'Pattern,Category\nFUEL,Transport\n', content_type='text/csv')
+        self.client.post('/api/import-transaction-patterns/', {'file': upload, 'account_name': self.account.id})
+        changed = self.client.get('/api/transaction-types/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual({row['name'] for row in changed.data}, {'Food', 'Transport'})
+
+    def test_bootstrap(self):
+        response = self.client.get('/api/bootstrap/')
+        self.assertEqual(response.data['account_names'], self.client.get('/api/account-names/').data)
+        self.assertEqual(response.data['transaction_types'], self.client.get('/api/transaction-types/').data)
+        self.assertEqual(response.data['budget_groups'], self.client.get('/api/budget-groups/').data)
+        self.assertEqual(response.data['bank_formats'], self.client.get('/api/bank-formats/').data)
+        self.assertNotModified('/api/bootstrap/', response)
+        AccountName.objects.filter(pk=self.account.pk).update(name='Everyday')
+        self.assertNotModified('/api/bootstrap/', response)
+        bump_version(ACCOUNT_NAMES)
+        self.assertEqual(self.client.get('/api/bootstrap/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_restarted_versions_change_etags(self):
+        response = self.client.get('/api/account-names/')
+        # A restore recreates the versions from zero, so the same number can come back
+        version = DataVersion.objects.get(name=ACCOUNT_NAMES)
+        DataVersion.objects.filter(pk=version.pk).update(updated_at=version.updated_at + timedelta(seconds=1))
+        changed = self.client.get('/api/account-names/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+    def test_bank_formats_follow_settings(self):
+        response = self.client.get('/api/bank-formats/')
+        # Read from settings only, without a query or Last-Modified
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertNotModified('/api/bank-formats/', response, queries=0)
+        with override_settings(BANK_FORMATS={'delta_bank': {'name': 'Delta', 'columns': ['date', 'description', 'amount']}}):
+            changed = self.client.get('/api/bank-formats/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.data, {'delta_bank': 'Delta'})
+
+class PageCacheTests(TestCase):
+    URL = '/api/paginated-transactions/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = AccountName.objects.create(name='Checking')
+        cls.budget_group = BudgetGroup.objects.create(name='Groceries')
+        cls.transaction_type = TransactionType.objects.create(name='Food')
+        create_transactions(30, [cls.account], cls.transaction_type, cls.budget_group)
+
+    def setUp(self):
+        clear_page_cache()
+
+    def get(self, queries, **params):
+        with self.assertNumQueries(queries):
+            response = self.client.get(self.URL, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_repeated_pages_only_check_the_version(self):
+        params = {'per_page': 5, 'page': 2, 'description': 'card  Purchase', 'sort_by': 'amount'}
+        data = self.get(3, **params)
+        self.assertEqual(self.get(1, **params), data)
+        # The same page with default and normalized parameters
+        self.assertEqual(self.get(1, per_page='5', page='2', description='CARD purchase', sort_by='amount',
+                                  sort_direction='desc', search_comments='FALSE', unknown='ignored'), data)
+        self.get(3, per_page=5, page=3, description='card purchase', sort_by='amount')
+
+    def test_writes_invalidate_pages(self):
+        first = Transaction.objects.order_by('-date', 'id').first()
+        writes = [
+            ('save', lambda: Transaction.objects.filter(pk=first.pk).first().save()),
+            ('bulk endpoint', lambda: self.client.post('/api/transactions/bulk_confirm/', {
+                'transaction_ids': list(Transaction.objects.filter(review_status='pending').values_list('id', flat=True)),
+            }, content_type='application/json')),
+            ('budget group deleted', lambda: self.budget_group.delete()),
+        ]
+        self.get(3, per_page=50)
+        for label, write in writes:
+            with self.subTest(label):
+                self.get(1, per_page=50)
+                write()
+                data = self.get(3, per_page=50)
+                self.assertEqual(data['transactions'], serialize_values(Transaction.objects.order_by('-date')[:50]))
+
+    def test_admin_actions_invalidate_pages(self):
+        unchecked = list(Transaction.objects.filter(transaction_assignment_type='auto_unchecked').values_list('id', flat=True))
+        self.assertEqual(self.get(3, review_status='confirmed')['total_transactions'], 27)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.client.post('/admin/budget/transaction/', {'action': 'confirm_auto_assignment', '_selected_action': unchecked})
+        self.client.logout()
+        confirmed = Transaction.objects.filter(review_status='confirmed').count()
+        self.assertGreater(confirmed, 27)
+        self.assertEqual(self.get(3, review_status='confirmed')['total_transactions'], confirmed)
+
+class BackupArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = AccountName.objects.create(name='Checking')
+        cls.budget_group = BudgetGroup.objects.create(name='Groceries')
+        cls.transaction_type = TransactionType.objects.create(name='Food')
+        create_transactions(40, [cls.account], cls.transaction_type, cls.budget_group)
+        # Outside the overlap of the archives taken by the tests
+        Transaction.objects.update(updated_at=timezone.now() - timedelta(days=1))
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.backup_dir = directory.name
+
+    def snapshot(self):
+        # Fixtures keep timestamps to the millisecond
+        fields = [field.name for field in Transaction._meta.concrete_fields if field.name != 'updated_at']
+        return list(Transaction.objects.order_by('id').values(*fields)), list(BudgetGroup.objects.order_by('id').values())
+
+    def read_rows(self, archive, label):
+        with gzip.open(os.path.join(archive, f'{label}.jsonl.gz'), 'rt') as stream:
+            return [json.loads(line) for line in stream]
+
+    def test_full_and_incremental_archives_restore(self):
+        full = os.path.join(self.backup_dir, 'full')
+        manifest = write_archive(full, chunk_size=7)
+        self.assertEqual(manifest['models']['budget.transaction']['rows'], 40)
+        self.assertEqual(len(self.read_rows(full, 'budget.transaction')), 40)
+        self.assertIsNone(manifest['base'])
+        self.assertEqual(latest_archive(self.backup_dir), full)
+
+        pending = list(Transaction.objects.filter(review_status='pending').values_list('id', flat=True))
+        self.client.post('/api/transactions/bulk_confirm/', {'transaction_ids': pending}, content_type='application/json')
+        Transaction.objects.order_by('id').last().delete()
+        created = create_transactions(2, [self.account], start=date(2020, 1, 1))
+        BudgetGroup.objects.create(name='Fuel')
+
+        incremental = os.path.join(self.backup_dir, 'incremental')
+        manifest = write_archive(incremental, base=full, chunk_size=7)
+        entry = manifest['models']['budget.transaction']
+        self.assertEqual(manifest['base'], 'full')
+        self.assertEqual((entry['mode'], entry['ids']), ('incremental', 41))
+        changed = {row['pk'] for row in self.read_rows(incremental, 'budget.transaction')}
+        self.assertEqual(changed, set(pending) | {transaction.id for transaction in created})
+        self.assertEqual(manifest['models']['budget.budgetgroup']['mode'], 'full')
+
+        expected = self.snapshot()
+        self.budget_group.delete()
+        Transaction.objects.all().delete()
+        AccountName.objects.create(name='Stale')
+        # The restore leaves the ledger and versions to restore_database, instead of a refresh per deleted row
+        with mock.patch('budget.signals.refresh_budget_ledger') as refresh, mock.patch('budget.signals.bump_version') as bump:
+            load_archive_chain(incremental, exclude={'contenttypes.contenttype'}, chunk_size=7)
+        self.assertEqual(self.snapshot(), expected)
+        self.assertFalse(AccountName.objects.filter(name='Stale').exists())
+        refresh.assert_not_called()
+        self.assertNotIn(mock.call(TRANSACTIONS), bump.call_args_list)
+
+    @override_settings(BACKUP_OVERLAP_SECONDS=60)
+    def test_rows_committed_after_the_base_are_kept(self):
+        full = os.path.join(self.backup_dir, 'full')
+        manifest = write_archive(full, chunk_size=7)
+        started_at = datetime.fromisoformat(manifest['started_at'])
+        self.assertEqual(datetime.fromisoformat(manifest['watermark']), started_at - timedelta(seconds=60))
+
+        # A transaction open while the base was read commits its row afterwards,
+        # dated when it was written
+        late = create_transactions(1, [self.account], start=date(2020, 1, 1))[0]
+        Transaction.objects.filter(pk=late.pk).update(updated_at=started_at - timedelta(seconds=30))
+        incremental = os.path.join(self.backup_dir, 'incremental')
+        write_archive(incremental, base=full, chunk_size=7)
+        self.assertEqual({row['pk'] for row in self.read_rows(incremental, 'budget.transaction')}, {late.pk})
+
+        expected = self.snapshot()
+        Transaction.objects.all().delete()
+        load_archive_chain(incremental, exclude={'contenttypes.contenttype'}, chunk_size=7)
+        self.assertEqual(self.snapshot(), expected)
+
+    def test_incomplete_archives_are_rejected(self):
+        os.makedirs(os.path.join(self.backup_dir, 'interrupted'))
+        self.assertIsNone(latest_archive(self.backup_dir))
+        with self.assertRaises(BackupError):
+            archive_chain(os.path.join(self.backup_dir, 'interrupted'))
+
+    def test_bulk_writes_mark_transactions_changed(self):
+        before = timezone.now()
+        transaction = Transaction.objects.order_by('id').first()
+        Transaction.objects.filter(pk=transaction.pk).update(updated_at=before - timedelta(days=1))
+        self.client.post('/api/transactions/bulk_confirm/', {'transaction_ids': [transaction.id]}, content_type='application/json')
+        self.assertGreaterEqual(Transaction.objects.get(pk=transaction.pk).updated_at, before)
+
+        others = Transaction.objects.exclude(pk=transaction.pk)
+        others.update(updated_at=before - timedelta(days=1))
+        self.budget_group.delete()
+        self.assertFalse(Transaction.objects.filter(updated_at__lt=before).exists())
+
+class TransactionAdminSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        account = AccountName.objects.create(name='Checking')
+        Transaction.objects.bulk_create([
+            Transaction(date=date(2020, 1, 1), amount=amount, description=description, comments=comments, source='test',
+                        account_name=account, budget_group_assignment_type='manual', transaction_assignment_type='manual')
+            for amount, description, comments in (
+                (Decimal('-12.50'), 'GROCER ONE SYDNEY', ''),
+                (Decimal('-112.50'), 'GROCER TWO', 'weekly shop'),
+                (Decimal('12.50'), 'REFUND', ''),
+                (Decimal('-40.00'), 'FUEL SYDNEY', ''),
+            )
+        ])
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def search(self, term):
+        self.client.force_login(self.admin)
+        response = self.client.get('/admin/budget/transaction/', {'q': term})
+        self.assertEqual(response.status_code, 200)
+        return sorted(transaction.description for transaction in response.context['cl'].result_list)
+
+    def test_search(self):
+        # Every word, in the description or the comments
+        self.assertEqual(self.search('grocer sydney'), ['GROCER ONE SYDNEY'])
+        self.assertEqual(self.search('grocer weekly'), ['GROCER TWO'])
+        self.assertEqual(self.search('sydney'), ['FUEL SYDNEY', 'GROCER ONE SYDNEY'])
+        # Amounts match as whole numbers of either sign, not as substrings
+        self.assertEqual(self.search('12.50'), ['GROCER ONE SYDNEY', 'REFUND'])
+        self.assertEqual(self.search('-40'), ['FUEL SYDNEY'])
+        self.assertEqual(self.search('2.5'), [])
+
+class LedgerConsistencyTests(TestCase):
+    """
+    Checks that the monthly budget summaries kept current as rows change match
+    a rebuild of the summaries from the source rows.
+    """
+    ROWS = (
+        '05/01/2020,-50.00,GROCER ONE,950.00\n'
+        '20/01/2020,-30.00,GROCER TWO,920.00\n'
+        '10/02/2020,-20.00,GROCER THREE,900.00\n'
+        '12/02/2020,-99.00,AIRLINE TICKETS,801.00\n'
+        '25/02/2020,-10.00,GROCER FOUR,791.00\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = AccountName.objects.create(name='Checking')
+        cls.groceries = BudgetGroup.objects.create(name='Groceries')
+        cls.travel = BudgetGroup.objects.create(name='Travel')
+        cls.food = TransactionType.objects.create(name='Food', default_budget_group=cls.groceries)
+        TransactionPattern.objects.create(regex_pattern='GROCER', account_name=cls.account, transaction_type=cls.food)
+        BudgetInitialization.objects.create(budget_group=cls.groceries, amount=Decimal('500.00'), date=date(2020, 1, 1))
+
+    def setUp(self):
+        clear_categorizer_cache()
+        self.import_rows(self.ROWS)
+
+    def import_rows(self, rows):
+        importer = TransactionImporter(self.account, 'alpha_bank_debit')
+        data = detect_duplicates(parse_transaction_data(csv.reader(io.StringIO(rows)), 'alpha_bank_debit'))
+        self.assertTrue(importer.run(data))
+
+    def summaries(self):
+        # A rebuild leaves out cells whose rows are all gone, a refresh zeroes them
+        return {
+            (row['budget_group'], row['month']): tuple(row[field] for field in SUMMARY_FIELDS)
+            for row in BudgetMonthSummary.objects.values('budget_group', 'month', *SUMMARY_FIELDS)
+            if any(row[field] for field in SUMMARY_FIELDS)
+        }
+
+    def assertLedgerMatchesRebuild(self):
+        maintained = self.summaries()
+        rebuild_budget_ledger()
+        self.assertEqual(maintained, self.summaries())
+        return maintained
+
+    def test_import(self):
+        self.import_rows(self.ROWS + '28/03/2020,-5.00,GROCER FIVE,786.00\n')
+        self.assertEqual(self.assertLedgerMatchesRebuild(), {
+            (self.groceries.id, date(2020, 1, 1)): (Decimal('500.00'), 0, 0, Decimal('-80.00')),
+            (self.groceries.id, date(2020, 2, 1)): (0, 0, 0, Decimal('-30.00')),
+            (self.groceries.id, date(2020, 3, 1)): (0, 0, 0, Decimal('-5.00')),
+        })
+
+    def test_modify(self):
+        grocer = Transaction.objects.get(description='GROCER THREE')
+        response = self.client.post(f'/api/transactions/{grocer.id}/modify/', {
+            'transaction_type': self.food.id, 'budget_group': self.travel.id, 'review_status': 'confirmed',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        airline = Transaction.objects.get(description='AIRLINE TICKETS')
+        airline.budget_group = self.travel
+        airline.date = date(2020, 3, 2)
+        airline.save()
+        ledger = self.assertLedgerMatchesRebuild()
+        self.assertEqual(ledger[(self.travel.id, date(2020, 2, 1))], (0, 0, 0, Decimal('-20.00')))
+        self.assertEqual(ledger[(self.travel.id, date(2020, 3, 1))], (0, 0, 0, Decimal('-99.00')))
+
+    def test_modify_without_ledger_changes(self):
+        grocer = Transaction.objects.get(description='GROCER THREE')
+        # Fetch, previous values, UPDATE and the transactions version: the ledger is left alone
+        with self.assertNumQueries(4):
+            response = self.client.post(f'/api/transactions/{grocer.id}/modify/', {
+                'budget_group': str(self.groceries.id), 'comments': 'Checked', 'review_status': 'confirmed',
+            }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Transaction.objects.get(pk=grocer.pk).comments, 'Checked')
+        self.assertLedgerMatchesRebuild()
+
+    def test_delete(self):
+        Transaction.objects.get(description='GROCER ONE').delete()
+        Transaction.objects.filter(description='GROCER FOUR').delete()
+        BudgetInitialization.objects.all().delete()
+        self.assertEqual(self.assertLedgerMatchesRebuild(), {
+            (self.groceries.id, date(2020, 1, 1)): (0, 0, 0, Decimal('-30.00')),
+            (self.groceries.id, date(2020, 2, 1)): (0, 0, 0, Decimal('-20.00')),
+        })
+
+    def test_adjustments(self):
+        adjustment = BudgetAdjustment.objects.create(from_budget_group=self.groceries, to_budget_group=self.travel,
+                                                     amount=Decimal('40.00'), date=date(2020, 1, 15))
+        response = self.client.post('/api/create-adjustment-transaction/', {
+            'date_from': '2020-01-10', 'date_to': '2020-02-10', 'amount': '25.00', 'budget_group_id': self.groceries.id,
+            'transaction_type_id': self.food.id, 'description': 'Date Adjustment',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        ledger = self.assertLedgerMatchesRebuild()
+        self.assertEqual(ledger[(self.travel.id, date(2020, 1, 1))], (0, Decimal('40.00'), 0, 0))
+
+        adjustment.date = date(2020, 2, 15)
+        adjustment.save()
+        self.assertLedgerMatchesRebuild()
+        adjustment.delete()
+        self.assertNotIn((self.travel.id, date(2020, 2, 1)), self.assertLedgerMatchesRebuild())
+
+    def test_budget_group_changes(self):
+        self.food.default_budget_group = self.travel
+        self.food.save()
+        response = self.client.post('/api/transactions/redo_categorization/')
+        self.assertEqual(response.status_code, 200)
+        ledger = self.assertLedgerMatchesRebuild()
+        self.assertEqual(ledger[(self.travel.id, date(2020, 1, 1))], (0, 0, 0, Decimal('-80.00')))
+        self.assertEqual(ledger[(self.groceries.id, date(2020, 1, 1))], (Decimal('500.00'), 0, 0, 0))
+
+        self.travel.delete()
+        self.assertEqual(self.assertLedgerMatchesRebuild(), {
+            (self.groceries.id, date(2020, 1, 1)): (Decimal('500.00'), 0, 0, 0),
+        })
+
+    def test_budget_balances(self):
+        BudgetAdjustment.objects.create(from_budget_group=self.groceries, to_budget_group=self.travel,
+                                        amount=Decimal('40.00'), date=date(2020, 2, 15))
+
+        def balances(as_of):
+            response = self.client.get('/api/budget-balances/', {'as_of': as_of})
+            self.assertEqual(response.status_code, 200)
+            return {row['budget_group_name']: Decimal(str(row['balance'])) for row in response.json()['balances']}
+
+        # Month ends come from the summaries only, other days add the days of their month
+        self.assertEqual(balances('2020-01-31'), {'Groceries': 420, 'Travel': 0})
+        self.assertEqual(balances('2020-02-14'), {'Groceries': 400, 'Travel': 0})
+        self.assertEqual(balances('2020-02-15'), {'Groceries': 360, 'Travel': 40})
+        self.assertEqual(balances('2020-02-29'), {'Groceries': 350, 'Travel': 40})
+        self.assertEqual(self.client.get('/api/budget-balances/', {'as_of': '2020-02-30'}).status_code, 400)
+
+class CategorizerTests(TestCase):
+    """
+    Checks which pattern categorizes a description, and that compiled patterns follow pattern changes.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = AccountName.objects.create(name='Checking')
+        cls.savings = AccountName.objects.create(name='Savings')
+        cls.groceries = BudgetGroup.objects.create(name='Groceries')
+        cls.small_shop = BudgetGroup.objects.create(name='Small Shop')
+        cls.food = TransactionType.objects.create(name='Food', default_budget_group=cls.groceries,
+                                                  amount_threshold=Decimal('-100.00'), threshold_budget_group=cls.small_shop)
+        cls.fuel = TransactionType.objects.create(name='Fuel')
+        cls.other = TransactionType.objects.create(name='Other')
+
+    def setUp(self):
+        clear_categorizer_cache()
+
+    def category(self, description, account=None, amount=Decimal('-10.00')):
+        transaction_type, budget_group, comments = categorize_transaction(description, account or self.account, amount)
+        return transaction_type and transaction_type.name, budget_group and budget_group.name, comments
+
+    def test_first_match_by_priority(self):
+        TransactionPattern.objects.create(regex_pattern='SHELL', account_name=self.account, transaction_type=self.other,
+                                          comments='First saved')
+        TransactionPattern.objects.create(regex_pattern='SHELL COLES', account_name=self.account, transaction_type=self.food)
+        TransactionPattern.objects.create(regex_pattern='FUEL', account_name=self.account, transaction_type=self.fuel, priority=5)
+        # Equal priorities keep the order patterns were saved in
+        self.assertEqual(self.category('SHELL COLES EXPRESS'), ('Other', None, 'First saved'))
+        # A higher priority wins over earlier patterns
+        self.assertEqual(self.category('SHELL FUEL 123'), ('Fuel', None, None))
+        self.assertEqual(self.category('UNKNOWN MERCHANT'), (None, None, None))
+
+    def test_account_patterns_before_global_ones(self):
+        TransactionPattern.objects.create(regex_pattern='COLES', transaction_type=self.other, priority=10)
+        TransactionPattern.objects.create(regex_pattern='COLES', account_name=self.account, transaction_type=self.food)
+        TransactionPattern.objects.create(regex_pattern='CALTEX', transaction_type=self.fuel)
+        self.assertEqual(self.category('COLES 1234')[0], 'Food')
+        # Global patterns are the fallback of every account
+        self.assertEqual(self.category('COLES 1234', self.savings)[0], 'Other')
+        self.assertEqual(self.category('CALTEX WOOLWORTHS')[0], 'Fuel')
+
+    def test_amount_thresholds(self):
+        TransactionPattern.objects.create(regex_pattern='COLES', account_name=self.account, transaction_type=self.food)
+        self.assertEqual(self.category('COLES 1234', amount=Decimal('-20.00'))[1], 'Small Shop')
+        self.assertEqual(self.category('COLES 1234', amount=Decimal('-100.00'))[1], 'Small Shop')
+        self.assertEqual(self.category('COLES 1234', amount=Decimal('-100.01'))[1], 'Groceries')
+
+    def test_pattern_changes_invalidate_the_memo(self):
+        pattern = TransactionPattern.objects.create(regex_pattern='COLES', account_name=self.account, transaction_type=self.food)
+        self.assertEqual(self.category('COLES 1234')[0], 'Food')
+        self.assertEqual(self.category('COLES 1234')[0], 'Food')
+        self.assertEqual(get_categorizer(self.account).memo_stats()['hits'], 1)
+
+        pattern.transaction_type = self.other
+        pattern.save()
+        self.assertEqual(self.category('COLES 1234')[0], 'Other')
+        TransactionPattern.objects.create(regex_pattern='COLES 1234', account_name=self.account, transaction_type=self.fuel,
+                                          priority=1)
+        self.assertEqual(self.category('COLES 1234')[0], 'Fuel')
+        TransactionPattern.objects.filter(priority=1).delete()
+        self.assertEqual(self.category('COLES 1234')[0], 'Other')
+        pattern.delete()
+        self.assertEqual(self.category('COLES 1234'), (None, None, None))
+
+    def test_global_patterns_through_the_api(self):
+        TransactionPattern.objects.create(regex_pattern='COLES', account_name=self.account, transaction_type=self.food)
+        response = self.client.post('/api/transaction-patterns/', {
+            'regex_pattern': 'COLES|SHELL', 'transaction_type': self.other.id, 'account_name': None, 'priority': 3,
+        }, content_type='application/json')
+        self.assertEqual((response.status_code, response.data['priority'], response.data['account_name']), (201, 3, None))
+        # The account's own pattern wins whatever the priorities, the global one covers the rest
+        self.assertEqual(self.category('COLES 1234')[0], 'Food')
+        self.assertEqual(self.category('SHELL 1234')[0], 'Other')
+        self.assertEqual(self.category('COLES 1234', self.savings)[0], 'Other')
+
+    def test_preview_priority_and_global_changes(self):
+        coles = TransactionPattern.objects.create(regex_pattern='COLES', account_name=self.account, transaction_type=self.food)
+        Transaction.objects.create(date=date(2020, 1, 1), amount=Decimal('-10.00'), description='COLES EXPRESS SHELL',
+                                   source='test', account_name=self.account, transaction_assignment_type='unassigned',
+                                   budget_group_assignment_type='unassigned')
+        clear_description_cache()
+
+        def preview(*changes):
+            response = self.client.post('/api/transaction-patterns/preview/', {'account_name': self.account.id, 'changes': changes},
+                                        content_type='application/json')
+            return response.status_code, response.data
+
+        # A higher priority candidate takes the description, an equal one comes after the saved patterns
+        _, data = preview({'regex_pattern': 'SHELL', 'transaction_type': self.fuel.id, 'priority': 1})
+        self.assertEqual((data['patterns'][0]['categorized_transactions'], data['reclassified_transactions']), (1, 1))
+        _, data = preview({'regex_pattern': 'SHELL', 'transaction_type': self.fuel.id})
+        self.assertEqual([rule['pattern_id'] for rule in data['patterns'][0]['shadowed_by']], [coles.id])
+        # Made global, the saved pattern goes after an account candidate
+        _, data = preview({'id': coles.id, 'global': True}, {'regex_pattern': 'SHELL', 'transaction_type': self.fuel.id})
+        self.assertEqual((data['patterns'][0]['pattern']['global'], data['patterns'][1]['categorized_transactions']), (True, 1))
+        self.assertEqual(preview({'regex_pattern': 'SHELL', 'transaction_type': self.fuel.id, 'priority': 'high'})[0], 400)
+
+class IndexedMatcherTests(TestCase):
+    """
+    Checks that the trigram prefilter of the indexed matcher never changes which rule matches.
+    """
+    PATTERNS = (
+        r'\x41MAZON', r'\101LDI', r'CAF\xe9', r'\u0041RTS', r'\N{LATIN CAPITAL LETTER B}UNNINGS', r'(EE)\1XYZ',
+        r'PAYPAL \*NETFLIX', r'NET\.?FLIX', r'WOOLWORTHS|COLES', r'UBER( EATS)?', r'(?i)spotify', r'(?-i:Kmart) STORE',
+        r'COLES\s+\d{4}', r'\bBP\b CONNECT', r'TRANSFER TO \d+', r'OPTUS?', r'TELSTRA\??',
+    )
+    DESCRIPTIONS = (
+        'AMAZON MKTPLACE', 'ALDI STORES', 'CAF\xe9 ROMA', 'CAFE ROMA', 'ARTS CENTRE', 'BUNNINGS 123', 'EEEEXYZ', 'XYZ',
+        'PAYPAL *NETFLIX', 'PAYPAL NETFLIX', 'NET.FLIX', 'NETFLIX.COM', 'COLES 1234', 'WOOLWORTHS 55', 'UBER TRIP',
+        'Uber Eats', 'SPOTIFY P0123', 'Kmart STORE', 'KMART STORE', 'BP CONNECT', 'BPX CONNECT', 'TRANSFER TO 99',
+        'OPTU', 'TELSTRA?', 'MERCHANT 7 SYDNEY', 'nothing at all',
+    )
+
+    def rules(self):
+        # Enough rules for the categorizer to pick the indexed matcher, the tricky ones in between
+        patterns = [f'MERCHANT {index} ' for index in range(20)] + list(self.PATTERNS)
+        return [CategorizationRule(index, pattern, None) for index, pattern in enumerate(patterns)]
+
+    def test_required_literals(self):
+        self.assertEqual(required_literal(r'PAYPAL \*NETFLIX'), 'paypal *netflix')
+        self.assertEqual(required_literal(r'NET\.?FLIX'), 'flix')
+        self.assertEqual(required_literal(r'COLES\s+\d{4}'), 'coles')
+        self.assertEqual(required_literal(r'UBER( EATS)?'), 'uber')
+        for pattern in (r'\x41MAZON', r'\101LDI', r'\u0041RTS', r'(EE)\1XYZ', r'WOOLWORTHS|COLES'):
+            self.assertIsNone(required_literal(pattern), pattern)
+
+    def test_literals_are_required(self):
+        for rule in self.rules():
+            literal = required_literal(rule.regex_pattern)
+            for description in self.DESCRIPTIONS:
+                if literal is not None and rule.regex.search(description):
+                    self.assertIn(literal, description.lower(), (rule.regex_pattern, description))
+
+    def test_matchers_agree(self):
+        rules = self.rules()
+        indexed = IndexedMatcher(rules)
+        sequential = SequentialMatcher(rules)
+        matched = 0
+        for description in self.DESCRIPTIONS:
+            with self.subTest(description=description):
+                expected = sequential.match(description)
+                self.assertIs(indexed.match(description), expected)
+                matched += expected is not None
+        self.assertGreater(matched, 15)
+
+class PatternPreviewTests(TestCase):
+    """
+    Checks the pattern change preview against what applying the changes does.
+    """
+    DESCRIPTIONS = (('GROCER ONE', 3), ('GROCER SPECIAL FUEL', 2), ('SHELL FUEL', 4), ('NETFLIX', 1))
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = AccountName.objects.create(name='Checking')
+        cls.food = TransactionType.objects.create(name='Food')
+        cls.fuel = TransactionType.objects.create(name='Fuel')
+        cls.other = TransactionType.objects.create(name='Other')
+        cls.grocer = TransactionPattern.objects.create(regex_pattern='GROCER', account_name=cls.account, transaction_type=cls.food)
+        Transaction.objects.bulk_create([
+            Transaction(date=date(2020, 1, 1), amount=Decimal('-10.00'), description=description, account_name=cls.account,
+                        source='test', dedupe_key=f'{description} {index}', transaction_assignment_type='unassigned',
+                        budget_group_assignment_type='unassigned')
+            for description, count in cls.DESCRIPTIONS for index in range(count)
+        ])
+
+    def setUp(self):
+        clear_categorizer_cache()
+        clear_description_cache()
+        recategorize_transactions()
+        # A confirmed assignment is left alone by redo_categorization
+        Transaction.objects.filter(pk=Transaction.objects.filter(description='GROCER ONE').order_by('id')[0].pk).update(
+            transaction_assignment_type='manual', budget_group_assignment_type='manual')
+
+    def test_added_patterns(self):
+        preview = preview_pattern_changes(self.account.id, [
+            {'regex_pattern': 'FUEL', 'transaction_type': self.fuel.id, 'priority': 5},
+            {'regex_pattern': 'SHELL', 'transaction_type': self.other.id, 'priority': 5},
+        ])
+        fuel, shell = preview['patterns']
+        self.assertEqual(
+            (fuel['new'], fuel['matched_transactions'], fuel['categorized_transactions'], fuel['shadowed_by']),
+            (True, 6, 6, [])
+        )
+        self.assertEqual([(rule['pattern_id'], rule['transactions']) for rule in fuel['takes_from']], [(self.grocer.id, 2)])
+        self.assertEqual((shell['matched_transactions'], shell['categorized_transactions']), (4, 0))
+        self.assertEqual([(rule['regex_pattern'], rule['transactions']) for rule in shell['shadowed_by']], [('FUEL', 4)])
+        self.assertEqual(preview['reclassified_transactions'], 6)
+
+    def test_preview_matches_redo_categorization(self):
+        changes = [
+            {'id': self.grocer.id, 'transaction_type': self.other.id},
+            {'regex_pattern': 'FUEL', 'transaction_type': self.fuel.id, 'priority': 5},
+        ]
+        response = self.client.post('/api/transaction-patterns/preview/', {'account_name': self.account.id, 'changes': changes},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        preview = response.json()
+        unconfirmed = Transaction.objects.filter(UNCONFIRMED_ASSIGNMENT).count()
+
+        self.grocer.transaction_type = self.other
+        self.grocer.save()
+        TransactionPattern.objects.create(regex_pattern='FUEL', account_name=self.account, transaction_type=self.fuel, priority=5)
+        summary = self.client.post('/api/transactions/redo_categorization/').json()
+
+        self.assertEqual((preview['reclassified_transactions'], preview['reclassified_unconfirmed_transactions']), (9, 8))
+        self.assertEqual(summary['changed'], preview['reclassified_unconfirmed_transactions'])
+        self.assertEqual(summary['unchanged'], unconfirmed - preview['reclassified_unconfirmed_transactions'])
+        self.assertEqual(
+            dict(Transaction.objects.filter(UNCONFIRMED_ASSIGNMENT).values_list('description', 'transaction_type__name').distinct()),
+            {'GROCER ONE': 'Other', 'GROCER SPECIAL FUEL': 'Fuel', 'SHELL FUEL': 'Fuel', 'NETFLIX': None}
+        )
+
+class ImportJobTests(TestCase):
+    """
+    Checks background import jobs from upload to their reported outcome.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = AccountName.objects.create(name='Checking')
+
+    def setUp(self):
+        job_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(job_dir.cleanup)
+        self.job_dir = job_dir.name
+        job_settings = override_settings(IMPORT_JOB_DIR=job_dir.name)
+        job_settings.enable()
+        self.addCleanup(job_settings.disable)
+
+    def queue(self, content):
+        # Jobs are submitted to the thread pool on commit, run them here instead
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/import-transactions/', {
+                'file': SimpleUploadedFile('export.csv', content),
+                'import_format': 'alpha_bank_debit',
+                'account_name': self.account.id,
+                'background': 'true',
+            })
+        self.assertEqual((response.status_code, response.json()['status'], len(callbacks)), (202, 'queued', 1))
+        return response.json()['job_id']
+
+    def run_job(self, job_id):
+        # A finished job closes its thread's connection, which would end the test's transaction
+        with mock.patch.object(connection, 'close'):
+            run_import_job(job_id)
+        return self.client.get(f'/api/import-jobs/{job_id}/').json()
+
+    def test_completed_job(self):
+        job_id = self.queue(b'05/01/2020,-50.00,GROCER ONE,950.00\n20/01/2020,-30.00,GROCER TWO,920.00\n'
+                            b'20/01/2020,-30.00,GROCER TWO,920.00\n')
+        self.assertTrue(os.path.exists(job_file_path(job_id)))
+        job = self.run_job(job_id)
+        self.assertEqual(
+            (job['status'], job['rows_parsed'], job['rows_inserted'], job['rows_duplicate'], job['rows_uncategorized']),
+            ('completed', 3, 3, 0, 3)
+        )
+        self.assertEqual(Transaction.objects.filter(account_name=self.account).count(), 3)
+        self.assertFalse(os.path.exists(job_file_path(job_id)))
+
+        # Importing the same rows again skips them all
+        job = self.run_job(self.queue(b'05/01/2020,-50.00,GROCER ONE,950.00\n'))
+        self.assertEqual((job['status'], job['rows_inserted'], job['rows_duplicate']), ('completed', 0, 1))
+
+    def test_row_errors(self):
+        job = self.run_job(self.queue(b'05/01/2020,-50.00,GROCER ONE,950.00\n32/01/2020,-30.00,GROCER TWO,920.00\n'
+                                      b'06/01/2020,lots,GROCER THREE,900.00\n'))
+        self.assertEqual((job['status'], job['error_count'], job['rows_inserted']), ('failed', 2, 0))
+        self.assertEqual([(error['row'], sorted(error['errors'])) for error in job['errors']], [(2, ['date']), (3, ['amount'])])
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_failed_job(self):
+        job_id = self.queue(b'05/01/2020,-50.00,CAF\xe9,950.00\n')
+        with self.assertLogs('budget.jobs', 'ERROR'):
+            job = self.run_job(job_id)
+        self.assertEqual((job['status'], job['error_count'], job['rows_inserted']), ('failed', 0, 0))
+        self.assertIn('utf-8', job['errors'][0]['error'])
+        self.assertIsNotNone(job['finished_at'])
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_stale_jobs(self):
+        stale_id = self.queue(b'05/01/2020,-50.00,GROCER ONE,950.00\n')
+        running = ImportJob.objects.create(account_name=self.account, import_format='alpha_bank_debit', status='running')
+        recent = ImportJob.objects.create(account_name=self.account, import_format='alpha_bank_debit')
+        ImportJob.objects.filter(id__in=[stale_id, running.id]).update(updated_at=timezone.now() - timedelta(hours=2))
+
+        jobs = {job['id']: job for job in self.client.get('/api/import-jobs/').json()}
+        self.assertEqual([jobs[job_id]['status'] for job_id in (stale_id, running.id, recent.id)], ['failed', 'failed', 'queued'])
+        self.assertIn('restarted', jobs[stale_id]['errors'][0]['error'])
+        self.assertFalse(os.path.exists(job_file_path(stale_id)))
+
+        # The job is not run if its worker only gets to it now
+        self.assertEqual(self.run_job(stale_id)['status'], 'failed')
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_failed_uploads_leave_no_job(self):
+        def chunks(self, chunk_size=None):
+            yield b'05/01/2020,-50.00,GROCER ONE,950.00\n'
+            raise OSError('No space left on device')
+
+        with mock.patch('django.core.files.uploadedfile.InMemoryUploadedFile.chunks', chunks), \
+                self.captureOnCommitCallbacks() as callbacks, self.assertLogs('budget.views.import_views', 'ERROR'):
+            response = self.client.post('/api/import-transactions/', {
+                'file': SimpleUploadedFile('export.csv', b''),
+                'import_format': 'alpha_bank_debit',
+                'account_name': self.account.id,
+                'background': 'true',
+            })
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(callbacks, [])
+        self.assertFalse(ImportJob.objects.exists())
+        self.assertEqual(os.listdir(self.job_dir), [])
+
+class CursorPaginationTests(TestCase):
+    """
+    Checks keyset pagination of paginated-transactions across ties, in both
+    directions and with bad cursors.
+    """
+    URL = '/api/paginated-transactions/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = AccountName.objects.create(name='Checking')
+        # Five transactions a day, so pages split days with the same date
+        create_transactions(23, [cls.account])
+
+    def get_page(self, **params):
+        response = self.client.get(self.URL, {'pagination': 'cursor', 'per_page': 4, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def walk(self, sort_direction, sort_by='date'):
+        """
+        Follow next_cursor to the end, then prev_cursor back to the start, returning the ids of both walks.
+        """
+        pages = [self.get_page(sort_by=sort_by, sort_direction=sort_direction)]
+        self.assertIsNone(pages[0]['prev_cursor'])
+        while pages[-1]['next_cursor']:
+            pages.append(self.get_page(sort_by=sort_by, sort_direction=sort_direction, cursor=pages[-1]['next_cursor']))
+        forward = [row['id'] for page in pages for row in page['transactions']]
+
+        backward = [row['id'] for row in pages[-1]['transactions']]
+        page = pages[-1]
+        while page['prev_cursor']:
+            page = self.get_page(sort_by=sort_by, sort_direction=sort_direction, cursor=page['prev_cursor'])
+            backward[:0] = [row['id'] for row in page['transactions']]
+        return pages, forward, backward
+
+    def test_pages_cover_ties_in_order(self):
+        for sort_direction, ordering in (('asc', ('date', 'id')), ('desc', ('-date', '-id'))):
+            with self.subTest(sort_direction):
+                expected = list(Transaction.objects.order_by(*ordering).values_list('id', flat=True))
+                pages, forward, backward = self.walk(sort_direction)
+                self.assertEqual(forward, expected)
+                self.assertEqual(backward, expected)
+                self.assertEqual([len(page['transactions']) for page in pages], [4, 4, 4, 4, 4, 3])
+                self.assertIsNone(pages[-1]['next_cursor'])
+
+    def test_pages_sorted_by_amount(self):
+        expected = list(Transaction.objects.order_by('-amount', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk('desc', sort_by='amount')[1], expected)
+
+    def test_rows_match_the_serializer(self):
+        page = self.get_page(sort_direction='asc')
+        transactions = Transaction.objects.order_by('date', 'id')[:4]
+        self.assertEqual(page['transactions'], TransactionSerializer(transactions, many=True).data)
+
+    def test_end_of_data(self):
+        last = Transaction.objects.order_by('date', 'id').last()
+        page = self.get_page(sort_direction='asc', cursor=encode_cursor('date', last.date, last.id, 'next'))
+        self.assertEqual((page['transactions'], page['next_cursor'], page['prev_cursor']), ([], None, None))
+
+    def test_invalid_cursors(self):
+        first = Transaction.objects.order_by('date', 'id').first()
+        cursors = {
+            'garbage': 'not a cursor',
+            'not json': 'bm90IGpzb24',
+            'other ordering': encode_cursor('-date', first.date, first.id, 'next'),
+            'null value': encode_cursor('date', None, first.id, 'next'),
+            'bad value': encode_cursor('date', 'yesterday', first.id, 'next'),
+            'huge id': encode_cursor('date', first.date, 2 ** 70, 'next'),
+            'bad direction': encode_cursor('date', first.date, first.id, 'sideways'),
+        }
+        for label, cursor in cursors.items():
+            with self.subTest(label):
+                response = self.client.get(self.URL, {'pagination': 'cursor', 'sort_by': 'date', 'sort_direction': 'asc',
+                                                      'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.URL, {'pagination': 'cursor', 'sort_by': 'comments'})
+        self.assertEqual(response.status_code, 400)
+
+class ImportTests(TestCase):
+    """
+    Checks the transaction and pattern importers: duplicate rows, row errors and pattern upserts.
+    """
+    ROWS = b'05/01/2020,-50.00,GROCER ONE,950.00\n20/01/2020,-30.00,GROCER TWO,920.00\n20/01/2020,-30.00,GROCER TWO,920.00\n'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = AccountName.objects.create(name='Checking')
+        cls.savings = AccountName.objects.create(name='Savings')
+        cls.food = TransactionType.objects.create(name='Food')
+
+    def import_transactions(self, content, account=None):
+        return self.client.post('/api/import-transactions/', {
+            'file': SimpleUploadedFile('export.csv', content),
+            'import_format': 'alpha_bank_debit',
+            'account_name': (account or self.account).id,
+        })
+
+    def import_patterns(self, content):
+        return self.client.post('/api/import-transaction-patterns/', {
+            'file': SimpleUploadedFile('patterns.csv', content),
+            'account_name': self.account.id,
+        })
+
+    def test_reimported_rows_are_skipped(self):
+        response = self.import_transactions(self.ROWS)
+        self.assertEqual((response.status_code, response.data['imported'], response.data['duplicates']), (201, 3, 0))
+        # Rows repeated within a file are told apart by a counter
+        self.assertEqual(
+            sorted(Transaction.objects.values_list('description', flat=True)),
+            ['GROCER ONE', 'GROCER TWO', 'GROCER TWO (2)']
+        )
+
+        response = self.import_transactions(self.ROWS + b'21/01/2020,-5.00,GROCER THREE,915.00\n')
+        self.assertEqual((response.data['imported'], response.data['duplicates']), (1, 3))
+        # The same rows are new to another account
+        response = self.import_transactions(self.ROWS, self.savings)
+        self.assertEqual((response.data['imported'], response.data['duplicates']), (3, 0))
+
+    def test_rows_without_dedupe_keys_are_recognised(self):
+        stored = Transaction.objects.bulk_create([Transaction(
+            date=date(2020, 1, 5), amount=Decimal('-50.00'), balance=Decimal('950.00'), description='GROCER ONE',
+            source='alpha_bank_debit', account_name=self.account,
+        )])[0]
+        response = self.import_transactions(self.ROWS)
+        self.assertEqual((response.data['imported'], response.data['duplicates']), (2, 1))
+        stored.refresh_from_db()
+        self.assertEqual(stored.dedupe_key, stored.compute_dedupe_key())
+
+    @override_settings(IMPORT_BATCH_SIZE=2)
+    def test_row_errors_save_nothing(self):
+        response = self.import_transactions(self.ROWS + b'31/02/2020,-5.00,GROCER THREE,915.00\n'
+                                            b'22/01/2020,,NO AMOUNT,915.00\n22/01/2020,-5.00,,915.00\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error_count'], 3)
+        self.assertEqual(
+            [(error['row'], sorted(error['errors'])) for error in response.data['row_errors']],
+            [(4, ['date']), (5, ['amount']), (6, ['description'])]
+        )
+        # The rows of the batches before the errors are rolled back too
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_patterns_are_upserted(self):
+        TransactionPattern.objects.create(regex_pattern='GROCER', account_name=self.account, transaction_type=self.food,
+                                          comments='Old')
+        # The same pattern of another account is left alone
+        TransactionPattern.objects.create(regex_pattern='GROCER', account_name=self.savings, transaction_type=self.food)
+        response = self.import_patterns(b'Pattern,Category,Comments,Priority\nGROCER,Groceries,Weekly,5\n'
+                                        b'SHELL,Fuel,,\nSHELL,Transport,Later row wins,\n')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['types_created']), (1, 1, 2))
+        self.assertFalse(TransactionType.objects.filter(name='Fuel').exists())
+        self.assertEqual(
+            set(TransactionPattern.objects.filter(account_name=self.account)
+                .values_list('regex_pattern', 'transaction_type__name', 'comments', 'priority')),
+            {('GROCER', 'Groceries', 'Weekly', 5), ('SHELL', 'Transport', 'Later row wins', 0)}
+        )
+        self.assertEqual(TransactionPattern.objects.get(account_name=self.savings).transaction_type, self.food)
+
+    def test_invalid_patterns_save_nothing(self):
+        response = self.import_patterns(b'Pattern,Category,Priority\nGROCER,Food,\nSHELL(,Fuel,\n,Fuel,\nBP,,high\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [(error['row'], sorted(error['errors'])) for error in response.data['row_errors']],
+            [(2, ['Pattern']), (3, ['Pattern']), (4, ['Category', 'Priority'])]
+        )
+        self.assertFalse(TransactionPattern.objects.exists())
+        self.assertEqual(self.import_patterns(b'Regex,Category\nGROCER,Food\n').status_code, 400)
+
+    def test_pattern_import_keeps_priorities_and_recompiles(self):
+        TransactionPattern.objects.create(regex_pattern='GROCER', account_name=self.account, transaction_type=self.food, priority=7)
+        clear_categorizer_cache()
+        self.assertEqual(categorize_transaction('GROCER ONE', self.account, Decimal('-1.00'))[0], self.food)
+
+        # Without a Priority column the existing priorities are kept
+        response = self.import_patterns(b'Pattern,Category\nGROCER,Groceries\nSHELL,Fuel\n')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            dict(TransactionPattern.objects.values_list('regex_pattern', 'priority')),
+            {'GROCER': 7, 'SHELL': 0}
+        )
+        # The bulk upsert skips the model signals but still replaces the compiled patterns
+        self.assertEqual(categorize_transaction('GROCER ONE', self.account, Decimal('-1.00'))[0].name, 'Groceries')
+        self.assertEqual(categorize_transaction('SHELL 123', self.account, Decimal('-1.00'))[0].name, 'Fuel')
+
+class PeriodReportTests(TestCase):
+    """
+    Checks the dense periods x series matrix of the period report.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = AccountName.objects.create(name='Checking')
+        cls.groceries = BudgetGroup.objects.create(name='Groceries')
+        cls.fuel = BudgetGroup.objects.create(name='Fuel')
+        for day, amount, budget_group in [
+            (date(2019, 12, 31), '-40.00', cls.groceries),
+            (date(2020, 1, 2), '-10.00', cls.groceries),
+            (date(2020, 1, 2), '100.00', cls.groceries),
+            (date(2020, 1, 3), '-20.00', cls.fuel),
+            (date(2020, 3, 15), '-5.00', None),
+        ]:
+            Transaction.objects.create(date=day, amount=Decimal(amount), description='REPORT', source='test',
+                                       account_name=cls.account, budget_group=budget_group)
+
+    def report(self, **params):
+        response = self.client.get('/api/period-report/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_monthly_matrix(self):
+        report = self.report(period='month')
+        self.assertEqual(report['periods'], [date(2019, 12, 1), date(2020, 1, 1), date(2020, 2, 1), date(2020, 3, 1)])
+        # Series by name, transactions without a budget group last, every period filled in
+        self.assertEqual([(series['name'], series['id']) for series in report['series']],
+                         [('Fuel', self.fuel.id), ('Groceries', self.groceries.id), ('Unassigned', None)])
+        groceries = report['series'][1]
+        self.assertEqual(groceries['inflow'], [0, Decimal('100.00'), 0, 0])
+        self.assertEqual(groceries['outflow'], [Decimal('-40.00'), Decimal('-10.00'), 0, 0])
+        self.assertEqual(groceries['net'], [Decimal('-40.00'), Decimal('90.00'), 0, 0])
+        self.assertEqual(groceries['count'], [1, 2, 0, 0])
+        self.assertEqual((groceries['total_inflow'], groceries['total_outflow'], groceries['total_net']),
+                         (Decimal('100.00'), Decimal('-50.00'), Decimal('50.00')))
+        totals = report['totals']
+        self.assertEqual(totals['net'], [Decimal('-40.00'), Decimal('70.00'), 0, Decimal('-5.00')])
+        self.assertEqual(totals['count'], [1, 3, 0, 1])
+
+    def test_year_boundary(self):
+        # The week and the fortnight around new year hold both years' days, the years do not
+        weekly = self.report(period='week', group_by='account')
+        self.assertEqual(weekly['periods'][0], date(2019, 12, 30))
+        self.assertEqual(weekly['periods'][-1], date(2020, 3, 9))
+        self.assertEqual(len(weekly['periods']), 11)
+        self.assertEqual(weekly['totals']['count'][:2], [4, 0])
+        self.assertEqual(weekly['totals']['net'][0], Decimal('30.00'))
+
+        fortnightly = self.report(period='fortnight', group_by='account')
+        self.assertEqual(fortnightly['periods'][:2], [date(2019, 12, 23), date(2020, 1, 6)])
+        self.assertEqual(fortnightly['totals']['count'][0], 4)
+
+        yearly = self.report(period='year', group_by='account')
+        self.assertEqual(yearly['periods'], [date(2019, 1, 1), date(2020, 1, 1)])
+        self.assertEqual(yearly['series'][0]['net'], [Decimal('-40.00'), Decimal('65.00')])
+
+    def test_date_range_and_empty_periods(self):
+        report = self.report(period='month', dateFrom='2019-11-15', dateTo='2020-04-30')
+        self.assertEqual(len(report['periods']), 6)
+        self.assertEqual(report['totals']['count'], [0, 1, 3, 0, 1, 0])
+
+        empty = self.report(period='month', dateFrom='2021-01-01', dateTo='2021-02-28')
+        self.assertEqual(empty['periods'], [date(2021, 1, 1), date(2021, 2, 1)])
+        self.assertEqual((empty['series'], empty['totals']['net'], empty['totals']['total_net']), ([], [0, 0], 0))
+        self.assertEqual(self.report(account=self.account.id + 1)['periods'], [])
+
+    def test_invalid_parameters(self):
+        for params in ({'period': 'day'}, {'group_by': 'description'}, {'dateFrom': '2020-13-01'}):
+            with self.subTest(params):
+                self.assertEqual(self.client.get('/api/period-report/', params).status_code, 400)
+
+class RedoCategorizationTests(TestCase):
+    """
+    Checks the changes redo_categorization makes and the summary it returns.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.checking = AccountName.objects.create(name='Checking')
+        cls.savings = AccountName.objects.create(name='Savings')
+        cls.groceries = BudgetGroup.objects.create(name='Groceries')
+        cls.food = TransactionType.objects.create(name='Food', default_budget_group=cls.groceries)
+        cls.fuel = TransactionType.objects.create(name='Fuel')
+        TransactionPattern.objects.create(regex_pattern='COLES', account_name=cls.checking, transaction_type=cls.food,
+                                          comments='Weekly shop')
+        TransactionPattern.objects.create(regex_pattern='SHELL', transaction_type=cls.fuel)
+
+        def transaction(account, description, assignment='unassigned', transaction_type=None, comments=None):
+            return Transaction(date=date(2020, 1, 1), amount=Decimal('-10.00'), description=description, source='test',
+                               account_name=account, transaction_type=transaction_type, comments=comments,
+                               budget_group=transaction_type and transaction_type.default_budget_group,
+                               transaction_assignment_type=assignment, budget_group_assignment_type=assignment)
+
+        cls.transactions = Transaction.objects.bulk_create([
+            transaction(cls.checking, 'COLES 1'),
+            transaction(cls.checking, 'COLES 2', comments='Birthday'),
+            transaction(cls.checking, 'COLES 3', 'auto_unchecked', cls.food, 'Weekly shop'),
+            transaction(cls.checking, 'SHELL 1', 'auto_unchecked', cls.food),
+            transaction(cls.checking, 'COLES 4', 'manual'),
+            transaction(cls.savings, 'COLES 5'),
+            transaction(cls.savings, 'SHELL 2'),
+        ])
+
+    def setUp(self):
+        clear_categorizer_cache()
+
+    def test_summary(self):
+        summary, changed_ids = recategorize_transactions(chunk_size=2)
+        self.assertEqual((summary['processed'], summary['changed'], summary['unchanged']), (6, 4, 2))
+        self.assertEqual(summary['accounts'], [
+            {'account_id': self.checking.id, 'account_name': 'Checking', 'changed': 3, 'unchanged': 1},
+            {'account_id': self.savings.id, 'account_name': 'Savings', 'changed': 1, 'unchanged': 1},
+        ])
+        descriptions = dict(Transaction.objects.filter(id__in=changed_ids).values_list('description', 'transaction_type__name'))
+        self.assertEqual(descriptions, {'COLES 1': 'Food', 'COLES 2': 'Food', 'SHELL 1': 'Fuel', 'SHELL 2': 'Fuel'})
+
+        rows = {row.description: row for row in Transaction.objects.all()}
+        self.assertEqual((rows['COLES 1'].comments, rows['COLES 2'].comments), ('Weekly shop', 'Birthday'))
+        self.assertEqual((rows['COLES 1'].budget_group, rows['COLES 1'].transaction_assignment_type), (self.groceries, 'auto_unchecked'))
+        self.assertEqual((rows['SHELL 1'].budget_group, rows['SHELL 1'].budget_group_assignment_type), (None, 'unassigned'))
+        # Confirmed assignments are left alone
+        self.assertIsNone(rows['COLES 4'].transaction_type)
+
+        summary, changed_ids = recategorize_transactions()
+        self.assertEqual((summary['processed'], summary['changed'], summary['unchanged'], changed_ids), (6, 0, 6, []))
+
+    def test_endpoint_detail(self):
+        response = self.client.post('/api/transactions/redo_categorization/?detail=true&per_page=3&page=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['changed'], response.data['total_pages'], response.data['current_page']), (4, 2, 2))
+        self.assertEqual([row['description'] for row in response.data['changed_transactions']], ['SHELL 2'])
+        self.assertNotIn('changed_transactions', self.client.post('/api/transactions/redo_categorization/').data)
+
+    def test_invalid_pages_are_rejected_before_recategorizing(self):
+        for query in ('per_page=abc', 'per_page=0', 'page=abc', 'page=-1'):
+            response = self.client.post(f'/api/transactions/redo_categorization/?detail=true&{query}')
+            self.assertEqual(response.status_code, 400, query)
+        self.assertEqual(recategorize_transactions()[0]['changed'], 4)
+        # Without detail the page parameters are not used
+        self.assertEqual(self.client.post('/api/transactions/redo_categorization/?per_page=abc').status_code, 200)
+
+class BulkConfirmTests(TestCase):
+    """
+    Checks what bulk_confirm writes to confirmed transactions and reports back.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = AccountName.objects.create(name='Checking')
+        cls.transactions = Transaction.objects.bulk_create([
+            Transaction(date=date(2020, 1, 1), amount=Decimal('-10.00'), description=f'PENDING {index}', source='test',
+                        account_name=cls.account, comments=f'Imported {index}', review_status='pending',
+                        transaction_assignment_type='auto_unchecked', budget_group_assignment_type='unassigned')
+            for index in range(3)
+        ])
+
+    def test_confirm(self):
+        first, second, untouched = self.transactions
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/transactions/bulk_confirm/', {
+                'transaction_ids': [first.id, str(second.id), 999999],
+                'comments_map': {str(first.id): 'Checked', str(999999): 'Missing'},
+            }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['confirmed'], response.data['not_found'], response.data['not_found_ids']), (2, 1, [999999]))
+        self.assertEqual(sum(query['sql'].startswith('UPDATE "budget_transaction"') for query in queries.captured_queries), 1)
+
+        rows = {row.id: row for row in Transaction.objects.all()}
+        for transaction, comments in ((first, 'Checked'), (second, '')):
+            row = rows[transaction.id]
+            self.assertEqual(
+                (row.review_status, row.transaction_assignment_type, row.budget_group_assignment_type, row.comments),
+                ('confirmed', 'auto_checked', 'auto_checked', comments)
+            )
+        self.assertEqual((rows[untouched.id].review_status, rows[untouched.id].comments), ('pending', 'Imported 2'))
+        pending = self.client.get('/api/transactions/pending_review/').data['results']
+        self.assertEqual([row['id'] for row in pending], [untouched.id])
+
+    def test_invalid_ids(self):
+        transaction_id = self.transactions[0].id
+        for data in (
+            {'transaction_ids': ['first']},
+            # Not read one character at a time
+            {'transaction_ids': str(transaction_id)},
+            {'transaction_ids': [transaction_id], 'comments_map': ['Checked']},
+            {'transaction_ids': [transaction_id], 'comments_map': {str(transaction_id): 1}},
+        ):
+            response = self.client.post('/api/transactions/bulk_confirm/', data, content_type='application/json')
+            self.assertEqual(response.status_code, 400, data)
+        self.assertFalse(Transaction.objects.filter(review_status='confirmed').exists())
+
+@override_settings(BANK_FORMATS={'alpha_bank_debit': 'Alpha Bank Debit', 'beta_bank_credit': 'Beta Bank Credit',
+                                 'gamma_bank_checking': 'Gamma Bank Checking'})
+class BankFormatTests(SimpleTestCase):
+    """
+    Checks how bank format definitions are validated and how their rows are parsed.
+    """
+    def parse(self, bank_format, text):
+        return list(bank_format.parse(csv.reader(io.StringIO(text))))
+
+    def test_builtin_layouts(self):
+        self.assertEqual(bank_format_names(), {'alpha_bank_debit': 'Alpha Bank Debit', 'beta_bank_credit': 'Beta Bank Credit',
+                                               'gamma_bank_checking': 'Gamma Bank Checking'})
+        self.assertEqual(self.parse(get_bank_format('alpha_bank_debit'), '05/01/2020,"-$1,050.25",GROCER,"$2,000.00"\n'), [
+            {'date': '2020-01-05', 'description': 'GROCER', 'amount': Decimal('-1050.25'), 'balance': Decimal('2000.00')},
+        ])
+        self.assertEqual(self.parse(get_bank_format('beta_bank_credit'), '05/01/2020,12.50,REFUND\n'), [
+            {'date': '2020-01-05', 'description': 'REFUND', 'amount': Decimal('12.50'), 'balance': None},
+        ])
+        # The checking export starts with two header rows
+        self.assertEqual(self.parse(get_bank_format('gamma_bank_checking'), 'Account,123\nDate,Details\n05/01/2020,FUEL,-40,960\n'), [
+            {'date': '2020-01-05', 'description': 'FUEL', 'amount': Decimal('-40'), 'balance': Decimal('960')},
+        ])
+        with self.assertRaises(ValueError):
+            get_bank_format('delta_bank')
+
+    def test_declared_formats(self):
+        bank_format = BankFormat('delta', 'Delta', ['date', None, 'description', 'debit', 'credit'], date_format='%Y-%m-%d',
+                                 currency_symbols='€', thousands_separator='.', decimal_separator=',')
+        self.assertEqual(self.parse(bank_format, '2020-01-05,x,GROCER,"€1.050,25",\n2020-01-06,x,SALARY,,"3.000,00"\n'), [
+            {'date': '2020-01-05', 'description': 'GROCER', 'amount': Decimal('-1050.25'), 'balance': None},
+            {'date': '2020-01-06', 'description': 'SALARY', 'amount': Decimal('3000.00'), 'balance': None},
+        ])
+        card = BankFormat('card', 'Card', {'description': 0, 'date': 2, 'amount': 1}, negate_amounts=True)
+        self.assertEqual(self.parse(card, 'GROCER,25.00,05/01/2020\nSHORT ROW\n'), [
+            {'date': '2020-01-05', 'description': 'GROCER', 'amount': Decimal('-25.00'), 'balance': None},
+            {'date': '', 'description': 'SHORT ROW', 'amount': None, 'balance': None},
+        ])
+
+    def test_defined_formats_keep_builtin_positions(self):
+        registry = load_bank_formats({
+            'delta_bank_savings': {'columns': ['date', 'description', 'amount']},
+            'alpha_bank_debit': 'Alpha Bank Debit',
+            'beta_bank_credit': 'Beta Bank Credit',
+        })
+        self.assertEqual(registry['alpha_bank_debit'].columns, get_bank_format('alpha_bank_debit').columns)
+        self.assertEqual(registry['beta_bank_credit'].columns, get_bank_format('beta_bank_credit').columns)
+
+    def test_unparsable_values_pass_through(self):
+        rows = self.parse(get_bank_format('alpha_bank_debit'), '2020-01-05,lots,GROCER,\n')
+        self.assertEqual(rows, [{'date': '2020-01-05', 'description': 'GROCER', 'amount': 'lots', 'balance': None}])
+
+    def test_invalid_definitions(self):
+        for definitions in (
+            {'delta': {'columns': ['date', 'description', 'amount', 'fee']}},
+            {'delta': {'columns': ['date', 'amount']}},
+            {'delta': {'columns': ['date', 'description', 'debit']}},
+            {'delta': {'columns': ['date', 'description', 'amount'], 'separator': ';'}},
+            {'a': 'A', 'b': 'B', 'c': 'C', 'd': 'D'},
+        ):
+            with self.subTest(definitions):
+                with self.assertRaises(ImproperlyConfigured):
+                    load_bank_formats(definitions)
+
+    def test_registry_follows_settings(self):
+        with override_settings(BANK_FORMATS={'delta': {'name': 'Delta', 'columns': ['date', 'description', 'amount']}}):
+            self.assertEqual(bank_format_names(), {'delta': 'Delta'})
+            self.assertEqual(get_bank_format('delta').skip_rows, 0)
+        self.assertIn('alpha_bank_debit', bank_format_names())
+
+class QueryInstrumentationTests(TestCase):
+    """
+    Checks which requests the instrumentation middleware samples, and which it reports as slow.
+    """
+    URL = '/api/account-names/'
+
+    def setUp(self):
+        clear_query_stats()
+        self.addCleanup(clear_query_stats)
+
+    def middleware(self):
+        def get_response(request):
+            # The same statement twice, like a query run per row
+            AccountName.objects.count()
+            AccountName.objects.count()
+            return None
+        return QueryInstrumentationMiddleware(get_response)
+
+    def request(self, middleware):
+        request = RequestFactory().get(self.URL)
+        request.resolver_match = resolve(self.URL)
+        return middleware(request)
+
+    def view_stats(self):
+        return {stats['view']: stats for stats in query_stats()['views']}
+
+    @override_settings(QUERY_INSTRUMENTATION_SAMPLE_RATE=0)
+    def test_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            self.middleware()
+
+    @override_settings(QUERY_INSTRUMENTATION_SAMPLE_RATE=0.25, SLOW_REQUEST_MS=60000)
+    def test_sampling(self):
+        middleware = self.middleware()
+        with mock.patch('budget.instrumentation.random.random', side_effect=[0.1, 0.9, 0.2499, 0.25]):
+            for _ in range(4):
+                self.request(middleware)
+        [stats] = self.view_stats().values()
+        self.assertTrue(stats['view'].startswith('GET /') and 'account-names' in stats['view'], stats['view'])
+        self.assertEqual((stats['requests'], stats['slow_requests'], stats['queries'], stats['max_queries'], stats['avg_queries']),
+                         (2, 0, 4, 2, 2))
+
+    @override_settings(QUERY_INSTRUMENTATION_SAMPLE_RATE=1, SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged(self):
+        with self.assertLogs('budget.instrumentation', 'WARNING') as logs:
+            self.request(self.middleware())
+        self.assertIn('2 queries', logs.output[0])
+        self.assertIn("'count': 2", logs.output[0])
+        [stats] = self.view_stats().values()
+        self.assertEqual((stats['requests'], stats['slow_requests']), (1, 1))
+
+    @override_settings(QUERY_INSTRUMENTATION_SAMPLE_RATE=1, SLOW_REQUEST_MS=60000, DEBUG=True)
+    def test_query_stats_endpoint(self):
+        with self.assertNoLogs('budget.instrumentation', 'WARNING'):
+            self.client.get(self.URL)
+        stats = self.client.get('/api/debug/query-stats/').data
+        self.assertEqual(stats['sample_rate'], 1)
+        [account_names] = [view for view in stats['views'] if 'account-names' in view['view']]
+        self.assertEqual((account_names['requests'], account_names['slow_requests']), (1, 0))
+        self.assertEqual(self.client.delete('/api/debug/query-stats/').status_code, 204)
+        self.assertEqual([view['view'] for view in query_stats()['views']], ['DELETE /api/debug/query-stats/'])
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import transaction_views, import_views, review_views, utility_views
+from .views import transaction_views, import_views, review_views, utility_views, budget_views
 
 router = DefaultRouter()
 router.register(r'account-names', transaction_views.AccountNameViewSet, basename='account-name')
@@ -10,6 +10,7 @@ router.register(r'budget-groups', transaction_views.BudgetGroupViewSet, basename
 router.register(r'budget-initializations', transaction_views.BudgetInitializationViewSet, basename='budget-initialization')
 router.register(r'budget-adjustments', transaction_views.BudgetAdjustmentViewSet, basename='budget-adjustment')
 router.register(r'transactions', transaction_views.TransactionViewSet, basename='transaction')
+router.register(r'import-jobs', import_views.ImportJobViewSet, basename='import-job')
 
 urlpatterns = [
     path('api/', include(router.urls)),
@@ -17,6 +18,12 @@ urlpatterns = [
     path('api/import-transaction-patterns/', import_views.import_transaction_patterns, name='import-transaction-patterns'),
     path('api/transactions/<int:transaction_id>/modify/', review_views.modify_transaction, name='modify-transaction'),
     path('api/bank-formats/', utility_views.get_bank_formats, name='bank-formats'),
+    path('api/bootstrap/', utility_views.get_bootstrap, name='bootstrap'),
+    path('api/categorization-stats/', utility_views.get_categorization_stats, name='categorization-stats'),
+    path('api/debug/query-stats/', utility_views.get_query_stats, name='query-stats'),
     path('api/paginated-transactions/', utility_views.get_paginated_transactions, name='paginated-transactions'),
+    path('api/export-transactions/', utility_views.export_transactions, name='export-transactions'),
+    path('api/budget-balances/', budget_views.get_budget_balances, name='budget-balances'),
+    path('api/period-report/', budget_views.get_period_report, name='period-report'),
     path('api/create-adjustment-transaction/', transaction_views.create_adjustment_transaction, name='create-adjustment-transaction'),
 ]
\ No newline at end of file
@@ -1,55 +1,35 @@
-import re
-from decimal import Decimal
-from datetime import datetime
-from django.conf import settings
-from .models import TransactionPattern, Transaction
+from .categorization import get_categorizer
+from .bank_formats import get_bank_format
 import fnmatch
 
 def categorize_transaction(description, account_name, amount):
-    patterns = TransactionPattern.objects.filter(account_name=account_name)
-    for pattern in patterns:
-        if re.search(pattern.regex_pattern, description, re.IGNORECASE):
-            transaction_type = pattern.transaction_type
-            budget_group = transaction_type.default_budget_group
-            if transaction_type.amount_threshold and amount >= transaction_type.amount_threshold:
-                budget_group = transaction_type.threshold_budget_group
-            
-            return transaction_type, budget_group, pattern.comments
-    return None, None, None
+    return get_categorizer(account_name).categorize(description, amount)
 
-def parse_transaction_data(reader, import_format):
-    bank_formats = list(settings.BANK_FORMATS.keys())
-    transaction_data = []
-
-    if import_format == bank_formats[2]:
-        next(reader)  # Skip the first row
-        next(reader)  # Skip the second row
-
-    for row in reader:
-        if import_format in [bank_formats[0], bank_formats[1]]:
-            transaction_date = datetime.strptime(row[0], '%d/%m/%Y').strftime('%Y-%m-%d')
-            amount = row[1].replace('$', '').replace(',', '')
-            description = row[2]
-            balance = row[3].replace('$', '').replace(',', '') if import_format == bank_formats[0] else None
-        elif import_format == bank_formats[2]:
-            transaction_date = datetime.strptime(row[0], '%d/%m/%Y').strftime('%Y-%m-%d')
-            description = row[1]
-            amount = row[2].replace('$', '').replace(',', '')
-            balance = row[3].replace('$', '').replace(',', '')
-        else:
-            raise ValueError(f"Unsupported import format: {import_format}")
-        
-        transaction_data.append({
-            'date': transaction_date,
-            'description': description,
-            'amount': amount,
-            'balance': balance,
-        })
+def chunked(iterable, size):
+    """
+    Yield successive lists of at most `size` items from any iterable.
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
-    return transaction_data
+def parse_transaction_data(reader, import_format):
+    """
+    Yield a transaction dict for each row of a bank export, reading the rows lazily.
+    """
+    return get_bank_format(import_format).parse(reader)
 
 def detect_duplicates(transaction_data):
-    unique_transactions = []
+    """
+    Yield the transactions, suffixing repeated ones with a counter so they stay unique.
+
+    Only the keys seen so far are kept in memory, not the transactions themselves.
+    """
     transaction_counts = {}
 
     for transaction in transaction_data:
@@ -67,12 +47,10 @@ def detect_duplicates(transaction_data):
             if transaction_counts[transaction_key] > 1:
                 new_transaction = transaction.copy()
                 new_transaction['description'] += f" ({transaction_counts[transaction_key]})"
-                unique_transactions.append(new_transaction)
+                yield new_transaction
         else:
             transaction_counts[transaction_key] = 1
-            unique_transactions.append(transaction)
-
-    return unique_transactions
+            yield transaction
 
 def parse_gitignore(gitignore_path):
     ignore_patterns = []
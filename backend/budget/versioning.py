@@ -0,0 +1,48 @@
+from django.db.models import F
+from django.utils import timezone
+from .models import DataVersion
+
+# Names of the tracked data sets. Each one is bumped whenever its underlying
+# rows change so in-process caches can tell when they are stale.
+PATTERNS = 'patterns'
+TRANSACTIONS = 'transactions'
+ACCOUNT_NAMES = 'account_names'
+TRANSACTION_TYPES = 'transaction_types'
+BUDGET_GROUPS = 'budget_groups'
+
+# Rarely changing lists the client loads up front, served with validators
+REFERENCE_DATA = (ACCOUNT_NAMES, TRANSACTION_TYPES, BUDGET_GROUPS)
+
+ALL_VERSIONS = (PATTERNS, TRANSACTIONS, *REFERENCE_DATA)
+
+def get_version(name):
+    """
+    Return the current version number of a tracked data set (0 if never bumped).
+    """
+    version = DataVersion.objects.filter(name=name).values_list('version', flat=True).first()
+    return version or 0
+
+def get_versions(*names):
+    """
+    Return {name: (version, updated_at)} for several tracked data sets in one query.
+
+    Data sets never bumped are reported as (0, None).
+    """
+    rows = DataVersion.objects.filter(name__in=names).values_list('name', 'version', 'updated_at')
+    versions = {name: (0, None) for name in names}
+    versions.update((name, (version, updated_at)) for name, version, updated_at in rows)
+    return versions
+
+def bump_version(*names):
+    """
+    Increment the version of one or more tracked data sets.
+
+    Call this after any write that bypasses model signals (queryset.update,
+    bulk_create, bulk_update) so cached data derived from those rows is rebuilt.
+    """
+    for name in names:
+        updated = DataVersion.objects.filter(name=name).update(version=F('version') + 1, updated_at=timezone.now())
+        if not updated:
+            data_version, created = DataVersion.objects.get_or_create(name=name, defaults={'version': 1})
+            if not created:
+                DataVersion.objects.filter(pk=data_version.pk).update(version=F('version') + 1, updated_at=timezone.now())
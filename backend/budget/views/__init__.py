@@ -2,4 +2,5 @@
 from .transaction_views import *
 from .import_views import *
 from .review_views import *
-from .utility_views import *
\ No newline at end of file
+from .utility_views import *
+from .budget_views import *
\ No newline at end of file
@@ -0,0 +1,159 @@
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from rest_framework import status
+from datetime import datetime
+from ..filters import filter_transactions
+from ..ledger import budget_balances
+from ..models import Transaction
+from ..reports import PERIODS, REPORT_GROUPS, period_totals
+from drf_yasg.utils import swagger_auto_schema
+from drf_yasg import openapi
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="Get the balance of every budget group as of a date",
+    manual_parameters=[
+        openapi.Parameter('as_of', openapi.IN_QUERY, description="Date of the balances, inclusive (YYYY-MM-DD, default: today)", type=openapi.TYPE_STRING),
+    ],
+    responses={
+        200: openapi.Response(
+            description="Successful response",
+            schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'as_of': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
+                    'balances': openapi.Schema(
+                        type=openapi.TYPE_ARRAY,
+                        items=openapi.Schema(
+                            type=openapi.TYPE_OBJECT,
+                            properties={
+                                'budget_group': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                'budget_group_name': openapi.Schema(type=openapi.TYPE_STRING),
+                                'initialized': openapi.Schema(type=openapi.TYPE_NUMBER),
+                                'adjusted_in': openapi.Schema(type=openapi.TYPE_NUMBER),
+                                'adjusted_out': openapi.Schema(type=openapi.TYPE_NUMBER),
+                                'transactions_total': openapi.Schema(type=openapi.TYPE_NUMBER),
+                                'balance': openapi.Schema(type=openapi.TYPE_NUMBER),
+                            }
+                        )
+                    ),
+                }
+            )
+        ),
+        400: "Invalid date"
+    }
+)
+@api_view(['GET'])
+def get_budget_balances(request):
+    """
+    Retrieve the balance of every budget group at the end of a given date.
+
+    A balance is the group's initializations plus adjustments into it, minus
+    adjustments out of it, plus the amounts of the transactions assigned to it.
+    Whole months are read from the monthly budget summaries, so the cost does
+    not grow with the number of transactions.
+
+    Query Parameters:
+    - as_of: Date of the balances, inclusive (format: YYYY-MM-DD, default: today)
+
+    Returns:
+    - 200 OK with the date and the balances of all budget groups
+    - 400 Bad Request if the date is invalid
+    """
+    as_of = request.GET.get('as_of')
+    if as_of:
+        try:
+            as_of = datetime.strptime(as_of, '%Y-%m-%d').date()
+        except ValueError:
+            return Response({'error': 'Invalid date, expected YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+    else:
+        as_of = datetime.now().date()
+
+    return Response({'as_of': as_of, 'balances': budget_balances(as_of)})
+
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="Get transaction inflow and outflow totals per period, by transaction type, budget group or account",
+    manual_parameters=[
+        openapi.Parameter('group_by', openapi.IN_QUERY, description="Series to report: transaction_type, budget_group or account (default: budget_group)", type=openapi.TYPE_STRING),
+        openapi.Parameter('period', openapi.IN_QUERY, description="Period length: week, fortnight, month or year (default: month)", type=openapi.TYPE_STRING),
+        openapi.Parameter('dateFrom', openapi.IN_QUERY, description="Start date for filtering (YYYY-MM-DD)", type=openapi.TYPE_STRING),
+        openapi.Parameter('dateTo', openapi.IN_QUERY, description="End date for filtering (YYYY-MM-DD)", type=openapi.TYPE_STRING),
+        openapi.Parameter('account', openapi.IN_QUERY, description="Filter by account ID", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('type', openapi.IN_QUERY, description="Filter by transaction type ID", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('budget', openapi.IN_QUERY, description="Filter by budget group ID", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('review_status', openapi.IN_QUERY, description="Filter by review status", type=openapi.TYPE_STRING),
+    ],
+    responses={
+        200: openapi.Response(
+            description="Successful response",
+            schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'period': openapi.Schema(type=openapi.TYPE_STRING),
+                    'group_by': openapi.Schema(type=openapi.TYPE_STRING),
+                    'periods': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE)),
+                    'series': openapi.Schema(
+                        type=openapi.TYPE_ARRAY,
+                        items=openapi.Schema(
+                            type=openapi.TYPE_OBJECT,
+                            properties={
+                                'id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                'name': openapi.Schema(type=openapi.TYPE_STRING),
+                                'inflow': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_NUMBER)),
+                                'outflow': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_NUMBER)),
+                                'net': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_NUMBER)),
+                                'count': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)),
+                                'total_inflow': openapi.Schema(type=openapi.TYPE_NUMBER),
+                                'total_outflow': openapi.Schema(type=openapi.TYPE_NUMBER),
+                                'total_net': openapi.Schema(type=openapi.TYPE_NUMBER),
+                            }
+                        )
+                    ),
+                    'totals': openapi.Schema(type=openapi.TYPE_OBJECT, description="Inflow, outflow, net and count of all series per period"),
+                }
+            )
+        ),
+        400: "Invalid parameters"
+    }
+)
+@api_view(['GET'])
+def get_period_report(request):
+    """
+    Retrieve transaction totals per period for every transaction type, budget group or account.
+
+    All series are computed in a single grouped query and returned as a dense
+    matrix: `periods` lists the start date of every period in the range and
+    each series has one inflow, outflow, net and count value per period (zero
+    when empty). Inflow sums positive amounts and outflow negative ones.
+    Transactions without a type or budget group form an 'Unassigned' series.
+
+    Query Parameters:
+    - group_by: transaction_type, budget_group or account (default: budget_group)
+    - period: week, fortnight, month or year (default: month)
+    - dateFrom / dateTo: Date range (format: YYYY-MM-DD); without them the range
+      runs from the first to the last matching transaction
+    - account, type, budget, review_status: Same filters as the transaction list
+
+    Returns:
+    - 200 OK with the periods, the series and the totals of all series
+    - 400 Bad Request if group_by, period or a date is invalid
+    """
+    group_by = request.GET.get('group_by', 'budget_group')
+    period = request.GET.get('period', 'month')
+    if group_by not in REPORT_GROUPS:
+        return Response({'error': f"Invalid group_by, expected one of {', '.join(REPORT_GROUPS)}"}, status=status.HTTP_400_BAD_REQUEST)
+    if period not in PERIODS:
+        return Response({'error': f"Invalid period, expected one of {', '.join(PERIODS)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        transactions = filter_transactions(Transaction.objects.all(), request.GET)
+        date_from = request.GET.get('dateFrom')
+        date_to = request.GET.get('dateTo')
+        date_from = datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else None
+        date_to = datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else None
+    except ValueError:
+        return Response({'error': 'Invalid date, expected YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(period_totals(transactions, group_by, period, date_from, date_to))
@@ -1,18 +1,20 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from rest_framework import status
-from django.db.models import Q
+from rest_framework import status, viewsets
 from django.conf import settings
-from decimal import Decimal
-from datetime import datetime
 import csv
 import io
-from ..models import Transaction, AccountName, TransactionPattern, TransactionType, BudgetGroup
-from ..serializers import TransactionSerializer
-from ..utils import categorize_transaction, parse_transaction_data, detect_duplicates
+import logging
+from ..models import AccountName, ImportJob
+from ..serializers import ImportJobSerializer
+from ..utils import parse_transaction_data, detect_duplicates
+from ..importer import TransactionImporter, import_patterns, PATTERN_COLUMNS
+from ..jobs import fail_stale_jobs, queue_import_job
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
+logger = logging.getLogger(__name__)
+
 @swagger_auto_schema(
     method='post',
     operation_description="Import transactions from a CSV file",
@@ -23,12 +25,15 @@ from drf_yasg import openapi
             'import_format': openapi.Schema(type=openapi.TYPE_STRING, enum=list(settings.BANK_FORMATS.keys())),
             'account_name': openapi.Schema(type=openapi.TYPE_INTEGER),
             'new_account_name': openapi.Schema(type=openapi.TYPE_STRING),
+            'background': openapi.Schema(type=openapi.TYPE_BOOLEAN, description="Queue the import as a background job"),
         },
         required=['file', 'import_format']
     ),
     responses={
         201: openapi.Response(description="Transactions imported successfully"),
-        400: openapi.Response(description="Bad request")
+        202: openapi.Response(description="Import job queued; poll /api/import-jobs/{job_id}/ for progress"),
+        400: openapi.Response(description="Bad request, or row validation errors (nothing is saved)"),
+        500: openapi.Response(description="The upload of a background import could not be stored")
     }
 )
 @api_view(['POST'])
@@ -38,11 +43,18 @@ def import_transactions(request):
     
     This view handles the import of transactions from a CSV file. It supports various bank formats
     and can either use an existing account name or create a new one.
+
+    Rows already stored for the account are skipped. The import is all-or-nothing: if any
+    row fails validation, nothing is saved and every row error is returned.
+
+    With background=true the file is queued as an ImportJob and the job id is returned
+    immediately; progress is available from the import-jobs endpoint.
     """
     file = request.FILES.get('file')
     import_format = request.data.get('import_format')
     account_name_id = request.data.get('account_name')
     new_account_name = request.data.get('new_account_name')
+    background = str(request.data.get('background', '')).lower() in ('true', '1')
 
     if not file:
         return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
@@ -60,43 +72,48 @@ def import_transactions(request):
     else:
         return Response({'error': 'Account name not provided'}, status=status.HTTP_400_BAD_REQUEST)
 
-    csv_file = io.StringIO(file.read().decode('utf-8-sig'))
+    if background:
+        try:
+            job = queue_import_job(file, account_name, import_format)
+        except OSError:
+            logger.exception('Could not store the upload of an import job')
+            return Response({'error': 'The uploaded file could not be stored'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response({'job_id': job.id, 'status': job.status}, status=status.HTTP_202_ACCEPTED)
+
+    # Decode the upload incrementally instead of reading it into memory
+    csv_file = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
     reader = csv.reader(csv_file)
 
     transaction_data = parse_transaction_data(reader, import_format)
     unique_transactions = detect_duplicates(transaction_data)
 
-    for transaction in unique_transactions:
-        duplicate_exists = Transaction.objects.filter(
-            Q(date=transaction['date']) &
-            Q(description=transaction['description']) &
-            Q(amount=transaction['amount']) &
-            Q(account_name_id=account_name.id) &
-            Q(balance=transaction['balance'])
-        ).exists()
-
-        if not duplicate_exists:
-            transaction_type, budget_group, pattern_comments = categorize_transaction(transaction['description'], account_name, Decimal(transaction['amount']))
-            transaction_assignment_type = 'auto_unchecked' if transaction_type else 'unassigned'
-            budget_group_assignment_type = 'auto_unchecked' if budget_group else 'unassigned'
-            
-            serializer = TransactionSerializer(data={
-                **transaction,
-                'source': import_format,
-                'account_name': account_name.id,
-                'transaction_type': transaction_type.id if transaction_type else None,
-                'budget_group': budget_group.id if budget_group else None,
-                'transaction_assignment_type': transaction_assignment_type,
-                'budget_group_assignment_type': budget_group_assignment_type,
-                'comments': pattern_comments
-            })
-            
-            if serializer.is_valid():
-                serializer.save()
-            else:
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-    return Response({'message': 'Transactions imported successfully'}, status=status.HTTP_201_CREATED)
+    importer = TransactionImporter(account_name, import_format)
+    if not importer.run(unique_transactions):
+        return Response({
+            'error': 'Some rows could not be imported, no transactions were saved',
+            'error_count': importer.error_count,
+            'row_errors': importer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'message': 'Transactions imported successfully',
+        'imported': importer.created,
+        'duplicates': importer.duplicates
+    }, status=status.HTTP_201_CREATED)
+
+class ImportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint that reports the status and progress of background import jobs.
+
+    Queued or running jobs that stopped progressing, e.g. after a server
+    restart, are reported as failed.
+    """
+    queryset = ImportJob.objects.all().order_by('-created_at')
+    serializer_class = ImportJobSerializer
+
+    def get_queryset(self):
+        fail_stale_jobs()
+        return super().get_queryset()
 
 @swagger_auto_schema(
     method='post',
@@ -120,7 +137,8 @@ def import_transaction_patterns(request):
     Import transaction patterns from a CSV file.
     
     This view handles the import of transaction patterns from a CSV file. It associates
-    the patterns with a specific account name.
+    the patterns with a specific account name. Every row is validated first; if any
+    pattern is invalid, nothing is imported and the row errors are returned.
     """
     file = request.FILES.get('file')
     account_name_id = request.data.get('account_name')
@@ -138,21 +156,19 @@ def import_transaction_patterns(request):
 
     csv_file = io.StringIO(file.read().decode('utf-8-sig'))
     reader = csv.DictReader(csv_file)
-
-    for row in reader:
-        regex_pattern = row['Pattern']
-        transaction_type_name = row['Category']
-        comments = row['Comments']
-        
-        transaction_type, _ = TransactionType.objects.get_or_create(name=transaction_type_name)
-
-        transaction_pattern, created = TransactionPattern.objects.update_or_create(
-            regex_pattern=regex_pattern,
-            account_name=account_name,
-            defaults={
-                'transaction_type': transaction_type,
-                'comments': comments
-            }
-        )
-
-    return Response({'message': 'Transaction patterns imported successfully'}, status=status.HTTP_201_CREATED)
\ No newline at end of file
+    missing_columns = [column for column in PATTERN_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing_columns:
+        return Response({'error': f"Missing columns: {', '.join(missing_columns)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    result, row_errors = import_patterns(reader, account_name)
+    if row_errors:
+        return Response({
+            'error': 'Some rows are invalid, no transaction patterns were saved',
+            'error_count': len(row_errors),
+            'row_errors': row_errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'message': 'Transaction patterns imported successfully',
+        **result
+    }, status=status.HTTP_201_CREATED)
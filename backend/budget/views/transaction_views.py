@@ -2,23 +2,40 @@ from rest_framework.decorators import api_view
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q
+from django.core.paginator import Paginator
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.db import transaction as db_transaction
+from django.db.models import Case, Q, TextField, Value, When
 from ..models import Transaction, AccountName, TransactionType, TransactionPattern, BudgetGroup, BudgetInitialization, BudgetAdjustment
-from ..serializers import TransactionSerializer, AccountNameSerializer, TransactionTypeSerializer, TransactionPatternSerializer, BudgetGroupSerializer, BudgetInitializationSerializer, BudgetAdjustmentSerializer
-from ..utils import categorize_transaction
+from ..serializers import TransactionSerializer, AccountNameSerializer, TransactionTypeSerializer, TransactionPatternSerializer, BudgetGroupSerializer, BudgetInitializationSerializer, BudgetAdjustmentSerializer, serialize_values
+from ..preview import CHANGE_FIELDS, DEFAULT_SAMPLE_SIZE, PreviewError, preview_pattern_changes
+from ..recategorization import recategorize_transactions
+from ..versioning import bump_version, TRANSACTIONS, ACCOUNT_NAMES, TRANSACTION_TYPES, BUDGET_GROUPS
+from ..conditional import versioned
+from ..filters import filter_transactions
+from ..pagination import TransactionPagination
+from ..exports import stream_json
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
+@method_decorator(versioned(ACCOUNT_NAMES), name='list')
 class AccountNameViewSet(viewsets.ModelViewSet):
     """
     API endpoint that allows account names to be viewed or edited.
+
+    The list is served with an ETag and Last-Modified, and answers 304 when unchanged.
     """
     queryset = AccountName.objects.all()
     serializer_class = AccountNameSerializer
 
+@method_decorator(versioned(TRANSACTION_TYPES), name='list')
 class TransactionTypeViewSet(viewsets.ModelViewSet):
     """
     API endpoint that allows transaction types to be viewed or edited.
+
+    The list is served with an ETag and Last-Modified, and answers 304 when unchanged.
     """
     queryset = TransactionType.objects.all()
     serializer_class = TransactionTypeSerializer
@@ -30,9 +47,69 @@ class TransactionPatternViewSet(viewsets.ModelViewSet):
     queryset = TransactionPattern.objects.all()
     serializer_class = TransactionPatternSerializer
 
+    @swagger_auto_schema(
+        operation_description="Preview which transactions pattern changes would reclassify, without changing any data",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'account_name': openapi.Schema(type=openapi.TYPE_INTEGER, description="ID of the account whose patterns change"),
+                'regex_pattern': openapi.Schema(type=openapi.TYPE_STRING, description="Candidate pattern (when previewing a single pattern)"),
+                'transaction_type': openapi.Schema(type=openapi.TYPE_INTEGER, description="Transaction type of the candidate pattern"),
+                'comments': openapi.Schema(type=openapi.TYPE_STRING, description="Comments of the candidate pattern"),
+                'priority': openapi.Schema(type=openapi.TYPE_INTEGER, description="Priority of the candidate pattern"),
+                'global': openapi.Schema(type=openapi.TYPE_BOOLEAN, description="Whether the candidate applies to every account"),
+                'id': openapi.Schema(type=openapi.TYPE_INTEGER, description="Existing pattern the candidate replaces"),
+                'changes': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    description="Several pattern changes previewed together, each like a single candidate, or {id, delete: true}",
+                    items=openapi.Schema(type=openapi.TYPE_OBJECT)
+                ),
+                'sample_size': openapi.Schema(type=openapi.TYPE_INTEGER, description="Sample descriptions per pattern (default: 10)"),
+            },
+            required=['account_name']
+        ),
+        responses={200: openapi.Response(description="Preview of the pattern changes"), 400: "Invalid pattern changes", 404: "Account not found"}
+    )
+    @action(detail=False, methods=['post'])
+    def preview(self, request):
+        """
+        Preview the effect of adding, editing or deleting patterns of an account.
+
+        The changes are evaluated against the distinct descriptions of the
+        account's transactions with first-match ordering. For each added or
+        edited pattern, the response gives the transactions it matches, how many
+        it would categorize, sample descriptions, the earlier patterns that
+        shadow it and the patterns it takes transactions from. It also lists the
+        transactions whose categorization would change, and how many of them
+        redo_categorization would update.
+        """
+        try:
+            account_name = int(request.data.get('account_name'))
+            sample_size = int(request.data.get('sample_size', DEFAULT_SAMPLE_SIZE))
+        except (TypeError, ValueError):
+            return Response({'error': 'account_name and sample_size must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not AccountName.objects.filter(pk=account_name).exists():
+            return Response({'error': f"Account {account_name} does not exist"}, status=status.HTTP_404_NOT_FOUND)
+
+        changes = request.data.get('changes')
+        if changes is None:
+            changes = [{key: request.data[key] for key in CHANGE_FIELDS if key in request.data}]
+        if not isinstance(changes, list) or not all(isinstance(change, dict) for change in changes):
+            return Response({'error': 'changes must be a list of pattern changes'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            preview = preview_pattern_changes(account_name, changes, sample_size)
+        except PreviewError as e:
+            return Response({'error': str(e), 'errors': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(preview)
+
+@method_decorator(versioned(BUDGET_GROUPS), name='list')
 class BudgetGroupViewSet(viewsets.ModelViewSet):
     """
     API endpoint that allows budget groups to be viewed or edited.
+
+    The list is served with an ETag and Last-Modified, and answers 304 when unchanged.
     """
     queryset = BudgetGroup.objects.all()
     serializer_class = BudgetGroupSerializer
@@ -51,25 +128,62 @@ class BudgetAdjustmentViewSet(viewsets.ModelViewSet):
     queryset = BudgetAdjustment.objects.all()
     serializer_class = BudgetAdjustmentSerializer
 
+TRANSACTION_LIST_PARAMETERS = [
+    openapi.Parameter('page', openapi.IN_QUERY, description="Page number", type=openapi.TYPE_INTEGER),
+    openapi.Parameter('per_page', openapi.IN_QUERY, description="Number of items per page", type=openapi.TYPE_INTEGER),
+    openapi.Parameter('dateFrom', openapi.IN_QUERY, description="Start date (YYYY-MM-DD)", type=openapi.TYPE_STRING),
+    openapi.Parameter('dateTo', openapi.IN_QUERY, description="End date (YYYY-MM-DD)", type=openapi.TYPE_STRING),
+    openapi.Parameter('description', openapi.IN_QUERY, description="Every word matched in the description", type=openapi.TYPE_STRING),
+    openapi.Parameter('search_comments', openapi.IN_QUERY, description="Also match the description words in the comments", type=openapi.TYPE_BOOLEAN),
+    openapi.Parameter('type', openapi.IN_QUERY, description="Transaction type ID", type=openapi.TYPE_INTEGER),
+    openapi.Parameter('budget', openapi.IN_QUERY, description="Budget group ID", type=openapi.TYPE_INTEGER),
+    openapi.Parameter('account', openapi.IN_QUERY, description="Account ID", type=openapi.TYPE_INTEGER),
+    openapi.Parameter('review_status', openapi.IN_QUERY, description="Review status", type=openapi.TYPE_STRING),
+    openapi.Parameter('export', openapi.IN_QUERY, description="Stream every matching transaction as a JSON array instead of a page", type=openapi.TYPE_BOOLEAN),
+]
+
 class TransactionViewSet(viewsets.ModelViewSet):
     """
     API endpoint that allows transactions to be viewed or edited.
+
+    Listings are paginated (page, per_page) and accept the filters of
+    paginated-transactions. export=true streams every matching transaction
+    instead of a page.
     """
-    queryset = Transaction.objects.all().order_by('date')
+    queryset = Transaction.objects.all().order_by('date', 'id')
     serializer_class = TransactionSerializer
+    pagination_class = TransactionPagination
+
+    def listing_response(self, queryset):
+        """
+        Return a page of the filtered transactions or, in export mode, all of them streamed.
+        """
+        try:
+            queryset = filter_transactions(queryset, self.request.query_params)
+        except ValueError:
+            return Response({'error': 'Invalid date, expected YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        if self.request.query_params.get('export', '').lower() == 'true':
+            return StreamingHttpResponse(stream_json(queryset), content_type='application/json')
+        return self.get_paginated_response(serialize_values(self.paginate_queryset(queryset)))
+
+    @swagger_auto_schema(manual_parameters=TRANSACTION_LIST_PARAMETERS)
+    def list(self, request, *args, **kwargs):
+        """
+        List transactions, serialized through the read-only fast path.
+        """
+        return self.listing_response(self.get_queryset())
 
     @swagger_auto_schema(
         operation_description="List transactions pending review",
+        manual_parameters=TRANSACTION_LIST_PARAMETERS,
         responses={200: TransactionSerializer(many=True)}
     )
     @action(detail=False, methods=['get'])
     def pending_review(self, request):
         """
-        Retrieve a list of transactions pending review.
+        Retrieve a page of the transactions pending review.
         """
-        pending_transactions = self.queryset.filter(review_status='pending').order_by('date')
-        serializer = self.get_serializer(pending_transactions, many=True)
-        return Response(serializer.data)
+        return self.listing_response(self.get_queryset().filter(review_status='pending'))
 
     @swagger_auto_schema(
         operation_description="Confirm multiple transactions",
@@ -81,52 +195,133 @@ class TransactionViewSet(viewsets.ModelViewSet):
             },
             required=['transaction_ids']
         ),
-        responses={200: openapi.Response(description="Transactions confirmed successfully")}
+        responses={
+            200: openapi.Response(
+                description="Transactions confirmed successfully",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'message': openapi.Schema(type=openapi.TYPE_STRING),
+                        'confirmed': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'not_found': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'not_found_ids': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)),
+                    }
+                )
+            ),
+            400: "Invalid transaction ids or comments"
+        }
     )
     @action(detail=False, methods=['post'])
     def bulk_confirm(self, request):
         """
         Confirm multiple transactions in bulk.
+
+        The status fields and the comments (from comments_map, empty for ids
+        without an entry) of all transactions are set with a single UPDATE.
+        Ids that don't exist are reported back.
         """
         transaction_ids = request.data.get('transaction_ids', [])
         comments_map = request.data.get('comments_map', {})
+        # A string would be read one character at a time
+        try:
+            if not isinstance(transaction_ids, list):
+                raise TypeError
+            transaction_ids = {int(transaction_id) for transaction_id in transaction_ids}
+        except (TypeError, ValueError):
+            return Response({'error': 'transaction_ids must be a list of integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(comments_map, dict) or not all(isinstance(comment, str) for comment in comments_map.values()):
+            return Response({'error': 'comments_map must map transaction ids to strings'}, status=status.HTTP_400_BAD_REQUEST)
 
-        transactions = Transaction.objects.filter(id__in=transaction_ids)
-        for transaction in transactions:
-            transaction.review_status = 'confirmed'
-            transaction.transaction_assignment_type = 'auto_checked'
-            transaction.budget_group_assignment_type = 'auto_checked'
-            transaction.comments = comments_map.get(str(transaction.id), "")
-            transaction.save()
+        with db_transaction.atomic():
+            transactions = Transaction.objects.filter(id__in=transaction_ids)
+            found_ids = set(transactions.values_list('id', flat=True))
+            comments = Case(
+                *[When(id=transaction_id, then=Value(comments_map[str(transaction_id)]))
+                  for transaction_id in found_ids if comments_map.get(str(transaction_id))],
+                default=Value(''),
+                output_field=TextField()
+            )
+            confirmed = transactions.update(
+                review_status='confirmed',
+                transaction_assignment_type='auto_checked',
+                budget_group_assignment_type='auto_checked',
+                comments=comments,
+                updated_at=timezone.now()
+            )
+            bump_version(TRANSACTIONS)
 
-        return Response({'message': 'Transactions confirmed successfully'}, status=status.HTTP_200_OK)
+        not_found_ids = sorted(transaction_ids - found_ids)
+        return Response({
+            'message': 'Transactions confirmed successfully',
+            'confirmed': confirmed,
+            'not_found': len(not_found_ids),
+            'not_found_ids': not_found_ids
+        }, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
-        operation_description="Redo categorization for uncategorized transactions",
-        responses={200: TransactionSerializer(many=True)}
+        operation_description="Redo categorization for transactions whose assignment is not confirmed",
+        manual_parameters=[
+            openapi.Parameter('detail', openapi.IN_QUERY, description="Include a page of the changed transactions", type=openapi.TYPE_BOOLEAN),
+            openapi.Parameter('page', openapi.IN_QUERY, description="Page of changed transactions (default: 1)", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('per_page', openapi.IN_QUERY, description="Changed transactions per page (default: 10)", type=openapi.TYPE_INTEGER),
+        ],
+        responses={200: openapi.Response(
+            description="Categorization summary",
+            schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'processed': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'changed': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'unchanged': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'accounts': openapi.Schema(
+                        type=openapi.TYPE_ARRAY,
+                        items=openapi.Schema(
+                            type=openapi.TYPE_OBJECT,
+                            properties={
+                                'account_id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                'account_name': openapi.Schema(type=openapi.TYPE_STRING),
+                                'changed': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                'unchanged': openapi.Schema(type=openapi.TYPE_INTEGER),
+                            }
+                        )
+                    ),
+                    'changed_transactions': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT)),
+                    'total_pages': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'current_page': openapi.Schema(type=openapi.TYPE_INTEGER),
+                }
+            )
+        ), 400: "Invalid page or per_page"}
     )
     @action(detail=False, methods=['post'])
     def redo_categorization(self, request):
         """
-        Redo categorization for uncategorized transactions.
+        Redo categorization for transactions whose assignment is not confirmed.
+
+        Returns how many transactions changed or stayed the same, in total and
+        per account. With detail=true, a page of the changed transactions is
+        included (page and per_page as for paginated-transactions).
         """
-        uncategorized_transactions = Transaction.objects.filter(
-            Q(transaction_assignment_type='auto_unchecked') | Q(transaction_assignment_type='unassigned') |
-            Q(budget_group_assignment_type='auto_unchecked') | Q(budget_group_assignment_type='unassigned')
-        )
-
-        for transaction in uncategorized_transactions:
-            transaction_type, budget_group, pattern_comments = categorize_transaction(transaction.description, transaction.account_name, transaction.amount)
-            transaction.transaction_type = transaction_type
-            transaction.budget_group = budget_group
-            transaction.transaction_assignment_type = 'auto_unchecked' if transaction_type else 'unassigned'
-            transaction.budget_group_assignment_type = 'auto_unchecked' if budget_group else 'unassigned'
-            if not transaction.comments and pattern_comments:
-                transaction.comments = pattern_comments
-            transaction.save()
-
-        serializer = self.get_serializer(uncategorized_transactions, many=True)
-        return Response(serializer.data)
+        detail = request.query_params.get('detail', '').lower() == 'true'
+        # Checked before anything is recategorized
+        try:
+            page_number = int(request.query_params.get('page', 1))
+            per_page = int(request.query_params.get('per_page', 10))
+        except ValueError:
+            page_number = per_page = 0
+        if detail and (page_number < 1 or per_page < 1):
+            return Response({'error': 'page and per_page must be positive integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        summary, changed_ids = recategorize_transactions()
+
+        if detail:
+            paginator = Paginator(changed_ids, per_page)
+            page = paginator.get_page(page_number)
+            transactions = Transaction.objects.filter(id__in=list(page)).order_by('account_name', 'id')
+            summary['changed_transactions'] = serialize_values(transactions)
+            summary['total_pages'] = paginator.num_pages
+            summary['current_page'] = page.number
+
+        return Response(summary)
 
 @swagger_auto_schema(
     method='post',
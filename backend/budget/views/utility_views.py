@@ -1,10 +1,22 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
+from rest_framework import status
 from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from datetime import datetime
+from django.http import StreamingHttpResponse
 from ..models import Transaction, AccountName, TransactionType, BudgetGroup
-from ..serializers import TransactionSerializer
+from ..filters import filter_transactions
+from ..pagination import InvalidCursor, keyset_paginate
+from ..search import annotate_relevance
+from ..categorization import categorizer_stats
+from ..instrumentation import query_stats, clear_query_stats
+from ..bank_formats import bank_format_names
+from ..conditional import versioned
+from ..page_cache import cache_transaction_pages
+from ..versioning import REFERENCE_DATA
+from ..serializers import TransactionSerializer, AccountNameSerializer, TransactionTypeSerializer, BudgetGroupSerializer, serialize_values, values_serializer
+from ..exports import EXPORT_FORMATS
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
@@ -18,17 +30,128 @@ from drf_yasg import openapi
     )}
 )
 @api_view(['GET'])
+@versioned(bank_formats=True)
 def get_bank_formats(request):
     """
     Retrieve all available bank formats.
 
-    This endpoint returns a dictionary of bank format keys and their descriptions,
+    This endpoint returns a dictionary of bank format keys and their names,
     as defined in the project settings.
 
     Returns:
     - 200 OK with a dictionary of bank formats
+    - 304 Not Modified if the client's copy (If-None-Match / If-Modified-Since) is current
     """
-    return Response(settings.BANK_FORMATS)
+    return Response(bank_format_names())
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="Get every reference list needed by the client on its initial load",
+    responses={
+        200: openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'account_names': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT)),
+                'transaction_types': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT)),
+                'budget_groups': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT)),
+                'bank_formats': openapi.Schema(type=openapi.TYPE_OBJECT, additional_properties=openapi.Schema(type=openapi.TYPE_STRING)),
+            }
+        ),
+        304: "The client's copy is current",
+    }
+)
+@api_view(['GET'])
+@versioned(*REFERENCE_DATA, bank_formats=True)
+def get_bootstrap(request):
+    """
+    Retrieve the account names, transaction types, budget groups and bank
+    formats in one response, as returned by their own endpoints.
+
+    The response carries an ETag and Last-Modified that change whenever any of
+    the lists does, so a conditional request is answered with 304 and no data
+    until then.
+
+    Returns:
+    - 200 OK with the reference lists
+    - 304 Not Modified if the client's copy (If-None-Match / If-Modified-Since) is current
+    """
+    return Response({
+        'account_names': AccountNameSerializer(AccountName.objects.all(), many=True).data,
+        'transaction_types': TransactionTypeSerializer(TransactionType.objects.all(), many=True).data,
+        'budget_groups': BudgetGroupSerializer(BudgetGroup.objects.all(), many=True).data,
+        'bank_formats': bank_format_names(),
+    })
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="Get the hit and miss counts of the categorization match memo",
+    responses={200: openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'hits': openapi.Schema(type=openapi.TYPE_INTEGER),
+            'misses': openapi.Schema(type=openapi.TYPE_INTEGER),
+            'hit_rate': openapi.Schema(type=openapi.TYPE_NUMBER),
+            'accounts': openapi.Schema(
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'account_id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'version': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'rules': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'hits': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'misses': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'size': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'max_size': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    }
+                )
+            ),
+        }
+    )}
+)
+@api_view(['GET'])
+def get_categorization_stats(request):
+    """
+    Retrieve the effectiveness of the categorization match memo.
+
+    Imports and redo categorization memoize the pattern matched by each distinct
+    description per account. This returns the memo hits and misses of the
+    server process answering the request, in total and per account.
+
+    Returns:
+    - 200 OK with the hit and miss counts, hit rate and per-account memo sizes
+    """
+    return Response(categorizer_stats())
+
+@swagger_auto_schema(
+    methods=['get', 'delete'],
+    operation_description="Get (or, with DELETE, reset) the per-view query counts and timings of sampled requests. Only available when DEBUG is on.",
+    responses={
+        200: openapi.Response(description="Per-view request, query and timing statistics"),
+        204: openapi.Response(description="Statistics reset"),
+        404: openapi.Response(description="Not available, DEBUG is off")
+    }
+)
+@api_view(['GET', 'DELETE'])
+def get_query_stats(request):
+    """
+    Retrieve the query instrumentation statistics of the server process.
+
+    With QUERY_INSTRUMENTATION_SAMPLE_RATE above 0, a sample of requests is
+    measured. This returns, per view, the measured requests, slow requests,
+    query counts and database and total times, slowest views first.
+
+    Returns:
+    - 200 OK with the per-view statistics
+    - 204 No Content after a DELETE resets them
+    - 404 Not Found unless DEBUG is on
+    """
+    if not settings.DEBUG:
+        return Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
+    if request.method == 'DELETE':
+        clear_query_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response(query_stats())
 
 @swagger_auto_schema(
     method='get',
@@ -36,15 +159,19 @@ def get_bank_formats(request):
     manual_parameters=[
         openapi.Parameter('page', openapi.IN_QUERY, description="Page number", type=openapi.TYPE_INTEGER),
         openapi.Parameter('per_page', openapi.IN_QUERY, description="Number of items per page", type=openapi.TYPE_INTEGER),
-        openapi.Parameter('sort_by', openapi.IN_QUERY, description="Field to sort by", type=openapi.TYPE_STRING),
+        openapi.Parameter('sort_by', openapi.IN_QUERY, description="Field to sort by, or 'relevance' when searching by description", type=openapi.TYPE_STRING),
         openapi.Parameter('sort_direction', openapi.IN_QUERY, description="Sort direction (asc or desc)", type=openapi.TYPE_STRING),
         openapi.Parameter('dateFrom', openapi.IN_QUERY, description="Start date for filtering (YYYY-MM-DD)", type=openapi.TYPE_STRING),
         openapi.Parameter('dateTo', openapi.IN_QUERY, description="End date for filtering (YYYY-MM-DD)", type=openapi.TYPE_STRING),
         openapi.Parameter('description', openapi.IN_QUERY, description="Filter by description", type=openapi.TYPE_STRING),
+        openapi.Parameter('search_comments', openapi.IN_QUERY, description="Also match the description filter against comments", type=openapi.TYPE_BOOLEAN),
         openapi.Parameter('type', openapi.IN_QUERY, description="Filter by transaction type ID", type=openapi.TYPE_INTEGER),
         openapi.Parameter('budget', openapi.IN_QUERY, description="Filter by budget group ID", type=openapi.TYPE_INTEGER),
         openapi.Parameter('account', openapi.IN_QUERY, description="Filter by account ID", type=openapi.TYPE_INTEGER),
         openapi.Parameter('review_status', openapi.IN_QUERY, description="Filter by review status", type=openapi.TYPE_STRING),
+        openapi.Parameter('pagination', openapi.IN_QUERY, description="Set to 'cursor' for cursor pagination", type=openapi.TYPE_STRING),
+        openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor from a previous response (cursor pagination only)", type=openapi.TYPE_STRING),
+        openapi.Parameter('include_total', openapi.IN_QUERY, description="Include total_transactions (cursor pagination only)", type=openapi.TYPE_BOOLEAN),
     ],
     responses={200: openapi.Response(
         description="Successful response",
@@ -74,12 +201,16 @@ def get_bank_formats(request):
                 ),
                 'total_pages': openapi.Schema(type=openapi.TYPE_INTEGER),
                 'current_page': openapi.Schema(type=openapi.TYPE_INTEGER),
-                'total_transactions': openapi.Schema(type=openapi.TYPE_INTEGER)
+                'total_transactions': openapi.Schema(type=openapi.TYPE_INTEGER),
+                'next_cursor': openapi.Schema(type=openapi.TYPE_STRING, description="Cursor pagination only"),
+                'prev_cursor': openapi.Schema(type=openapi.TYPE_STRING, description="Cursor pagination only"),
+                'per_page': openapi.Schema(type=openapi.TYPE_INTEGER, description="Cursor pagination only"),
             }
         )
     )}
 )
 @api_view(['GET'])
+@cache_transaction_pages
 def get_paginated_transactions(request):
     """
     Retrieve a paginated and filtered list of transactions.
@@ -89,18 +220,35 @@ def get_paginated_transactions(request):
     Query Parameters:
     - page: Page number (default: 1)
     - per_page: Number of items per page (default: 10)
-    - sort_by: Field to sort by (default: 'date')
+    - sort_by: Field to sort by, or 'relevance' to rank description matches (default: 'date')
     - sort_direction: Sort direction, 'asc' or 'desc' (default: 'desc')
     - dateFrom: Start date for filtering (format: YYYY-MM-DD)
     - dateTo: End date for filtering (format: YYYY-MM-DD)
-    - description: Filter by description (case-insensitive partial match)
+    - description: Filter by description (every word, case-insensitive partial match)
+    - search_comments: Also match the description words against comments (default: false)
     - type: Filter by transaction type ID
     - budget: Filter by budget group ID
     - account: Filter by account ID
     - review_status: Filter by review status
+    - pagination: 'page' (default) or 'cursor'
+    - cursor: With cursor pagination, the next_cursor or prev_cursor of a previous response
+    - include_total: With cursor pagination, also count the matching transactions (default: false)
+
+    Cursor pagination walks the results by (sort field, id) instead of page
+    numbers, so deep pages are as fast as the first one and no count is run
+    unless include_total is set. Cursors are opaque and only valid for the same
+    sort_by and sort_direction. Sorting by a field that can be empty is not
+    supported in this mode.
+
+    Responses are cached (see budget.page_cache) by their normalized parameters
+    and the transaction data version, so repeated page loads skip the listing
+    queries until any transaction changes.
 
     Returns:
     - 200 OK with paginated transactions, total pages, current page, and total transaction count
+    - 200 OK with cursor pagination: transactions, next_cursor, prev_cursor, per_page and,
+      if requested, total_transactions
+    - 400 Bad Request if the cursor or the sort field is invalid for cursor pagination
     """
     # Get query parameters
     page = request.GET.get('page', 1)
@@ -108,39 +256,21 @@ def get_paginated_transactions(request):
     sort_by = request.GET.get('sort_by', 'date')
     sort_direction = request.GET.get('sort_direction', 'desc')
     
-    # Get filter parameters
-    date_from = request.GET.get('dateFrom')
-    date_to = request.GET.get('dateTo')
-    description = request.GET.get('description')
-    transaction_type = request.GET.get('type')
-    budget_group = request.GET.get('budget')
-    account = request.GET.get('account')
-    review_status = request.GET.get('review_status')
-
-    # Start with all transactions
-    transactions = Transaction.objects.all()
-
-    # Apply filters
-    if date_from:
-        date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
-        transactions = transactions.filter(date__gte=date_from)
-    if date_to:
-        date_to = datetime.strptime(date_to, '%Y-%m-%d').date()
-        transactions = transactions.filter(date__lte=date_to)
-    if description:
-        transactions = transactions.filter(description__icontains=description)
-    if transaction_type:
-        transactions = transactions.filter(transaction_type=transaction_type)
-    if budget_group:
-        transactions = transactions.filter(budget_group=budget_group)
-    if account:
-        transactions = transactions.filter(account_name=account)
-    if review_status:
-        transactions = transactions.filter(review_status=review_status)
+    # Start with all transactions and apply filters
+    transactions = filter_transactions(Transaction.objects.all(), request.GET)
+
+    if request.GET.get('pagination') == 'cursor':
+        return cursor_paginated_response(request, transactions, per_page, sort_by, sort_direction)
 
     # Apply sorting
     sort_prefix = '-' if sort_direction == 'desc' else ''
-    transactions = transactions.order_by(f'{sort_prefix}{sort_by}')
+    if sort_by == 'relevance':
+        description = request.GET.get('description', '')
+        include_comments = request.GET.get('search_comments', '').lower() == 'true'
+        transactions = annotate_relevance(transactions, description, include_comments)
+        transactions = transactions.order_by(f'{sort_prefix}relevance', '-date', '-id')
+    else:
+        transactions = transactions.order_by(f'{sort_prefix}{sort_by}')
 
     # Paginate results
     paginator = Paginator(transactions, per_page)
@@ -151,12 +281,89 @@ def get_paginated_transactions(request):
     except EmptyPage:
         paginated_transactions = paginator.page(paginator.num_pages)
 
-    # Serialize data
-    serializer = TransactionSerializer(paginated_transactions, many=True)
-
     return Response({
-        'transactions': serializer.data,
+        'transactions': serialize_values(paginated_transactions.object_list),
         'total_pages': paginator.num_pages,
         'current_page': int(page),
         'total_transactions': paginator.count
-    })
\ No newline at end of file
+    })
+
+def cursor_paginated_response(request, transactions, per_page, sort_by, sort_direction):
+    """
+    Build the get_paginated_transactions response for cursor pagination.
+    """
+    try:
+        per_page = max(int(per_page), 1)
+    except (TypeError, ValueError):
+        per_page = 10
+
+    try:
+        page, next_cursor, prev_cursor = keyset_paginate(
+            transactions,
+            sort_by,
+            sort_direction == 'desc',
+            cursor=request.GET.get('cursor'),
+            per_page=per_page,
+            serializer=values_serializer(TransactionSerializer)
+        )
+    except FieldDoesNotExist:
+        return Response({'error': f"Invalid sort field '{sort_by}'"}, status=status.HTTP_400_BAD_REQUEST)
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    response = {
+        'transactions': page,
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor,
+        'per_page': per_page,
+    }
+    if request.GET.get('include_total', '').lower() == 'true':
+        response['total_transactions'] = transactions.count()
+    return Response(response)
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="Export filtered transactions as CSV or NDJSON",
+    manual_parameters=[
+        openapi.Parameter('export_format', openapi.IN_QUERY, description="'csv' (default) or 'ndjson'", type=openapi.TYPE_STRING),
+        openapi.Parameter('dateFrom', openapi.IN_QUERY, description="Start date for filtering (YYYY-MM-DD)", type=openapi.TYPE_STRING),
+        openapi.Parameter('dateTo', openapi.IN_QUERY, description="End date for filtering (YYYY-MM-DD)", type=openapi.TYPE_STRING),
+        openapi.Parameter('description', openapi.IN_QUERY, description="Filter by description", type=openapi.TYPE_STRING),
+        openapi.Parameter('search_comments', openapi.IN_QUERY, description="Also match the description filter against comments", type=openapi.TYPE_BOOLEAN),
+        openapi.Parameter('type', openapi.IN_QUERY, description="Filter by transaction type ID", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('budget', openapi.IN_QUERY, description="Filter by budget group ID", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('account', openapi.IN_QUERY, description="Filter by account ID", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('review_status', openapi.IN_QUERY, description="Filter by review status", type=openapi.TYPE_STRING),
+    ],
+    responses={
+        200: "The matching transactions, streamed as a file",
+        400: "Invalid export format or date",
+    }
+)
+@api_view(['GET'])
+def export_transactions(request):
+    """
+    Export the filtered transactions as a CSV or NDJSON download.
+
+    Accepts the filters of get_paginated_transactions. Transactions are
+    ordered by date and exported with the names of their account, budget
+    group and transaction type. The file is streamed as it is read from a
+    server-side cursor, EXPORT_CHUNK_SIZE rows at a time, so memory use stays
+    flat whatever the number of transactions.
+
+    Returns:
+    - 200 OK streaming the file
+    - 400 Bad Request if the export format or a date is invalid
+    """
+    export_format = request.GET.get('export_format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return Response({'error': f"Invalid export_format, expected one of {', '.join(EXPORT_FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        transactions = filter_transactions(Transaction.objects.all(), request.GET)
+    except ValueError:
+        return Response({'error': 'Invalid date, expected YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+
+    content_type, stream = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(stream(transactions.order_by('date', 'id')), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="transactions.{export_format}"'
+    return response
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+from datetime import date
 from pathlib import Path
 import os
 from dotenv import load_dotenv
@@ -21,11 +22,59 @@ load_dotenv()
 # Bank formats configuration
 BANK_FORMATS = json.loads(os.getenv('BANK_FORMATS'))
 
+# Transaction categorization matcher: 'indexed' prefilters each account's patterns
+# with a literal index, 'sequential' tries every pattern one at a time
+CATEGORIZATION_MATCHER = os.getenv('CATEGORIZATION_MATCHER', 'indexed')
+
+# Distinct descriptions whose matched pattern is memoized per account (0 disables)
+CATEGORIZATION_MEMO_SIZE = int(os.getenv('CATEGORIZATION_MEMO_SIZE', 10000))
+
+# Number of rows validated, deduplicated and written per batch when importing
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 1000))
+
+# Default and largest page sizes (per_page) of the transaction listings
+TRANSACTION_PAGE_SIZE = int(os.getenv('TRANSACTION_PAGE_SIZE', 50))
+TRANSACTION_MAX_PAGE_SIZE = int(os.getenv('TRANSACTION_MAX_PAGE_SIZE', 1000))
+
+# Rows fetched per database round trip when streaming transaction exports
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 2000))
+
+# Seconds a page of paginated-transactions stays cached (0 disables the cache).
+# Pages are keyed on the transaction data version, so writes never serve stale pages.
+TRANSACTION_PAGE_CACHE_TIMEOUT = int(os.getenv('TRANSACTION_PAGE_CACHE_TIMEOUT', 300))
+
+# Number of worker threads running background import jobs.
+# Live progress of running jobs is kept in the default cache, so configure a shared
+# cache backend when running several server processes.
+IMPORT_JOB_WORKERS = int(os.getenv('IMPORT_JOB_WORKERS', 2))
+
+# Queued or running import jobs without progress for this many seconds are marked failed,
+# e.g. the jobs of a server process that was restarted
+IMPORT_JOB_TIMEOUT = int(os.getenv('IMPORT_JOB_TIMEOUT', 60 * 60))
+
+# Longest a writing transaction may stay open, e.g. a background import. Incremental
+# backups also copy the rows changed this long before their base archive was taken,
+# so rows committed after the base was read with an older updated_at are not lost.
+BACKUP_OVERLAP_SECONDS = int(os.getenv('BACKUP_OVERLAP_SECONDS', IMPORT_JOB_TIMEOUT))
+
+# Reports count fortnights in two-week steps from this Monday (YYYY-MM-DD)
+REPORT_FORTNIGHT_START = date.fromisoformat(os.getenv('REPORT_FORTNIGHT_START', '2024-01-01'))
+
+# Share of requests (0 to 1) whose queries and timings are recorded per view by
+# budget.instrumentation.QueryInstrumentationMiddleware; 0 disables it
+QUERY_INSTRUMENTATION_SAMPLE_RATE = float(os.getenv('QUERY_INSTRUMENTATION_SAMPLE_RATE', 0))
+
+# Recorded requests slower than this many milliseconds are logged with their repeated queries
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 500))
+
 PORT = os.environ.get('PORT', 8000)
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Uploads queued for background import jobs are stored here until processed
+IMPORT_JOB_DIR = os.getenv('IMPORT_JOB_DIR', BASE_DIR / 'import_jobs')
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
 
@@ -55,6 +104,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'budget.instrumentation.QueryInstrumentationMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -127,6 +177,20 @@ DATABASES = {
     }
 }
 
+# Caches: process-local memory unless a shared backend is configured, e.g.
+# django.core.cache.backends.redis.RedisCache with its URL as the location
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    },
+    'transaction_pages': {
+        'BACKEND': os.getenv('TRANSACTION_PAGE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('TRANSACTION_PAGE_CACHE_LOCATION', 'transaction-pages'),
+        'TIMEOUT': TRANSACTION_PAGE_CACHE_TIMEOUT,
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -1,14 +1,43 @@
-import { useState } from 'react';
+import { useMemo, useState } from 'react';
 
-export const usePagination = (itemsPerPageOptions = [10, 25, 50, 100]) => {
+// Cursor pagination follows the next_cursor/prev_cursor returned by
+// paginated-transactions when requested with pagination=cursor.
+export const usePagination = (itemsPerPageOptions = [10, 25, 50, 100], mode = 'page') => {
   const [currentPage, setCurrentPage] = useState(1);
   const [itemsPerPage, setItemsPerPage] = useState(itemsPerPageOptions[0]);
   const [totalPages, setTotalPages] = useState(0);
+  const [cursor, setCursor] = useState(null);
+  const [cursors, setCursors] = useState({ next: null, prev: null });
 
   const handlePageChange = (page) => setCurrentPage(page);
   const handleItemsPerPageChange = (newItemsPerPage) => {
     setItemsPerPage(Number(newItemsPerPage));
+    resetPagination();
+  };
+
+  const resetPagination = () => {
     setCurrentPage(1);
+    setCursor(null);
+  };
+
+  const handleNextPage = () => {
+    if (cursors.next) setCursor(cursors.next);
+  };
+  const handlePrevPage = () => {
+    if (cursors.prev) setCursor(cursors.prev);
+  };
+
+  // Query parameters for the current page and a setter for the response's cursors
+  const paginationParams = useMemo(() => (mode === 'cursor'
+    ? { pagination: 'cursor', per_page: itemsPerPage, ...(cursor ? { cursor } : {}) }
+    : { page: currentPage, per_page: itemsPerPage }
+  ), [mode, cursor, currentPage, itemsPerPage]);
+  const updateFromResponse = (data) => {
+    if (mode === 'cursor') {
+      setCursors({ next: data.next_cursor, prev: data.prev_cursor });
+    } else {
+      setTotalPages(data.total_pages);
+    }
   };
 
   return {
@@ -18,6 +47,13 @@ export const usePagination = (itemsPerPageOptions = [10, 25, 50, 100]) => {
     setTotalPages,
     handlePageChange,
     handleItemsPerPageChange,
-    itemsPerPageOptions
+    itemsPerPageOptions,
+    hasNextPage: Boolean(cursors.next),
+    hasPrevPage: Boolean(cursors.prev),
+    handleNextPage,
+    handlePrevPage,
+    resetPagination,
+    paginationParams,
+    updateFromResponse
   };
-};
\ No newline at end of file
+};
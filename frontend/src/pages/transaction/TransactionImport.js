@@ -1,5 +1,9 @@
 import React, { useState, useEffect } from 'react';
-import { importTransactions, getAccountNames, getBankFormats  } from '../../services/api';
+import { importTransactions, getImportJob, getAccountNames, getBankFormats  } from '../../services/api';
+
+const JOB_POLL_INTERVAL = 1000;
+// Stop waiting for a background import after this long
+const JOB_POLL_TIMEOUT = 10 * 60 * 1000;
 
 function TransactionImport() {
   const [file, setFile] = useState(null);
@@ -41,6 +45,25 @@ function TransactionImport() {
     setFileName(file ? file.name : 'No file chosen');
   };
 
+  const waitForImportJob = async (jobId) => {
+    const deadline = Date.now() + JOB_POLL_TIMEOUT;
+    while (Date.now() < deadline) {
+      const { data: job } = await getImportJob(jobId);
+      if (job.status === 'completed') {
+        return `Imported ${job.rows_inserted} transactions (${job.rows_duplicate} duplicates skipped, ${job.rows_uncategorized} uncategorized)`;
+      }
+      if (job.status === 'failed') {
+        if (job.error_count) {
+          return `Import failed: ${job.error_count} row errors, no transactions were saved`;
+        }
+        return `Import failed: ${job.errors[0]?.error || 'unknown error'}, no transactions were saved`;
+      }
+      setMessage(`Importing... ${job.rows_parsed} rows processed`);
+      await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL));
+    }
+    return `Import job ${jobId} has not finished after ${JOB_POLL_TIMEOUT / 60000} minutes, check the import jobs later`;
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     setLoading(true);
@@ -49,6 +72,7 @@ function TransactionImport() {
     const formData = new FormData();
     formData.append('file', file);
     formData.append('import_format', importFormat);
+    formData.append('background', 'true');
     
     // If a new account name is provided, use that. Otherwise, use the selected account.
     if (newAccountName) {
@@ -59,9 +83,9 @@ function TransactionImport() {
 
     try {
       const response = await importTransactions(formData);
-      setMessage(response.data.message);
+      setMessage(await waitForImportJob(response.data.job_id));
     } catch (error) {
-      setMessage('Failed to import transactions');
+      setMessage(error.response?.data?.error || 'Failed to import transactions');
     }
 
     setLoading(false);
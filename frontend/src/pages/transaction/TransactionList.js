@@ -1,5 +1,5 @@
 import React, { useState, useEffect, useCallback, useMemo } from 'react';
-import { getPaginatedTransactions, getTransactionTypes, getBudgetGroups, getAccountNames } from '../../services/api';
+import { getPaginatedTransactions, getBootstrap } from '../../services/api';
 import { usePagination } from '../../hooks/usePagination';
 import { useSorting } from '../../hooks/useSorting';
 import { useFilters } from '../../hooks/useFilters';
@@ -76,14 +76,10 @@ function TransactionList() {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const [typesResponse, groupsResponse, accountsResponse] = await Promise.all([
-          getTransactionTypes(),
-          getBudgetGroups(),
-          getAccountNames()
-        ]);
-        setTransactionTypes(typesResponse.data);
-        setBudgetGroups(groupsResponse.data);
-        setAccountNames(accountsResponse.data);
+        const response = await getBootstrap();
+        setTransactionTypes(response.data.transaction_types);
+        setBudgetGroups(response.data.budget_groups);
+        setAccountNames(response.data.account_names);
       } catch (err) {
         setError('Failed to fetch data');
       }
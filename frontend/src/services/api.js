@@ -6,14 +6,15 @@ const api = axios.create({
   baseURL: API_URL,
 });
 
-export const getTransactions = (filter = '') => {
+export const getTransactions = (filter = '', params = {}) => {
   const endpoint = filter === 'pending_review' ? 'transactions/pending_review/' : 'transactions/';
-  return api.get(endpoint);
+  return api.get(endpoint, { params });
 };
 export const getPaginatedTransactions = (params) => {
   return api.get('paginated-transactions/', { params });
 };
 export const importTransactions = (data) => api.post('import-transactions/', data);
+export const getImportJob = (id) => api.get(`import-jobs/${id}/`);
 export const reviewTransactions = (data) => api.post('transactions/bulk_confirm/', data);
 export const redoCategorization = () => api.post('transactions/redo_categorization/');
 export const importTransactionPatterns = (data) => api.post('import-transaction-patterns/', data);
@@ -22,5 +23,6 @@ export const getTransactionTypes = () => api.get('transaction-types/');
 export const getBudgetGroups = () => api.get('budget-groups/');
 export const modifyTransaction = (id, data) => api.post(`transactions/${id}/modify/`, data);
 export const getBankFormats = () => api.get('bank-formats/');
+export const getBootstrap = () => api.get('bootstrap/');
 
 export default api;
\ No newline at end of file